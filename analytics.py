@@ -0,0 +1,111 @@
+import threading
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # optional: grouped counts fall back to plain Python
+    np = None
+
+
+def group_count(keys, size):
+    # Occurrences of each integer key in [0, size)
+    if np is not None and len(keys):
+        return np.bincount(np.asarray(keys, dtype=np.int64), minlength=size).tolist()
+    totals = [0] * size
+    for key in keys:
+        totals[key] += 1
+    return totals
+
+
+class PollAnalytics:
+    """Per-poll aggregates cached by poll version.
+
+    A poll's version is its vote count, its stored results and the version
+    of the users data set (roles feed the breakdowns).  A vote recorded
+    through ``record_vote`` moves a current cache entry forward in place;
+    anything else that changes the version causes a full recompute the next
+    time the poll is asked for.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._cache = {}
+
+    def _version(self, poll, users_version):
+        return (len(poll.get('votes', {})), tuple(poll['results']), users_version)
+
+    def poll_stats(self, poll, users, users_version):
+        version = self._version(poll, users_version)
+        with self.lock:
+            cached = self._cache.get(poll['id'])
+            if cached and cached[0] == version:
+                return cached[1]
+        stats = self._compute(poll, users)
+        with self.lock:
+            self._cache[poll['id']] = (version, stats)
+        return stats
+
+    def record_vote(self, poll, username, choice, weight, role, when, users_version):
+        # Called after the vote was applied to ``poll``
+        results = list(poll['results'])
+        results[choice] -= weight
+        previous = (len(poll['votes']) - 1, tuple(results), users_version)
+        with self.lock:
+            cached = self._cache.get(poll['id'])
+            if not cached or cached[0] != previous:
+                return
+            stats = cached[1]
+            stats['voters'] += 1
+            stats['counts'][choice] += 1
+            stats['weighted'][choice] += weight
+            stats['by_role'].setdefault(role, [0] * len(poll['options']))[choice] += 1
+            day = when[:10]
+            stats['by_day'][day] = stats['by_day'].get(day, 0) + 1
+            stats['first_vote'] = min(stats['first_vote'] or when, when)
+            stats['last_vote'] = max(stats['last_vote'] or when, when)
+            self._cache[poll['id']] = (self._version(poll, users_version), stats)
+
+    def forget(self, poll_id):
+        with self.lock:
+            self._cache.pop(poll_id, None)
+
+    def _compute(self, poll, users):
+        # Column-wise: one list per attribute of the votes, then grouped sums
+        k = len(poll['options'])
+        votes = poll.get('votes', {})
+        names = list(votes)
+        choices = list(votes.values())
+        roles = sorted({users[u]['role'] if u in users else 'Deleted' for u in names})
+        role_codes = {role: i for i, role in enumerate(roles)}
+        role_keys = [role_codes[users[u]['role'] if u in users else 'Deleted'] * k + c for u, c in zip(names, choices)]
+        by_role_flat = group_count(role_keys, len(roles) * k)
+        times = poll.get('vote_times', {})
+        stamps = sorted(times[u] for u in names if u in times)
+        return {
+            'voters': len(names),
+            'counts': group_count(choices, k),
+            'weighted': list(poll['results']),
+            'by_role': {role: by_role_flat[i * k:(i + 1) * k] for i, role in enumerate(roles)},
+            'by_day': dict(Counter(stamp[:10] for stamp in stamps)),
+            'first_vote': stamps[0] if stamps else None,
+            'last_vote': stamps[-1] if stamps else None,
+        }
+
+    def summary(self, polls, users, users_version):
+        """Per-poll stats plus totals across all of ``polls``."""
+        eligible = len(users)
+        per_poll = []
+        totals = {'polls': len(polls), 'votes': 0, 'weighted': 0, 'by_role': Counter(), 'by_day': Counter()}
+        participation = []
+        for poll in polls:
+            stats = self.poll_stats(poll, users, users_version)
+            per_poll.append((poll, stats))
+            totals['votes'] += stats['voters']
+            totals['weighted'] += sum(stats['weighted'])
+            for role, counts in stats['by_role'].items():
+                totals['by_role'][role] += sum(counts)
+            totals['by_day'].update(stats['by_day'])
+            participation.append(stats['voters'] / eligible if eligible else 0)
+        totals['avg_participation'] = sum(participation) / len(participation) if participation else 0
+        totals['eligible'] = eligible
+        return per_poll, totals
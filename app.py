@@ -1,57 +1,378 @@
-from flask import Flask, request, session, redirect, url_for, render_template_string
+from flask import Flask, Response, request, session, redirect, url_for, render_template_string, jsonify, g, send_file, stream_with_context
 from markupsafe import escape
-import json
+import heapq
 import os
+import re
 import threading
+import time
 from datetime import datetime, timedelta
 from functools import wraps
+from itertools import islice
+from urllib.parse import urlencode
+
+from werkzeug.local import LocalProxy
+
+from community import CommunityRegistry
+from passwords import PoolBusy, dummy_hash, needs_rehash
+from ratelimit import RateLimiter
+from replication import Follower, Journal, Publisher, forward, parse_address
+from tally import audit
 
 app = Flask(__name__)
 app.secret_key = 'capiche_secret_2023'
 
 # JSON File Paths
 DATA_DIR = 'data'
-USERS_FILE = os.path.join(DATA_DIR, 'users.json')
-ANNOUNCEMENTS_FILE = os.path.join(DATA_DIR, 'announcements.json')
-POLLS_FILE = os.path.join(DATA_DIR, 'polls.json')
-DICTIONARY_FILE = os.path.join(DATA_DIR, 'dictionary.json')
 
-# Initialize data directories and files if not exist
-os.makedirs(DATA_DIR, exist_ok=True)
+# Communities are picked by subdomain of COMMUNITY_DOMAIN; any other host
+# gets the default community stored directly in DATA_DIR
+COMMUNITY_DOMAIN = os.environ.get('COMMUNITY_DOMAIN', '').lower()
+COMMUNITY_NAME = re.compile(r'[a-z0-9][a-z0-9-]{0,39}')
+COMMUNITY_IDLE_TIMEOUT = int(os.environ.get('COMMUNITY_IDLE_TIMEOUT', 600))  # seconds
+# Comma-separated names this process serves; unset serves every community
+SERVED_COMMUNITIES = set(filter(None, os.environ.get('SERVED_COMMUNITIES', '').split(','))) or None
+
+# Announcements older than this, and polls closed for longer than this, are
+# moved out of the hot files into the monthly archive
+ARCHIVE_ANNOUNCEMENTS_AFTER_DAYS = int(os.environ.get('ARCHIVE_ANNOUNCEMENTS_AFTER_DAYS', 30))
+ARCHIVE_POLLS_AFTER_DAYS = int(os.environ.get('ARCHIVE_POLLS_AFTER_DAYS', 7))
+ARCHIVE_INTERVAL = 3600  # seconds between archival runs
+ADMIN_PAGE_SIZE = 50
+VOTERS_PAGE_SIZE = 50
+FEED_PAGE_SIZE = 20
+AUDIT_PAGE_SIZE = 100
+STREAM_CHUNK = 100  # records rendered per chunk of a streamed page
+RECORDS_SLOT = '<!--records-->'  # where a streamed page's records go
 
-# File lock for thread safety
-file_lock = threading.Lock()
+# Token buckets for POSTs: (burst, tokens per second), charged per client IP
+# and per user (the attempted username for logins)
+RATE_LIMITS = {
+    'login': (5, 1 / 12),
+    'vote': (20, 1),
+    'content': (20, 0.5),
+    'admin': (60, 2),
+}
+RATE_LIMITED_ENDPOINTS = {
+    'login': 'login',
+    'polls_page': 'vote',
+    'create_announcement': 'content',
+    'create_poll': 'content',
+    'edit_poll': 'content',
+    'delete_announcement': 'content',
+    'delete_poll': 'content',
+    'dictionary': 'content',
+    'register': 'admin',
+    'dashboard': 'admin',
+    'assign_role': 'admin',
+    'assign_vote': 'admin',
+    'mute_user': 'admin',
+    'unmute_user': 'admin',
+    'delete_user': 'admin',
+    'reset_password': 'admin',
+    'admin_recount': 'admin',
+    'admin_archive': 'admin',
+    'admin_backups': 'admin',
+}
 
-def init_file(file_path, default_data):
-    with file_lock:
-        if not os.path.exists(file_path):
-            with open(file_path, 'w') as f:
-                json.dump(default_data, f, indent=2)
+# Replication: a primary publishes its changes on REPLICATION_LISTEN
+# (host:port).  A follower started with REPLICA_OF=host:port serves the
+# REPLICA_ENDPOINTS from that stream and forwards every other request to
+# PRIMARY_URL, which should list the follower in TRUSTED_FORWARDERS so
+# rate limits still apply per client.
+REPLICATION_LISTEN = os.environ.get('REPLICATION_LISTEN')
+REPLICA_OF = os.environ.get('REPLICA_OF')
+PRIMARY_URL = os.environ.get('PRIMARY_URL', 'http://127.0.0.1:5000')
+TRUSTED_FORWARDERS = set(filter(None, os.environ.get('TRUSTED_FORWARDERS', '').split(',')))
+REPLICA_ENDPOINTS = {'announcements_page', 'polls_page', 'dictionary', 'dictionary_autocomplete'}
 
-# Initialize with plaintext passwords
-init_file(USERS_FILE, [
+rate_limiter = RateLimiter(RATE_LIMITS)
+
+# Every community keeps its own data sets, indexes and caches; a request
+# works on the one its host name selects
+communities = CommunityRegistry(DATA_DIR, default_users=[
+    # Initialize with plaintext passwords; each is hashed on first login
     {'username': 'adrian', 'password': 'adrian123', 'role': 'Leader', 'votePower': 6, 'muted': False},
     {'username': 'ish', 'password': 'ishpass', 'role': 'Mod', 'votePower': 4, 'muted': False},
     {'username': 'member1', 'password': 'temp1', 'role': 'Member', 'votePower': 1, 'muted': False}
-])
-init_file(ANNOUNCEMENTS_FILE, [])
-init_file(POLLS_FILE, [])
-init_file(DICTIONARY_FILE, [])
+], idle_timeout=COMMUNITY_IDLE_TIMEOUT, served=SERVED_COMMUNITIES,
+   journal=Journal() if REPLICATION_LISTEN else None, replica=bool(REPLICA_OF))
 
-# Helper Functions
-def load_json(file_path):
-    with file_lock:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+publisher = Publisher(communities.journal, parse_address(REPLICATION_LISTEN)) if REPLICATION_LISTEN else None
+follower = Follower(parse_address(REPLICA_OF), communities) if REPLICA_OF else None
+replication_started = threading.Event()
+replication_lock = threading.Lock()
+
+def community_attr(name):
+    return LocalProxy(lambda: getattr(g.community, name))
+
+users_store = community_attr('users_store')
+announcements_store = community_attr('announcements_store')
+polls_store = community_attr('polls_store')
+dictionary_store = community_attr('dictionary_store')
+announcement_index = community_attr('announcement_index')
+archived_announcement_index = community_attr('archived_announcement_index')
+dictionary_index = community_attr('dictionary_index')
+word_index = community_attr('word_index')
+user_index = community_attr('user_index')
+sessions = community_attr('sessions')
+user_cache = community_attr('user_cache')
+last_seen = community_attr('last_seen')
+announcements_by_time = community_attr('announcements_by_time')
+polls_by_expiry = community_attr('polls_by_expiry')
+polls_by_created = community_attr('polls_by_created')
+dictionary_by_time = community_attr('dictionary_by_time')
+vote_index = community_attr('vote_index')
+analytics = community_attr('analytics')
+archive = community_attr('archive')
+password_pool = community_attr('password_pool')
+
+def init_data():
+    """Opens and checks the default community and any listed in
+    SERVED_COMMUNITIES.
+
+    Run once by the server entry point before workers fork, so they all
+    start from warm caches and indexes; raises ValueError on bad data.
+    """
+    for name in [CommunityRegistry.DEFAULT] + sorted(SERVED_COMMUNITIES or ()):
+        community = communities.acquire(name)
+        if community is not None:
+            communities.release(community)
+
+def community_name(host):
+    host = host.split(':')[0].lower()
+    if COMMUNITY_DOMAIN and host.endswith('.' + COMMUNITY_DOMAIN):
+        name = host[:-len(COMMUNITY_DOMAIN) - 1]
+        if name != 'www':
+            return name if COMMUNITY_NAME.fullmatch(name) else None
+    return CommunityRegistry.DEFAULT
+
+def client_ip():
+    # A follower passes the client's address on in X-Forwarded-For
+    if request.remote_addr in TRUSTED_FORWARDERS:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[-1].strip()
+    return request.remote_addr or ''
+
+@app.before_request
+def start_replication():
+    # Started by the first request rather than at import, so the threads
+    # run in the worker process and not in a parent that forks
+    if replication_started.is_set():
+        return
+    with replication_lock:
+        if not replication_started.is_set():
+            # Only one worker can bind the socket; the others publish nothing
+            if publisher is not None:
+                publisher.start()
+            if follower is not None:
+                follower.start()
+            replication_started.set()
 
-def save_json(file_path, data):
-    with file_lock:
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
+@app.before_request
+def follow_primary():
+    if follower is None:
+        return
+    if request.endpoint == 'replication_status':
+        return replication_status()
+    name = community_name(request.host)
+    if request.method in ('GET', 'HEAD') and request.endpoint in REPLICA_ENDPOINTS and follower.synced(name):
+        return
+    try:
+        return forward(PRIMARY_URL, request)
+    except OSError:
+        return 'Primary server unavailable', 502
 
+@app.before_request
+def select_community():
+    name = community_name(request.host)
+    community = communities.acquire(name) if name else None
+    if community is None:
+        return 'Community not found', 404
+    g.community = community
+
+@app.teardown_request
+def release_community(exc):
+    community = g.pop('community', None)
+    if community is not None:
+        communities.release(community)
+
+# Helper Functions
 def get_user(username):
-    users = load_json(USERS_FILE)
-    return next((u for u in users if u['username'] == username), None)
+    users_store.load()
+    return user_index.get(username)
+
+def current_user():
+    if 'user' not in g:
+        users_store.load()
+        user_id = sessions.user_id(session.get('sid'))
+        g.user = user_cache.get(user_id) if user_id is not None else None
+    return g.user
+
+def archive_old_content(community, now=None):
+    now = now or datetime.now()
+    announcement_cutoff = now - timedelta(days=ARCHIVE_ANNOUNCEMENTS_AFTER_DAYS)
+    poll_cutoff = now - timedelta(days=ARCHIVE_POLLS_AFTER_DAYS)
+    announcements = community.announcements_store.extract(
+        lambda a: datetime.fromisoformat(a['timestamp']) < announcement_cutoff,
+        lambda items: community.archive.write('announcements', items, 'timestamp'))
+    polls = community.polls_store.extract(
+        lambda p: datetime.fromisoformat(p['expires_at']) < poll_cutoff,
+        lambda items: community.archive.write('polls', items, 'expires_at'))
+    return len(announcements), len(polls)
+
+def run_archival(community):
+    try:
+        archive_old_content(community)
+    finally:
+        community.archive_running.release()
+
+@app.before_request
+def schedule_archival():
+    community = g.community
+    if community.replica:
+        return
+    if community.last_archive_run is not None and time.monotonic() - community.last_archive_run < ARCHIVE_INTERVAL:
+        return
+    if not community.archive_running.acquire(blocking=False):
+        return
+    community.last_archive_run = time.monotonic()
+    threading.Thread(target=run_archival, args=(community,), daemon=True).start()
+
+@app.before_request
+def limit_writes():
+    if request.method != 'POST':
+        return
+    rule = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if rule:
+        if rule == 'login':
+            who = 'name:' + (request.form.get('username') or '')
+        else:
+            user = current_user()
+            who = f"user:{user['id']}" if user else 'anonymous'
+        retry_after = rate_limiter.hit(rule, 'ip:' + client_ip(), f'{g.community.name}/{who}')
+        if retry_after:
+            return 'Too many requests, slow down', 429, {'Retry-After': str(retry_after)}
+    write_limiter = g.community.write_limiter
+    if not write_limiter.enter():
+        return 'Server busy, please try again shortly', 503, {'Retry-After': '1'}
+    g.write_slot = write_limiter
+
+@app.teardown_request
+def release_write_slot(exc):
+    write_limiter = g.pop('write_slot', None)
+    if write_limiter is not None:
+        write_limiter.leave()
+
+def polls_awaiting_vote(username, now=None):
+    # Active polls come off the expiry index, so this never visits closed polls
+    polls_store.load()
+    voted = vote_index.voted(username)
+    active = polls_by_expiry.items_after((now or datetime.now()).isoformat())
+    return [p for p in active if p['id'] not in voted]
+
+def log_admin_action(action, target, **details):
+    g.community.audit_log.record(current_user()['username'], action, target, **details)
+
+def mark_seen(user, *kinds):
+    # Page views move the member's marks up to the newest record of each
+    # kind; a follower has nowhere to keep them, so views there don't count
+    stores = {'announcements': announcements_store, 'polls': polls_store, 'dictionary': dictionary_store}
+    marks = {kind: stores[kind].last_id() for kind in kinds}
+    if follower is None:
+        last_seen.mark(user['id'], **marks)
+    return marks
+
+def new_since_last_visit(user):
+    seen = last_seen.get(user['id'])
+    missing = [kind for kind in ('announcements', 'polls', 'dictionary') if kind not in seen]
+    if missing:
+        # Counting starts from a member's first visit
+        seen.update(mark_seen(user, *missing))
+    now = datetime.now().isoformat()
+    voted = vote_index.voted(user['username'])
+    return {
+        'announcements': announcements_store.count_after(seen['announcements']),
+        'dictionary': dictionary_store.count_after(seen['dictionary']),
+        # Only the polls created since the last visit are looked at
+        'polls': sum(1 for p in polls_store.after(seen['polls']) if p['id'] not in voted and p['expires_at'] > now),
+    }
+
+def feed_item(kind, record):
+    if kind == 'announcement':
+        return {'kind': kind, 'title': record['title'], 'text': record['content'], 'author': record['author'],
+                'timestamp': record['timestamp'], 'link': '/announcements'}
+    if kind == 'poll':
+        return {'kind': kind, 'title': record['question'], 'text': ' / '.join(record['options']), 'author': None,
+                'timestamp': record.get('created_at'), 'link': '/polls'}
+    return {'kind': kind, 'title': record['word'], 'text': record['definition'], 'author': record.get('author'),
+            'timestamp': record.get('timestamp'), 'link': '/dictionary?' + urlencode({'q': record['word']})}
+
+def feed_stream(kind, index, before):
+    for key, record_id, record in index.iter_descending(before):
+        yield key, kind, record_id, record
+
+def activity_feed(cursor=None, limit=FEED_PAGE_SIZE):
+    """Returns ``(items, next_cursor)``, newest first.
+
+    The per-type time indexes are walked lazily and k-way merged, so only
+    about ``limit`` entries of each are ever read.  The cursor is the
+    ``(timestamp, kind, id)`` of the last item shown; the next page starts
+    strictly after it.
+    """
+    announcements_store.load()
+    polls_store.load()
+    dictionary_store.load()
+    streams = []
+    for kind, index in [('announcement', announcements_by_time), ('dictionary', dictionary_by_time), ('poll', polls_by_created)]:
+        before = None
+        if cursor is not None:
+            stamp, cursor_kind, cursor_id = cursor
+            # Ties on the timestamp are ordered by kind, then id
+            if kind == cursor_kind:
+                before = (stamp, cursor_id)
+            else:
+                before = (stamp, float('-inf') if kind > cursor_kind else float('inf'))
+        streams.append(feed_stream(kind, index, before))
+    merged = heapq.merge(*streams, key=lambda entry: entry[:3], reverse=True)
+    page = list(islice(merged, limit + 1))
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = '|'.join(str(part) for part in page[-1][:3])
+    return [feed_item(kind, record) for _, kind, _, record in page], next_cursor
+
+def parse_feed_cursor(value):
+    try:
+        stamp, kind, record_id = value.rsplit('|', 2)
+        return stamp, kind, int(record_id)
+    except (AttributeError, ValueError):
+        return None
+
+def stream_page(page, *sections):
+    """Streams ``page`` with each of ``sections`` rendered in at the
+    matching RECORDS_SLOT, in order.
+
+    Everything before a slot goes out at once; the records follow
+    STREAM_CHUNK at a time as the generators render them, so neither the
+    first byte nor memory waits on the whole list.
+    """
+    parts = page.split(RECORDS_SLOT, len(sections))
+
+    def generate():
+        for part, fragments in zip(parts, sections):
+            yield part
+            chunk = []
+            for fragment in fragments:
+                chunk.append(fragment)
+                if len(chunk) >= STREAM_CHUNK:
+                    yield ''.join(chunk)
+                    chunk = []
+            if chunk:
+                yield ''.join(chunk)
+        yield parts[-1]
+
+    return Response(stream_with_context(generate()), mimetype='text/html')
 
 # Sanitize output for HTML
 def safe_display(text):
@@ -61,7 +382,7 @@ def safe_display(text):
 def require_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get('authenticated'):
+        if current_user() is None:
             return redirect('/login')
         return f(*args, **kwargs)
     return decorated
@@ -69,7 +390,7 @@ def require_auth(f):
 def require_mod(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        user = session.get('user', {})
+        user = current_user() or {}
         if user.get('role') not in ['Leader', 'Mod']:
             return 'Forbidden', 403
         return f(*args, **kwargs)
@@ -78,7 +399,7 @@ def require_mod(f):
 def require_leader(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if session.get('user', {}).get('role') != 'Leader':
+        if (current_user() or {}).get('role') != 'Leader':
             return 'Forbidden', 403
         return f(*args, **kwargs)
     return decorated
@@ -86,7 +407,7 @@ def require_leader(f):
 def require_admin(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        user = session.get('user', {})
+        user = current_user() or {}
         if user.get('username') not in ['adrian', 'ish']:
             return 'Forbidden', 403
         return f(*args, **kwargs)
@@ -141,22 +462,36 @@ def index():
 </html>
 '''
 
+@app.route('/replication')
+def replication_status():
+    if follower is not None:
+        return jsonify(follower.status())
+    if publisher is not None:
+        return jsonify(publisher.status())
+    return jsonify({'role': 'standalone'})
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     error = ''
     if request.method == 'POST':
         username = request.form.get('username')
         password = request.form.get('password')
-        users = load_json(USERS_FILE)
-        user = next((u for u in users if u['username'] == username and u['password'] == password), None)
-        if user:
-            session['authenticated'] = True
-            session['user'] = {
-                'username': user['username'],
-                'role': user['role'],
-                'votePower': user['votePower'],
-                'muted': user['muted']
-            }
+        user = get_user(username)
+        try:
+            expected = user['password'] if user else dummy_hash()
+            valid = bool(password and password_pool.verify(expected, password) and user)
+            if valid and needs_rehash(user['password']):
+                hashed = password_pool.hash(password)
+                with users_store.writing():
+                    stored = get_user(username)
+                    if stored is not None:
+                        stored['password'] = hashed
+                        users_store.save()
+        except PoolBusy:
+            return 'Too many login attempts right now, please try again shortly', 503, {'Retry-After': '2'}
+        if valid:
+            session.clear()
+            session['sid'] = sessions.create(user['id'])
             return redirect('/dashboard')
         error = 'Invalid credentials'
     return f'''
@@ -214,6 +549,8 @@ def login():
 
 @app.route('/logout')
 def logout():
+    if session.get('sid'):
+        sessions.revoke(session['sid'])
     session.clear()
     return redirect('/login')
 
@@ -226,19 +563,24 @@ def register():
         username = request.form.get('username')
         password = request.form.get('password')
         role = request.form.get('role', 'Member')
-        users = load_json(USERS_FILE)
-        if any(u['username'] == username for u in users):
-            error = 'Username already exists'
-        else:
-            users.append({
-                'username': username,
-                'password': password,
-                'role': role,
-                'votePower': 1,
-                'muted': False
-            })
-            save_json(USERS_FILE, users)
-            success = 'User registered successfully'
+        try:
+            hashed = password_pool.hash(password)
+        except PoolBusy:
+            return 'Server busy, please try again shortly', 503, {'Retry-After': '2'}
+        with users_store.writing():
+            if get_user(username):
+                error = 'Username already exists'
+            else:
+                user = users_store.append({
+                    'username': username,
+                    'password': hashed,
+                    'role': role,
+                    'votePower': 1,
+                    'muted': False
+                })
+                users_store.save()
+                user_index.add(user)
+                success = 'User registered successfully'
     return f'''
 <!DOCTYPE html>
 <html>
@@ -301,7 +643,7 @@ def register():
 @app.route('/dashboard', methods=['GET', 'POST'])
 @require_auth
 def dashboard():
-    user = session['user']
+    user = current_user()
     message = ''
     error = ''
     # Only adrian and ish can add new members from dashboard
@@ -318,19 +660,24 @@ def dashboard():
         if not new_username or not new_password:
             error = 'Username and password are required.'
         else:
-            users = load_json(USERS_FILE)
-            if any(u['username'] == new_username for u in users):
-                error = 'Username already exists.'
-            else:
-                users.append({
-                    'username': new_username,
-                    'password': new_password,
-                    'role': 'Member',
-                    'votePower': vote_power,
-                    'muted': False
-                })
-                save_json(USERS_FILE, users)
-                message = f'User {new_username} created successfully with vote weight {vote_power}.'
+            try:
+                hashed = password_pool.hash(new_password)
+            except PoolBusy:
+                return 'Server busy, please try again shortly', 503, {'Retry-After': '2'}
+            with users_store.writing():
+                if get_user(new_username):
+                    error = 'Username already exists.'
+                else:
+                    new_user = users_store.append({
+                        'username': new_username,
+                        'password': hashed,
+                        'role': 'Member',
+                        'votePower': vote_power,
+                        'muted': False
+                    })
+                    users_store.save()
+                    user_index.add(new_user)
+                    message = f'User {new_username} created successfully with vote weight {vote_power}.'
 
     create_member_form = ''
     if user['username'] in ['adrian', 'ish']:
@@ -357,11 +704,28 @@ def dashboard():
         </div>
         '''
 
+    new = new_since_last_visit(user)
+    items, next_cursor = activity_feed()
+    labels = {'announcement': 'Announcement', 'poll': 'New poll', 'dictionary': 'New word'}
+    feed_html = ''
+    for item in items:
+        byline = f' by {safe_display(item["author"])}' if item['author'] else ''
+        feed_html += f'''
+                <li class="py-3">
+                    <p class="text-xs text-contrast-secondary">{labels[item["kind"]]}{byline} &middot; {safe_display((item["timestamp"] or "")[:16].replace("T", " "))}</p>
+                    <a href="{safe_display(item["link"])}" class="text-contrast font-semibold hover:underline">{safe_display(item["title"])}</a>
+                    <p class="text-sm text-contrast-secondary truncate">{safe_display(item["text"])}</p>
+                </li>'''
+    if not items:
+        feed_html = '<li class="py-3 text-contrast-secondary">Nothing here yet</li>'
+
     nav_tabs = f'''
         <div class="flex flex-wrap gap-2 mb-8">
             <a href="/announcements" class="btn-green text-white px-4 py-2 rounded-lg font-semibold shadow hover:scale-105 transition">Announcements</a>
             <a href="/polls" class="btn-green text-white px-4 py-2 rounded-lg font-semibold shadow hover:scale-105 transition">Polls</a>
             <a href="/dictionary" class="btn-green text-white px-4 py-2 rounded-lg font-semibold shadow hover:scale-105 transition">Dictionary</a>
+            <a href="/search" class="btn-green text-white px-4 py-2 rounded-lg font-semibold shadow hover:scale-105 transition">Search</a>
+            <a href="/archive" class="btn-green text-white px-4 py-2 rounded-lg font-semibold shadow hover:scale-105 transition">Archive</a>
         </div>
     '''
 
@@ -396,6 +760,32 @@ def dashboard():
         }}
         .input-dark::placeholder {{ color: #9ca3af; }}
     </style>
+    <script>
+        const feedLabels = {{announcement: 'Announcement', poll: 'New poll', dictionary: 'New word'}};
+        function loadMoreFeed(button) {{
+            fetch('/feed?cursor=' + encodeURIComponent(button.dataset.cursor)).then(r => r.json()).then(data => {{
+                const list = document.getElementById('feed');
+                for (const item of data.items) {{
+                    const entry = document.createElement('li');
+                    entry.className = 'py-3';
+                    const meta = document.createElement('p');
+                    meta.className = 'text-xs text-contrast-secondary';
+                    meta.textContent = feedLabels[item.kind] + (item.author ? ' by ' + item.author : '') + ' \u00b7 ' + (item.timestamp || '').slice(0, 16).replace('T', ' ');
+                    const link = document.createElement('a');
+                    link.className = 'text-contrast font-semibold hover:underline';
+                    link.href = item.link;
+                    link.textContent = item.title;
+                    const text = document.createElement('p');
+                    text.className = 'text-sm text-contrast-secondary truncate';
+                    text.textContent = item.text;
+                    entry.append(meta, link, text);
+                    list.appendChild(entry);
+                }}
+                button.dataset.cursor = data.next || '';
+                button.classList.toggle('hidden', !data.next);
+            }});
+        }}
+    </script>
 </head>
 <body class="gradient-bg min-h-screen">
     <div class="container mx-auto px-2 sm:px-4 py-8">
@@ -404,17 +794,32 @@ def dashboard():
             <a href="/logout" class="text-red-400 hover:underline font-semibold">Logout</a>
         </div>
         {nav_tabs}
-        <div class="grid grid-cols-1 md:grid-cols-2 gap-8">
+        <div class="grid grid-cols-1 md:grid-cols-3 gap-8">
             <div class="glass p-6 sm:p-8">
                 <h2 class="text-xl sm:text-2xl font-semibold mb-4 text-contrast">Announcements</h2>
                 <a href="/announcements" class="btn-green text-white px-4 py-2 rounded-lg inline-block mb-4 font-semibold shadow-lg hover:scale-105 transition">View Announcements</a>
                 <p class="text-sm text-contrast-secondary">Check for updates from Adrian</p>
+                <p class="text-sm text-green-400 font-semibold">{new['announcements']} new since your last visit</p>
             </div>
             <div class="glass p-6 sm:p-8">
                 <h2 class="text-xl sm:text-2xl font-semibold mb-4 text-contrast">Polls</h2>
                 <a href="/polls" class="btn-green text-white px-4 py-2 rounded-lg inline-block mb-4 font-semibold shadow-lg hover:scale-105 transition">Vote Now</a>
                 <p class="text-sm text-contrast-secondary">Your vote carries weight: {user['votePower']}</p>
+                <p class="text-sm text-contrast-secondary"><a href="/polls?filter=awaiting" class="hover:underline">{len(polls_awaiting_vote(user['username']))} polls awaiting your vote</a></p>
+                <p class="text-sm text-green-400 font-semibold">{new['polls']} new since your last visit</p>
             </div>
+            <div class="glass p-6 sm:p-8">
+                <h2 class="text-xl sm:text-2xl font-semibold mb-4 text-contrast">Dictionary</h2>
+                <a href="/dictionary" class="btn-green text-white px-4 py-2 rounded-lg inline-block mb-4 font-semibold shadow-lg hover:scale-105 transition">Browse Words</a>
+                <p class="text-sm text-green-400 font-semibold">{new['dictionary']} new words since your last visit</p>
+            </div>
+        </div>
+        <div class="glass p-6 sm:p-8 mt-8">
+            <h2 class="text-xl sm:text-2xl font-semibold mb-2 text-contrast">Recent Activity</h2>
+            <ul id="feed" class="divide-y divide-gray-700">{feed_html}
+            </ul>
+            <button type="button" data-cursor="{safe_display(next_cursor or '')}" onclick="loadMoreFeed(this)"
+                    class="{'' if next_cursor else 'hidden '}mt-4 text-blue-400 hover:underline">Load more</button>
         </div>
         {create_member_form}
     </div>
@@ -422,19 +827,78 @@ def dashboard():
 </html>
 '''
 
+@app.route('/feed')
+@require_auth
+def feed():
+    items, next_cursor = activity_feed(parse_feed_cursor(request.args.get('cursor')))
+    return jsonify({'items': items, 'next': next_cursor})
+
 @app.route('/admin')
 @require_admin
 def admin():
-    users = load_json(USERS_FILE)
-    rows_html = ''
-    for u in users:
+    role = request.args.get('role') or None
+    status = request.args.get('status', '')
+    power = request.args.get('power', '')
+    prefix = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'username')
+    order = request.args.get('order', 'asc')
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', ADMIN_PAGE_SIZE)), 1), 200)
+    except ValueError:
+        page, per_page = 1, ADMIN_PAGE_SIZE
+    muted = {'muted': True, 'active': False}.get(status)
+    power = int(power) if power.isdigit() else None
+
+    users_store.load()
+    total, users = user_index.query(role=role, muted=muted, power=power, prefix=prefix, sort=sort,
+                                    descending=order == 'desc', offset=(page - 1) * per_page, limit=per_page)
+    pages = max((total + per_page - 1) // per_page, 1)
+
+    def page_link(n, label):
+        args = request.args.to_dict()
+        args['page'] = n
+        return f'<a href="/admin?{safe_display(urlencode(args))}" class="px-3 py-1 rounded bg-gray-700 hover:bg-gray-600">{label}</a>'
+
+    pagination_html = f'<span class="text-sm text-gray-400">{total} users &middot; page {page} of {pages}</span>'
+    if page > 1:
+        pagination_html = page_link(page - 1, 'Previous') + pagination_html
+    if page < pages:
+        pagination_html += page_link(page + 1, 'Next')
+
+    def select_options(choices, current):
+        return ''.join(f'<option value="{value}" {"selected" if value == current else ""}>{label}</option>' for value, label in choices)
+
+    filters_html = f'''
+        <form method="GET" class="mb-6 bg-gray-800 p-4 rounded-lg shadow-lg flex flex-wrap gap-3 items-end">
+            <input type="text" name="q" value="{safe_display(prefix)}" placeholder="Username starts with" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+            <select name="role" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+                {select_options([('', 'Any role'), ('Member', 'Member'), ('Mod', 'Mod'), ('Leader', 'Leader')], role or '')}
+            </select>
+            <select name="status" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+                {select_options([('', 'Any status'), ('active', 'Active'), ('muted', 'Muted')], status)}
+            </select>
+            <select name="power" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+                {select_options([('', 'Any vote power')] + [(str(i), str(i)) for i in range(1, 7)], str(power) if power else '')}
+            </select>
+            <select name="sort" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+                {select_options([('username', 'Sort by username'), ('role', 'Sort by role'), ('votePower', 'Sort by vote power')], sort)}
+            </select>
+            <select name="order" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+                {select_options([('asc', 'Ascending'), ('desc', 'Descending')], order)}
+            </select>
+            <button type="submit" class="btn-green text-white px-4 py-1 rounded">Filter</button>
+        </form>
+    '''
+
+    def render_row(u):
         mute_action = "unmute" if u["muted"] else "mute"
         mute_text = "Unmute" if u["muted"] else "Mute"
         status_text = "Muted" if u["muted"] else "Active"
         options_html = ''.join(f'<option value="{i}" {"selected" if i == u["votePower"] else ""}>{i}</option>' for i in range(1, 6))
         role_options = ''.join(f'<option value="{r}" {"selected" if r == u["role"] else ""}>{r}</option>' for r in ['Member', 'Mod', 'Leader'])
 
-        rows_html += f'''
+        return f'''
         <tr class="hover:bg-gray-700">
             <td class="px-6 py-4 whitespace-nowrap">{safe_display(u["username"])}</td>
             <td class="px-6 py-4 whitespace-nowrap">
@@ -479,7 +943,7 @@ def admin():
         </tr>
         '''
 
-    return f'''
+    return stream_page(f'''
 <!DOCTYPE html>
 <html>
 <head>
@@ -520,8 +984,11 @@ def admin():
         <div class="mb-6 bg-gray-800 p-6 rounded-lg shadow-lg">
             <h2 class="text-xl font-semibold mb-4">Create New User</h2>
             <a href="/register" class="btn-green text-white px-4 py-2 rounded-md inline-block mb-4">Register New User</a>
+            <a href="/admin/audit" class="bg-gray-600 hover:bg-gray-700 text-white px-4 py-2 rounded-md inline-block mb-4 ml-2">Audit log</a>
         </div>
 
+        {filters_html}
+
         <div class="bg-gray-800 rounded-lg shadow-lg overflow-hidden">
             <table class="min-w-full divide-y divide-gray-700">
                 <thead class="bg-gray-700">
@@ -534,27 +1001,29 @@ def admin():
                     </tr>
                 </thead>
                 <tbody class="divide-y divide-gray-700">
-                    {rows_html}
+                    {RECORDS_SLOT}
                 </tbody>
             </table>
         </div>
+        <div class="flex gap-3 items-center mt-4">{pagination_html}</div>
     </div>
 </body>
 </html>
-'''
+''', map(render_row, users))
 
 @app.route('/assign-role', methods=['POST'])
 @require_admin
 def assign_role():
     username = request.form.get('username')
     new_role = request.form.get('role')
-    users = load_json(USERS_FILE)
-    for u in users:
-        if u['username'] == username:
-            if u['username'] in ['adrian', 'ish']: continue
-            u['role'] = new_role
-            break
-    save_json(USERS_FILE, users)
+    with users_store.writing():
+        u = get_user(username)
+        if u and u['username'] not in ['adrian', 'ish'] and u['role'] != new_role:
+            old_role = u['role']
+            user_index.update(u, role=new_role)
+            users_store.save()
+            user_cache.invalidate(u['id'])
+            log_admin_action('assign_role', username, role=new_role, previous=old_role)
     return redirect('/admin')
 
 @app.route('/assign-vote', methods=['POST'])
@@ -562,45 +1031,54 @@ def assign_role():
 def assign_vote():
     username = request.form.get('username')
     power = int(request.form.get('power'))
-    users = load_json(USERS_FILE)
-    for u in users:
-        if u['username'] == username:
-            u['votePower'] = power
-            break
-    save_json(USERS_FILE, users)
+    with users_store.writing():
+        u = get_user(username)
+        if u and u['votePower'] != power:
+            old_power = u['votePower']
+            user_index.update(u, votePower=power)
+            users_store.save()
+            user_cache.invalidate(u['id'])
+            log_admin_action('assign_vote', username, votePower=power, previous=old_power)
     return redirect('/admin')
 
 @app.route('/mute-user', methods=['POST'])
 @require_admin
 def mute_user():
     username = request.form.get('username')
-    users = load_json(USERS_FILE)
-    for u in users:
-        if u['username'] == username:
-            u['muted'] = True
-            break
-    save_json(USERS_FILE, users)
+    with users_store.writing():
+        u = get_user(username)
+        if u and not u['muted']:
+            user_index.update(u, muted=True)
+            users_store.save()
+            user_cache.invalidate(u['id'])
+            log_admin_action('mute_user', username)
     return redirect('/admin')
 
 @app.route('/unmute-user', methods=['POST'])
 @require_admin
 def unmute_user():
     username = request.form.get('username')
-    users = load_json(USERS_FILE)
-    for u in users:
-        if u['username'] == username:
-            u['muted'] = False
-            break
-    save_json(USERS_FILE, users)
+    with users_store.writing():
+        u = get_user(username)
+        if u and u['muted']:
+            user_index.update(u, muted=False)
+            users_store.save()
+            user_cache.invalidate(u['id'])
+            log_admin_action('unmute_user', username)
     return redirect('/admin')
 
 @app.route('/delete-user', methods=['POST'])
 @require_admin
 def delete_user():
     username = request.form.get('username')
-    users = load_json(USERS_FILE)
-    users = [u for u in users if u['username'] != username]
-    save_json(USERS_FILE, users)
+    with users_store.writing():
+        u = get_user(username)
+        if u:
+            users_store.delete(u['id'])
+            user_index.remove(u)
+            user_cache.invalidate(u['id'])
+            sessions.revoke_user(u['id'])
+            log_admin_action('delete_user', username)
     return redirect('/admin')
 
 @app.route('/reset-password', methods=['POST'])
@@ -608,32 +1086,38 @@ def delete_user():
 def reset_password():
     username = request.form.get('username')
     new_password = request.form.get('new_password')
-    users = load_json(USERS_FILE)
-    for u in users:
-        if u['username'] == username:
-            u['password'] = new_password
-            break
-    save_json(USERS_FILE, users)
+    if not new_password:
+        return redirect('/admin')
+    try:
+        hashed = password_pool.hash(new_password)
+    except PoolBusy:
+        return 'Server busy, please try again shortly', 503, {'Retry-After': '2'}
+    with users_store.writing():
+        u = get_user(username)
+        if u:
+            u['password'] = hashed
+            users_store.save()
+            log_admin_action('reset_password', username)
     return redirect('/admin')
 
 @app.route('/admin/content')
 @require_admin
 def admin_content():
-    announcements = load_json(ANNOUNCEMENTS_FILE)
-    polls = load_json(POLLS_FILE)
-    announcements.sort(key=lambda x: x['timestamp'], reverse=True)
-    polls.sort(key=lambda x: x['expires_at'], reverse=True)
+    announcements_store.load()
+    announcements = announcements_by_time.items(descending=True)
+    polls_store.load()
+    polls = polls_by_expiry.items(descending=True)
 
     # Build announcements rows
-    announcements_rows = ''.join(
+    announcements_rows = (
         f'''
         <tr class="hover:bg-gray-700">
-            <td class="px-6 py-4">{a["title"]}</td>
-            <td class="px-6 py-4">{a["author"]}</td>
-            <td class="px-6 py-4">{a["timestamp"]}</td>
+            <td class="px-6 py-4">{safe_display(a["title"])}</td>
+            <td class="px-6 py-4">{safe_display(a["author"])}</td>
+            <td class="px-6 py-4">{safe_display(a["timestamp"])}</td>
             <td class="px-6 py-4">
                 <form action="/delete-announcement" method="POST" class="inline">
-                    <input type="hidden" name="id" value="{a["title"]}">
+                    <input type="hidden" name="id" value="{a["id"]}">
                     <button type="submit" class="bg-red-600 hover:bg-red-700 text-white px-2 py-1 rounded">
                         Delete
                     </button>
@@ -644,11 +1128,11 @@ def admin_content():
     )
 
     # Build polls rows
-    polls_rows = ''.join(
+    polls_rows = (
         f'''
         <tr class="hover:bg-gray-700">
-            <td class="px-6 py-4">{p["question"]}</td>
-            <td class="px-6 py-4">{p["expires_at"]}</td>
+            <td class="px-6 py-4">{safe_display(p["question"])}</td>
+            <td class="px-6 py-4">{safe_display(p["expires_at"])}</td>
             <td class="px-6 py-4">
                 <form action="/delete-poll" method="POST" class="inline">
                     <input type="hidden" name="id" value="{p["id"]}">
@@ -661,18 +1145,17 @@ def admin_content():
                 </a>
             </td>
             <td class="px-6 py-4">
-                <details>
-                    <summary class="cursor-pointer text-green-500">View Votes</summary>
-                    <ul class="mt-2">
-                        {''.join(f'<li>{voter} ➔ {p["options"][vote_idx]}</li>' for voter, vote_idx in p.get("votes", {}).items())}
-                    </ul>
+                <details ontoggle="if (this.open && !this.dataset.loaded) loadVoters(this, {p["id"]}, 1)">
+                    <summary class="cursor-pointer text-green-500">View Votes ({len(p.get("votes", {}))})</summary>
+                    <ul class="mt-2"></ul>
+                    <button type="button" class="hidden mt-2 text-blue-400 hover:underline">Load more</button>
                 </details>
             </td>
         </tr>
         ''' for p in polls
     )
 
-    return f'''
+    return stream_page(f'''
 <!DOCTYPE html>
 <html>
 <head>
@@ -702,6 +1185,22 @@ def admin_content():
         }}
         .input-dark::placeholder {{ color: #9ca3af; }}
     </style>
+    <script>
+        function loadVoters(details, pollId, page) {{
+            details.dataset.loaded = '1';
+            fetch('/admin/polls/' + pollId + '/voters?page=' + page).then(r => r.json()).then(data => {{
+                const list = details.querySelector('ul');
+                for (const v of data.voters) {{
+                    const item = document.createElement('li');
+                    item.textContent = v.username + ' \u2794 ' + v.option;
+                    list.appendChild(item);
+                }}
+                const more = details.querySelector('button');
+                more.classList.toggle('hidden', data.page >= data.pages);
+                more.onclick = () => loadVoters(details, pollId, data.page + 1);
+            }});
+        }}
+    </script>
 </head>
 <body class="gradient-bg min-h-screen">
     <div class="container mx-auto px-4 py-8">
@@ -710,6 +1209,15 @@ def admin_content():
             <a href="/admin" class="text-blue-500 hover:underline">Back to User Admin</a>
         </div>
 
+        <form action="/admin/archive" method="POST" class="mb-8">
+            <button type="submit" class="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded">
+                Archive old announcements and closed polls now
+            </button>
+            <a href="/admin/recount" class="bg-purple-600 hover:bg-purple-700 text-white px-4 py-2 rounded ml-2">Audit poll results</a>
+            <a href="/admin/analytics" class="bg-green-600 hover:bg-green-700 text-white px-4 py-2 rounded ml-2">Poll analytics</a>
+            <a href="/admin/backups" class="bg-gray-600 hover:bg-gray-700 text-white px-4 py-2 rounded ml-2">Backups</a>
+        </form>
+
         <!-- Announcements -->
         <div class="mb-12">
             <h2 class="text-2xl font-semibold mb-4">Announcements</h2>
@@ -724,7 +1232,7 @@ def admin_content():
                         </tr>
                     </thead>
                     <tbody class="divide-y divide-gray-700">
-                        {announcements_rows}
+                        {RECORDS_SLOT}
                     </tbody>
                 </table>
             </div>
@@ -744,7 +1252,7 @@ def admin_content():
                         </tr>
                     </thead>
                     <tbody class="divide-y divide-gray-700">
-                        {polls_rows}
+                        {RECORDS_SLOT}
                     </tbody>
                 </table>
             </div>
@@ -752,21 +1260,410 @@ def admin_content():
     </div>
 </body>
 </html>
+''', announcements_rows, polls_rows)
+
+@app.route('/admin/polls/<int:poll_id>/voters')
+@require_admin
+def poll_voters(poll_id):
+    poll = polls_store.get(poll_id)
+    if not poll:
+        return jsonify({'error': 'Poll Not Found'}), 404
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        page = 1
+    with polls_store.lock:
+        votes = poll.get('votes', {})
+        total = len(votes)
+        start = (page - 1) * VOTERS_PAGE_SIZE
+        voters = [
+            {'username': voter, 'option': poll['options'][choice]}
+            for voter, choice in islice(votes.items(), start, start + VOTERS_PAGE_SIZE)
+        ]
+    return jsonify({
+        'voters': voters,
+        'total': total,
+        'page': page,
+        'pages': max((total + VOTERS_PAGE_SIZE - 1) // VOTERS_PAGE_SIZE, 1),
+    })
+
+@app.route('/admin/recount', methods=['GET', 'POST'])
+@require_admin
+def admin_recount():
+    message = ''
+    users_store.load()
+    vote_power = {u['username']: u['votePower'] for u in users_store.live()}
+    started = time.perf_counter()
+    # Only the repair needs the file to itself
+    if request.method == 'POST':
+        guard = polls_store.writing()
+    else:
+        polls_store.load()
+        guard = polls_store.lock
+    with guard:
+        polls = polls_store.live()
+        report = audit(polls, vote_power)
+        if request.method == 'POST':
+            repaired = 0
+            for entry in report:
+                if entry['mismatch']:
+                    polls_store.get(entry['id'])['results'] = entry['expected']
+                    repaired += 1
+            if repaired:
+                polls_store.save()
+            message = f'Repaired results for {repaired} poll(s).'
+            report = audit(polls, vote_power)
+        vote_count = sum(len(p.get('votes', {})) for p in polls)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    rows_html = ''.join(
+        f'''
+        <tr class="hover:bg-gray-700">
+            <td class="px-6 py-4">{safe_display(entry["question"])}</td>
+            <td class="px-6 py-4">{entry["stored"]}</td>
+            <td class="px-6 py-4">{entry["expected"]}</td>
+            <td class="px-6 py-4">{"Yes" if entry["mismatch"] else "No"}</td>
+            <td class="px-6 py-4">{entry["orphaned"]}</td>
+            <td class="px-6 py-4">{entry["invalid"]}</td>
+        </tr>
+        ''' for entry in report
+    )
+    repair_form = ''
+    if any(entry['mismatch'] for entry in report):
+        repair_form = '''
+        <form method="POST" class="mb-6">
+            <button type="submit" class="bg-red-600 hover:bg-red-700 text-white px-4 py-2 rounded">Repair mismatched results</button>
+        </form>
+        '''
+
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Poll Audit - CapicheSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold">Poll Results Audit</h1>
+            <a href="/admin/content" class="text-blue-500 hover:underline">Back to Content Admin</a>
+        </div>
+        {f'<p class="text-green-300 mb-4">{message}</p>' if message else ''}
+        <p class="mb-4">Recounted {len(polls)} polls and {vote_count} votes in {elapsed_ms:.1f} ms. Votes from deleted users count zero and are listed as orphaned.</p>
+        {repair_form}
+        <div class="overflow-x-auto bg-gray-800 rounded-lg shadow-lg">
+            <table class="min-w-full divide-y divide-gray-700">
+                <thead class="bg-gray-700">
+                    <tr>
+                        <th>Question</th>
+                        <th>Stored</th>
+                        <th>Recounted</th>
+                        <th>Mismatch</th>
+                        <th>Orphaned</th>
+                        <th>Invalid</th>
+                    </tr>
+                </thead>
+                <tbody class="divide-y divide-gray-700">
+                    {rows_html if rows_html else '<tr><td colspan="6" class="px-6 py-4">All poll results match their votes.</td></tr>'}
+                </tbody>
+            </table>
+        </div>
+    </div>
+</body>
+</html>
+'''
+
+@app.route('/admin/analytics/data')
+@require_admin
+def analytics_data():
+    users_store.load()
+    polls_store.load()
+    poll_id = request.args.get('poll', type=int)
+    with polls_store.lock:
+        if poll_id is not None:
+            poll = polls_store.get(poll_id)
+            if not poll:
+                return jsonify({'error': 'Poll Not Found'}), 404
+            polls = [poll]
+        else:
+            polls = polls_by_expiry.items(descending=True)
+        per_poll, totals = analytics.summary(polls, user_index, users_store.version)
+    return jsonify({
+        'totals': dict(totals, by_role=dict(totals['by_role']), by_day=dict(sorted(totals['by_day'].items()))),
+        'polls': [dict(stats, id=poll['id'], question=poll['question'], options=poll['options'],
+                       participation=stats['voters'] / totals['eligible'] if totals['eligible'] else 0)
+                  for poll, stats in per_poll],
+    })
+
+@app.route('/admin/analytics')
+@require_admin
+def analytics_page():
+    users_store.load()
+    polls_store.load()
+    with polls_store.lock:
+        per_poll, totals = analytics.summary(polls_by_expiry.items(descending=True), user_index, users_store.version)
+    eligible = totals['eligible']
+
+    def share(value, total):
+        return f'{100 * value / total:.0f}%' if total else '-'
+
+    polls_html = ''
+    for poll, stats in per_poll:
+        unweighted_total = sum(stats['counts'])
+        weighted_total = sum(stats['weighted'])
+        option_rows = ''.join(
+            f'''
+                <tr>
+                    <td class="pr-6">{safe_display(opt)}</td>
+                    <td class="pr-6">{stats["counts"][i]} ({share(stats["counts"][i], unweighted_total)})</td>
+                    <td class="pr-6">{stats["weighted"][i]} ({share(stats["weighted"][i], weighted_total)})</td>
+                    {''.join(f'<td class="pr-6">{counts[i]}</td>' for counts in stats["by_role"].values())}
+                </tr>''' for i, opt in enumerate(poll['options'])
+        )
+        role_headers = ''.join(f'<th class="pr-6 text-left">{safe_display(role)}</th>' for role in stats['by_role'])
+        days = ', '.join(f'{day}: {count}' for day, count in sorted(stats['by_day'].items()))
+        polls_html += f'''
+        <div class="glass p-6 mb-6">
+            <h2 class="text-xl font-semibold mb-2 text-contrast">{safe_display(poll["question"])}</h2>
+            <p class="text-sm text-contrast-secondary mb-4">
+                {stats["voters"]} of {eligible} members voted ({share(stats["voters"], eligible)}) &middot; closes {safe_display(poll["expires_at"])}
+                {f' &middot; first vote {stats["first_vote"]}, last vote {stats["last_vote"]}' if stats["first_vote"] else ''}
+            </p>
+            <table class="text-sm text-contrast-secondary mb-2">
+                <thead><tr><th class="pr-6 text-left">Option</th><th class="pr-6 text-left">Votes</th><th class="pr-6 text-left">Weighted</th>{role_headers}</tr></thead>
+                <tbody>{option_rows}</tbody>
+            </table>
+            {f'<p class="text-xs text-gray-400">Votes per day: {days}</p>' if days else ''}
+        </div>
+        '''
+
+    role_totals = ', '.join(f'{safe_display(role)}: {count}' for role, count in sorted(totals['by_role'].items()))
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Poll Analytics - CapicheSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .glass {{
+            background: rgba(31, 41, 55, 0.92);
+            box-shadow: 0 8px 32px 0 rgba(31, 41, 55, 0.37);
+            backdrop-filter: blur(6px);
+            border-radius: 1.5rem;
+            border: 1px solid rgba(34,197,94,0.2);
+        }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+        .text-contrast {{ color: #f3f4f6; }}
+        .text-contrast-secondary {{ color: #d1d5db; }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold text-contrast">Poll Analytics</h1>
+            <a href="/admin/content" class="text-blue-400 hover:underline">Back to Content Admin</a>
+        </div>
+        <div class="glass p-6 mb-8 text-contrast-secondary">
+            <p>{totals["polls"]} polls &middot; {totals["votes"]} votes ({totals["weighted"]} weighted) &middot; {eligible} members</p>
+            <p>Average participation: {100 * totals["avg_participation"]:.0f}%</p>
+            {f'<p>Votes by role: {role_totals}</p>' if role_totals else ''}
+        </div>
+        {polls_html if polls_html else '<p class="text-contrast-secondary">No polls yet</p>'}
+    </div>
+</body>
+</html>
+'''
+
+@app.route('/admin/archive', methods=['POST'])
+@require_admin
+def admin_archive():
+    with g.community.archive_running:
+        archive_old_content(g.community)
+    return redirect('/admin/content')
+
+@app.route('/admin/backups', methods=['GET', 'POST'])
+@require_admin
+def admin_backups():
+    backups = g.community.backups
+    message = ''
+    if request.method == 'POST':
+        incremental = request.form.get('kind') == 'incremental'
+        name = backups.snapshot(incremental=incremental)
+        message = f'Wrote {name}.'
+        if incremental and name.endswith('-full.tar.gz'):
+            message += ' There was no earlier snapshot, so it is a full one.'
+    rows_html = ''.join(f'''
+        <tr class="hover:bg-gray-700">
+            <td class="px-6 py-4">{safe_display(name)}</td>
+            <td class="px-6 py-4">{os.path.getsize(backups.path(name)) / 1024:.1f} KiB</td>
+            <td class="px-6 py-4"><a href="/admin/backups/{safe_display(name)}" class="text-blue-400 hover:underline">Download</a></td>
+        </tr>
+        ''' for name in backups.names())
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Backups - CapicheSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold">Backups</h1>
+            <a href="/admin/content" class="text-blue-500 hover:underline">Back to Content Admin</a>
+        </div>
+        {f'<p class="text-green-300 mb-4">{safe_display(message)}</p>' if message else ''}
+        <p class="mb-4">Snapshots are taken while the site stays up. An incremental snapshot holds only what changed since the previous one; restore a full snapshot and the incrementals after it with <code>python backup.py restore</code>.</p>
+        <form method="POST" class="mb-8">
+            <button type="submit" name="kind" value="full" class="bg-blue-600 hover:bg-blue-700 text-white px-4 py-2 rounded">Full snapshot</button>
+            <button type="submit" name="kind" value="incremental" class="bg-purple-600 hover:bg-purple-700 text-white px-4 py-2 rounded ml-2">Incremental snapshot</button>
+        </form>
+        <div class="overflow-x-auto bg-gray-800 rounded-lg shadow-lg">
+            <table class="min-w-full divide-y divide-gray-700">
+                <thead class="bg-gray-700">
+                    <tr>
+                        <th>Snapshot</th>
+                        <th>Size</th>
+                        <th></th>
+                    </tr>
+                </thead>
+                <tbody class="divide-y divide-gray-700">
+                    {rows_html if rows_html else '<tr><td colspan="3" class="px-6 py-4">No snapshots yet.</td></tr>'}
+                </tbody>
+            </table>
+        </div>
+    </div>
+</body>
+</html>
+'''
+
+@app.route('/admin/backups/<name>')
+@require_admin
+def download_backup(name):
+    path = g.community.backups.path(name)
+    if path is None:
+        return 'Backup Not Found', 404
+    return send_file(os.path.abspath(path), mimetype='application/gzip', as_attachment=True, download_name=name)
+
+@app.route('/admin/audit')
+@require_admin
+def admin_audit():
+    filters = {field: request.args.get(field, '').strip() or None for field in ('actor', 'target', 'since', 'until')}
+    until = filters['until']
+    if until and len(until) == 16:
+        # datetime-local inputs stop at minutes; take in the whole minute
+        until += ':59.999999'
+    entries = g.community.audit_log.query(actor=filters['actor'], target=filters['target'], since=filters['since'],
+                                          until=until, limit=AUDIT_PAGE_SIZE)
+    rows_html = ''.join(f'''
+        <tr class="hover:bg-gray-700">
+            <td class="px-6 py-4 whitespace-nowrap">{safe_display(e["time"][:19].replace("T", " "))}</td>
+            <td class="px-6 py-4">{safe_display(e["actor"])}</td>
+            <td class="px-6 py-4">{safe_display(e["action"])}</td>
+            <td class="px-6 py-4">{safe_display(e["target"])}</td>
+            <td class="px-6 py-4">{safe_display(", ".join(f"{k}: {v}" for k, v in e["details"].items()))}</td>
+        </tr>
+        ''' for e in entries)
+    older_html = ''
+    if len(entries) == AUDIT_PAGE_SIZE:
+        args = request.args.to_dict()
+        args['until'] = (datetime.fromisoformat(entries[-1]['time']) - timedelta(microseconds=1)).isoformat()
+        older_html = f'<a href="/admin/audit?{safe_display(urlencode(args))}" class="px-3 py-1 rounded bg-gray-700 hover:bg-gray-600">Older entries</a>'
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Audit Log - CapicheSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold">Audit Log</h1>
+            <a href="/admin" class="text-blue-500 hover:underline">Back to User Admin</a>
+        </div>
+        <form method="GET" class="mb-6 bg-gray-800 p-4 rounded-lg shadow-lg flex flex-wrap gap-3 items-end">
+            <input type="text" name="actor" value="{safe_display(filters['actor'] or '')}" placeholder="Admin" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+            <input type="text" name="target" value="{safe_display(filters['target'] or '')}" placeholder="Username or poll:ID" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1">
+            <label class="text-sm">From <input type="datetime-local" name="since" value="{safe_display((filters['since'] or '')[:16])}" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1"></label>
+            <label class="text-sm">To <input type="datetime-local" name="until" value="{safe_display((filters['until'] or '')[:16])}" class="bg-gray-700 border border-gray-600 text-white rounded px-2 py-1"></label>
+            <button type="submit" class="btn-green text-white px-4 py-1 rounded">Filter</button>
+        </form>
+        <div class="overflow-x-auto bg-gray-800 rounded-lg shadow-lg">
+            <table class="min-w-full divide-y divide-gray-700">
+                <thead class="bg-gray-700">
+                    <tr>
+                        <th>Time</th>
+                        <th>Admin</th>
+                        <th>Action</th>
+                        <th>Target</th>
+                        <th>Details</th>
+                    </tr>
+                </thead>
+                <tbody class="divide-y divide-gray-700">
+                    {rows_html if rows_html else '<tr><td colspan="5" class="px-6 py-4">No matching actions.</td></tr>'}
+                </tbody>
+            </table>
+        </div>
+        <div class="flex gap-3 items-center mt-4">{older_html}</div>
+    </div>
+</body>
+</html>
 '''
 
 @app.route('/edit-poll/<int:poll_id>', methods=['GET', 'POST'])
 @require_admin
 def edit_poll(poll_id):
-    polls = load_json(POLLS_FILE)
-    poll = next((p for p in polls if p['id'] == poll_id), None)
+    poll = polls_store.get(poll_id)
     if not poll:
         return 'Poll Not Found', 404
 
     if request.method == 'POST':
         new_expires = request.form.get('expires_at')
         if new_expires:
-            poll['expires_at'] = new_expires
-            save_json(POLLS_FILE, polls)
+            with polls_store.writing():
+                poll = polls_store.get(poll_id)
+                if not poll:
+                    return 'Poll Not Found', 404
+                old_expires = poll['expires_at']
+                if new_expires != old_expires:
+                    polls_by_expiry.update(poll, expires_at=new_expires)
+                    polls_store.save()
+                    log_admin_action('edit_poll', f'poll:{poll_id}', expires_at=new_expires, previous=old_expires)
             return redirect('/admin/content')
 
     default_expires = poll['expires_at'].replace('T', ' ')[:16]
@@ -821,19 +1718,29 @@ def edit_poll(poll_id):
 @app.route('/delete-announcement', methods=['POST'])
 @require_admin
 def delete_announcement():
-    title = request.form.get('id')
-    announcements = load_json(ANNOUNCEMENTS_FILE)
-    announcements = [a for a in announcements if a['title'] != title]
-    save_json(ANNOUNCEMENTS_FILE, announcements)
+    announcement_id = request.form.get('id', type=int)
+    if announcement_id is None:
+        return 'Invalid announcement id', 400
+    announcement = announcements_store.delete(announcement_id)
+    if announcement:
+        announcement_index.remove(announcement_id)
+        announcements_by_time.remove(announcement)
+        log_admin_action('delete_announcement', f'announcement:{announcement_id}', title=announcement['title'])
     return redirect('/admin/content')
 
 @app.route('/delete-poll', methods=['POST'])
 @require_admin
 def delete_poll():
-    poll_id = int(request.form.get('id'))
-    polls = load_json(POLLS_FILE)
-    polls = [p for p in polls if p['id'] != poll_id]
-    save_json(POLLS_FILE, polls)
+    poll_id = request.form.get('id', type=int)
+    if poll_id is None:
+        return 'Invalid poll id', 400
+    poll = polls_store.delete(poll_id)
+    if poll:
+        polls_by_expiry.remove(poll)
+        polls_by_created.remove(poll)
+        vote_index.remove_poll(poll)
+        analytics.forget(poll_id)
+        log_admin_action('delete_poll', f'poll:{poll_id}', question=poll['question'])
     return redirect('/admin/content')
 
 @app.route('/create-announcement', methods=['GET', 'POST'])
@@ -842,11 +1749,14 @@ def create_announcement():
     if request.method == 'POST':
         title = request.form.get('title')
         content = request.form.get('content')
-        author = session['user']['username']
+        author = current_user()['username']
         timestamp = datetime.now().isoformat()
-        announcements = load_json(ANNOUNCEMENTS_FILE)
-        announcements.append({'title': title, 'content': content, 'author': author, 'timestamp': timestamp})
-        save_json(ANNOUNCEMENTS_FILE, announcements)
+        announcement = {'title': title, 'content': content, 'author': author, 'timestamp': timestamp}
+        with announcements_store.writing():
+            announcement = announcements_store.append(announcement)
+            announcements_store.save()
+            announcement_index.add(announcement)
+            announcements_by_time.add(announcement)
         return redirect('/announcements')
     return f'''
 <!DOCTYPE html>
@@ -911,17 +1821,19 @@ def create_poll():
         expires_at = request.form.get('expires_at')
         if not question or len(options) < 2 or not expires_at:
             return 'Missing required fields', 400
-        polls = load_json(POLLS_FILE)
-        poll_id = max([p['id'] for p in polls], default=0) + 1
-        polls.append({
-            'id': poll_id,
-            'question': question,
-            'options': options,
-            'results': [0]*len(options),
-            'expires_at': expires_at,
-            'votes': {}
-        })
-        save_json(POLLS_FILE, polls)
+        with polls_store.writing():
+            poll = polls_store.append({
+                'question': question,
+                'options': options,
+                'results': [0]*len(options),
+                'expires_at': expires_at,
+                'created_at': datetime.now().isoformat(),
+                'votes': {},
+                'vote_times': {}
+            })
+            polls_store.save()
+            polls_by_expiry.add(poll)
+            polls_by_created.add(poll)
         return redirect('/polls')
 
     default_expires = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%dT%H:%M")
@@ -987,27 +1899,44 @@ def create_poll():
 @app.route('/dictionary', methods=['GET', 'POST'])
 @require_auth
 def dictionary():
-    user = session['user']
+    user = current_user()
     can_add = user['username'] in ['adrian', 'ish']
     message = ''
     error = ''
+    if request.method == 'GET':
+        mark_seen(user, 'dictionary')
     if can_add and request.method == 'POST':
         word = request.form.get('word', '').strip()
         definition = request.form.get('definition', '').strip()
         if not word or not definition:
             error = "Both word and definition are required."
         else:
-            dictionary = load_json(DICTIONARY_FILE)
-            if any(entry['word'].lower() == word.lower() for entry in dictionary):
-                error = "That word already exists in the dictionary."
-            else:
-                dictionary.append({'word': word, 'definition': definition, 'author': user['username'], 'timestamp': datetime.now().isoformat()})
-                save_json(DICTIONARY_FILE, dictionary)
-                message = f'Word "{word}" added successfully.'
+            with dictionary_store.writing():
+                if word_index.find(word) is not None:
+                    error = "That word already exists in the dictionary."
+                else:
+                    similar = [e['word'] for e in word_index.suggest(word, limit=3)]
+                    entry = {'word': word, 'definition': definition, 'author': user['username'], 'timestamp': datetime.now().isoformat()}
+                    entry = dictionary_store.append(entry)
+                    dictionary_store.save()
+                    word_index.insert(entry)
+                    dictionary_index.add(entry)
+                    dictionary_by_time.add(entry)
+                    message = f'Word "{safe_display(word)}" added successfully.'
+                    if similar:
+                        message += ' Similar words already in the dictionary: ' + ', '.join(safe_display(w) for w in similar) + '.'
 
-    dictionary = load_json(DICTIONARY_FILE)
-    dictionary.sort(key=lambda x: x['word'].lower())
-    entries_html = ''.join(
+    query = request.args.get('q', '').strip()
+    suggestions = []
+    with dictionary_store.lock:
+        dictionary_store.load()
+        if query:
+            dictionary = word_index.complete(query)
+            if not dictionary:
+                suggestions = word_index.suggest(query)
+        else:
+            dictionary = word_index.entries()
+    entries_html = (
         f'''
         <div class="glass p-4 mb-4">
             <div class="flex justify-between items-center">
@@ -1018,6 +1947,18 @@ def dictionary():
         </div>
         ''' for entry in dictionary
     )
+    did_you_mean = ''
+    if suggestions:
+        did_you_mean = 'Did you mean: ' + ', '.join(
+            f'<a href="/dictionary?{safe_display(urlencode({"q": s["word"]}))}" class="text-blue-400 hover:underline">{safe_display(s["word"])}</a>'
+            for s in suggestions
+        ) + '?'
+    lookup_form = f'''
+        <form method="GET" class="glass p-4 mb-8 flex gap-4">
+            <input type="text" name="q" value="{safe_display(query)}" placeholder="Look up a word" class="flex-1 px-3 py-2 input-dark rounded-md">
+            <button type="submit" class="btn-green text-white px-4 py-2 rounded-md font-semibold shadow-lg hover:scale-105 transition">Look Up</button>
+        </form>
+    '''
     add_form = ''
     if can_add:
         add_form = f'''
@@ -1028,7 +1969,12 @@ def dictionary():
             <form method="POST" class="space-y-4">
                 <div>
                     <label class="block text-sm font-medium mb-1 text-contrast-secondary">Word</label>
-                    <input type="text" name="word" required class="w-full px-3 py-2 input-dark rounded-md">
+                    <input type="text" name="word" required autocomplete="off" class="w-full px-3 py-2 input-dark rounded-md"
+                           oninput="fetch('/dictionary/autocomplete?q=' + encodeURIComponent(this.value)).then(r => r.json()).then(d => {{
+                               const words = d.completions.concat(d.suggestions);
+                               document.getElementById('similar-words').textContent = this.value && words.length ? 'Existing similar words: ' + words.join(', ') : '';
+                           }})">
+                    <p id="similar-words" class="text-xs text-yellow-400 mt-1"></p>
                 </div>
                 <div>
                     <label class="block text-sm font-medium mb-1 text-contrast-secondary">Definition</label>
@@ -1038,7 +1984,7 @@ def dictionary():
             </form>
         </div>
         '''
-    return f'''
+    return stream_page(f'''
 <!DOCTYPE html>
 <html>
 <head>
@@ -1076,21 +2022,38 @@ def dictionary():
             <a href="/dashboard" class="text-blue-400 hover:underline">Back to Dashboard</a>
         </div>
         {add_form}
+        {lookup_form}
         <div>
-            <h2 class="text-xl font-semibold mb-4 text-contrast">All Words</h2>
-            {entries_html if entries_html else '<p class="text-contrast-secondary">No words in the dictionary yet.</p>'}
+            <h2 class="text-xl font-semibold mb-4 text-contrast">{f'Words starting with "{safe_display(query)}"' if query else 'All Words'}</h2>
+            {f'<p class="text-contrast-secondary mb-4">{did_you_mean}</p>' if did_you_mean else ''}
+            {RECORDS_SLOT}
+            {'<p class="text-contrast-secondary">No words in the dictionary yet.</p>' if not dictionary and not query else ''}
         </div>
     </div>
 </body>
 </html>
-'''
+''', entries_html)
+
+@app.route('/dictionary/autocomplete')
+@require_auth
+def dictionary_autocomplete():
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify({'completions': [], 'suggestions': []})
+    with dictionary_store.lock:
+        dictionary_store.load()
+        completions = [e['word'] for e in word_index.complete(prefix, limit=10)]
+        suggestions = [e['word'] for e in word_index.suggest(prefix) if e['word'] not in completions]
+    return jsonify({'completions': completions, 'suggestions': suggestions})
 
 @app.route('/announcements')
 @require_auth
 def announcements_page():
-    announcements = load_json(ANNOUNCEMENTS_FILE)
-    user = session['user']
-    announcements_html = ''.join(f'''
+    announcements_store.load()
+    announcements = list(announcements_store.live())
+    user = current_user()
+    mark_seen(user, 'announcements')
+    announcements_html = (f'''
         <div class="glass p-6 mb-6">
             <h3 class="text-lg font-bold mb-1 text-contrast">{safe_display(a["title"])}</h3>
             <p class="text-contrast-secondary mb-2">{safe_display(a["content"])}</p>
@@ -1098,7 +2061,7 @@ def announcements_page():
         </div>
     ''' for a in announcements)
     no_announcements = '<p class="text-contrast-secondary">No announcements yet</p>' if not announcements else ''
-    return f'''
+    return stream_page(f'''
 <!DOCTYPE html>
 <html>
 <head>
@@ -1133,42 +2096,60 @@ def announcements_page():
             <h2 class="text-xl font-semibold mb-4 text-contrast">Recent Updates</h2>
             {f'<a href="/create-announcement" class="btn-green text-white px-4 py-2 rounded-md inline-block mb-4">Create Announcement</a>' if user['role'] in ["Leader", "Mod"] else ''}
             <div class="space-y-6">
-                {announcements_html}
+                {RECORDS_SLOT}
                 {no_announcements}
             </div>
         </div>
     </div>
 </body>
 </html>
-'''
+''', announcements_html)
 
 @app.route('/polls', methods=['GET', 'POST'])
 @require_auth
 def polls_page():
-    user = session['user']
+    user = current_user()
     username = user['username']
     vote_power = user['votePower']
-    polls = load_json(POLLS_FILE)
+    polls_store.load()
+    polls = polls_store.live()
     now = datetime.now()
+    if request.method == 'GET':
+        mark_seen(user, 'polls')
 
     if request.method == 'POST':
-        poll_id = int(request.form.get('poll_id'))
-        choice = int(request.form.get('choice'))
-        for poll in polls:
-            if poll['id'] == poll_id:
+        try:
+            poll_id = int(request.form.get('poll_id'))
+            choice = int(request.form.get('choice'))
+        except (TypeError, ValueError):
+            return 'Invalid vote', 400
+        with polls_store.writing():
+            poll = polls_store.get(poll_id)
+            if poll:
+                if not 0 <= choice < len(poll['options']):
+                    return 'Invalid choice', 400
                 expires_at = datetime.fromisoformat(poll['expires_at'])
                 if expires_at > now and username not in poll.get('votes', {}):
+                    voted_at = now.isoformat()
                     poll.setdefault('votes', {})[username] = choice
+                    poll.setdefault('vote_times', {})[username] = voted_at
                     poll['results'][choice] += vote_power
-                    break
-        save_json(POLLS_FILE, polls)
-        return redirect('/polls')
+                    polls_store.save()
+                    vote_index.add(username, poll_id)
+                    analytics.record_vote(poll, username, choice, vote_power, user['role'], voted_at, users_store.version)
+        return redirect(request.referrer or '/polls')
 
-    polls_html = ''
-    for p in polls:
+    awaiting = polls_awaiting_vote(username, now)
+    show_awaiting = request.args.get('filter') == 'awaiting'
+    if show_awaiting:
+        polls = awaiting
+    voted = vote_index.voted(username)
+    polls = list(polls)
+
+    def render_poll(p):
         options_html = ''
+        is_disabled = p["id"] in voted or datetime.fromisoformat(p["expires_at"]) <= now
         for i, opt in enumerate(p["options"]):
-            is_disabled = username in p.get("votes", {}) or datetime.fromisoformat(p["expires_at"]) <= now
             options_html += f'''
             <div class="flex items-center mb-1">
                 <input type="radio" name="choice" value="{i}" id="choice-{p["id"]}-{i}" {"disabled" if is_disabled else ""} class="mr-2 accent-green-500">
@@ -1177,23 +2158,30 @@ def polls_page():
                 </label>
             </div>
             '''
-        is_button_disabled = username in p.get("votes", {}) or datetime.fromisoformat(p["expires_at"]) <= now
-        polls_html += f'''
+        return f'''
         <div class="glass p-6 mb-8">
             <h2 class="text-xl sm:text-2xl font-semibold mb-4 text-contrast">{safe_display(p["question"])}</h2>
             <p class="text-sm text-gray-400 mb-4">Expires: {p["expires_at"]}</p>
             <form method="POST" class="space-y-3">
                 <input type="hidden" name="poll_id" value="{p["id"]}">
                 {options_html}
-                <button type="submit" class="mt-4 btn-green text-white px-4 py-1 rounded-md inline-block font-semibold shadow-lg hover:scale-105 transition" {"disabled" if is_button_disabled else ""}>
+                <button type="submit" class="mt-4 btn-green text-white px-4 py-1 rounded-md inline-block font-semibold shadow-lg hover:scale-105 transition" {"disabled" if is_disabled else ""}>
                     Vote
                 </button>
             </form>
         </div>
         '''
     no_polls = '<p class="text-contrast-secondary">No active polls</p>' if not polls else ''
+    if show_awaiting and not polls:
+        no_polls = '<p class="text-contrast-secondary">You have voted in every active poll</p>'
+    filter_tabs = f'''
+            <div class="flex gap-4 text-sm">
+                <a href="/polls" class="{"text-contrast font-semibold" if not show_awaiting else "text-blue-400 hover:underline"}">All polls</a>
+                <a href="/polls?filter=awaiting" class="{"text-contrast font-semibold" if show_awaiting else "text-blue-400 hover:underline"}">Awaiting your vote ({len(awaiting)})</a>
+            </div>
+    '''
 
-    return f'''
+    return stream_page(f'''
 <!DOCTYPE html>
 <html>
 <head>
@@ -1232,18 +2220,204 @@ def polls_page():
         </div>
         <div class="space-y-8">
             {f'<a href="/create-poll" class="btn-green text-white px-4 py-2 rounded-md inline-block">Create Poll</a>' if user['role'] in ["Leader", "Mod"] else ''}
-            {polls_html}
+            {filter_tabs}
+            {RECORDS_SLOT}
             {no_polls}
         </div>
     </div>
 </body>
 </html>
+''', map(render_poll, polls))
+
+@app.route('/search')
+@require_auth
+def search():
+    query = request.args.get('q', '').strip()
+    scope = request.args.get('type', 'all')
+    results = []
+    if query:
+        if scope in ('all', 'announcements'):
+            announcements_store.load()
+            live = announcement_index.search(query)
+            results += [(score, 'announcement', a) for score, a in live]
+            # Announcements moved to the archive stay searchable; one being
+            # archived right now may briefly show up in both
+            live_ids = {a['id'] for _, a in live}
+            results += [(score, 'archived', a) for score, a in archived_announcement_index.search(query)
+                        if a['id'] not in live_ids]
+        if scope in ('all', 'dictionary'):
+            dictionary_store.load()
+            results += [(score, 'dictionary', d) for score, d in dictionary_index.search(query)]
+        results.sort(key=lambda r: r[0], reverse=True)
+
+    results_html = ''
+    for _, kind, item in results:
+        if kind in ('announcement', 'archived'):
+            label = 'Archived announcement' if kind == 'archived' else 'Announcement'
+            results_html += f'''
+        <div class="glass p-6 mb-4">
+            <p class="text-xs uppercase text-green-400 mb-1">{label}</p>
+            <h3 class="text-lg font-bold mb-1 text-contrast">{safe_display(item["title"])}</h3>
+            <p class="text-contrast-secondary mb-2">{safe_display(item["content"])}</p>
+            <p class="text-xs text-gray-400">Posted by {safe_display(item["author"])} on {safe_display(item["timestamp"])}</p>
+        </div>
+        '''
+        else:
+            results_html += f'''
+        <div class="glass p-6 mb-4">
+            <p class="text-xs uppercase text-green-400 mb-1">Dictionary</p>
+            <h3 class="text-lg font-bold mb-1 text-contrast">{safe_display(item["word"])}</h3>
+            <p class="text-contrast-secondary mb-2">{safe_display(item["definition"])}</p>
+            <p class="text-xs text-gray-400">by {safe_display(item["author"])} on {safe_display(item["timestamp"]).split("T")[0]}</p>
+        </div>
+        '''
+    no_results = '<p class="text-contrast-secondary">No matches found</p>' if query and not results else ''
+    scope_options = ''.join(
+        f'<option value="{value}" {"selected" if value == scope else ""}>{label}</option>'
+        for value, label in [('all', 'Everything'), ('announcements', 'Announcements'), ('dictionary', 'Dictionary')]
+    )
+
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Search - GabeeshSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .glass {{
+            background: rgba(31, 41, 55, 0.92);
+            box-shadow: 0 8px 32px 0 rgba(31, 41, 55, 0.37);
+            backdrop-filter: blur(6px);
+            border-radius: 1.5rem;
+            border: 1px solid rgba(34,197,94,0.2);
+        }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+        .text-contrast {{ color: #f3f4f6; }}
+        .text-contrast-secondary {{ color: #d1d5db; }}
+        .input-dark {{
+            background-color: #1f2937;
+            color: #f3f4f6;
+            border: 1px solid #374151;
+        }}
+        .input-dark::placeholder {{ color: #9ca3af; }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold text-contrast">Search</h1>
+            <a href="/dashboard" class="text-blue-400 hover:underline">Back to Dashboard</a>
+        </div>
+        <form method="GET" class="glass p-6 mb-8 flex flex-col sm:flex-row gap-4">
+            <input type="text" name="q" value="{safe_display(query)}" placeholder="Search announcements and words" class="flex-1 px-3 py-2 input-dark rounded-md">
+            <select name="type" class="px-3 py-2 input-dark rounded-md">{scope_options}</select>
+            <button type="submit" class="btn-green text-white px-4 py-2 rounded-md font-semibold shadow-lg hover:scale-105 transition">Search</button>
+        </form>
+        <div>
+            {results_html}
+            {no_results}
+        </div>
+    </div>
+</body>
+</html>
+'''
+
+@app.route('/archive')
+@require_auth
+def archive_index():
+    sections_html = ''
+    for kind, label in [('announcements', 'Announcements'), ('polls', 'Polls')]:
+        months = archive.months(kind)
+        links = ''.join(
+            f'<li><a href="/archive/{kind}/{month}" class="text-blue-400 hover:underline">{month}</a> <span class="text-xs text-gray-400">({count})</span></li>'
+            for month, count in months
+        )
+        sections_html += f'''
+        <div class="glass p-6 mb-6">
+            <h2 class="text-xl font-semibold mb-4 text-contrast">{label}</h2>
+            {f'<ul class="space-y-1 text-contrast-secondary">{links}</ul>' if links else '<p class="text-contrast-secondary">Nothing archived yet</p>'}
+        </div>
+        '''
+    return archive_page('Archive', sections_html)
+
+@app.route('/archive/<kind>/<month>')
+@require_auth
+def archive_month(kind, month):
+    if kind not in ('announcements', 'polls'):
+        return 'Not Found', 404
+    records = archive.load(kind, month)
+    if records is None:
+        return 'Not Found', 404
+    items_html = ''
+    if kind == 'announcements':
+        for a in sorted(records, key=lambda x: x['timestamp'], reverse=True):
+            items_html += f'''
+        <div class="glass p-6 mb-6">
+            <h3 class="text-lg font-bold mb-1 text-contrast">{safe_display(a["title"])}</h3>
+            <p class="text-contrast-secondary mb-2">{safe_display(a["content"])}</p>
+            <p class="text-xs text-gray-400">Posted by {safe_display(a["author"])} on {safe_display(a["timestamp"])}</p>
+        </div>
+        '''
+    else:
+        for p in sorted(records, key=lambda x: x['expires_at'], reverse=True):
+            results_html = ''.join(
+                f'<li>{safe_display(opt)} <span class="text-xs text-gray-400">({p["results"][i]} votes)</span></li>'
+                for i, opt in enumerate(p['options'])
+            )
+            items_html += f'''
+        <div class="glass p-6 mb-6">
+            <h3 class="text-lg font-bold mb-1 text-contrast">{safe_display(p["question"])}</h3>
+            <p class="text-xs text-gray-400 mb-2">Closed: {safe_display(p["expires_at"])}</p>
+            <ul class="text-contrast-secondary space-y-1">{results_html}</ul>
+        </div>
+        '''
+    return archive_page(f'Archived {kind.capitalize()} - {safe_display(month)}', items_html)
+
+def archive_page(heading, body_html):
+    return f'''
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Archive - GabeeshSocial</title>
+    <script src="https://cdn.tailwindcss.com"></script>
+    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600;800&family=Montserrat:wght@400;700&display=swap" rel="stylesheet">
+    <style>
+        :root {{ --color-green: #22c55e; }}
+        body {{ font-family: 'Montserrat', 'Inter', sans-serif; }}
+        .btn-green {{ background-color: var(--color-green); }}
+        .glass {{
+            background: rgba(31, 41, 55, 0.92);
+            box-shadow: 0 8px 32px 0 rgba(31, 41, 55, 0.37);
+            backdrop-filter: blur(6px);
+            border-radius: 1.5rem;
+            border: 1px solid rgba(34,197,94,0.2);
+        }}
+        .gradient-bg {{
+            background: linear-gradient(135deg, #22c55e 0%, #2563eb 100%);
+        }}
+        .text-contrast {{ color: #f3f4f6; }}
+        .text-contrast-secondary {{ color: #d1d5db; }}
+    </style>
+</head>
+<body class="gradient-bg min-h-screen">
+    <div class="container mx-auto px-4 py-8">
+        <div class="flex justify-between items-center mb-8">
+            <h1 class="text-3xl font-bold text-contrast">{heading}</h1>
+            <a href="/archive" class="text-blue-400 hover:underline">Back to Archive</a>
+        </div>
+        {body_html}
+    </div>
+</body>
+</html>
 '''
 
 if __name__ == '__main__':
-    # Use only one method to run your app.
-    # EITHER run with: python app.py
-    # OR run with: flask run (and set FLASK_APP=app.py)
-    # Recommended for most users:
-    print("Starting app...")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Same as `python serve.py`: the production server, not the debugger
+    import serve
+    serve.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+from serializers import DATA_SERIALIZER
+from storage import interprocess_lock
+
+
+class Archive:
+    """Immutable, month-segmented storage for content moved out of the hot files.
+
+    Each archival run writes new segment files named ``<kind>-<YYYY-MM>-<n>.json``
+    and never touches existing ones, so a month may be split over several
+    parts.  ``index.json`` maps kind -> month -> parts and item counts, which is
+    all the archive listing needs; a month's records are only read when that
+    month is viewed.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.index_path = os.path.join(base_dir, 'index.json')
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def exclusive(self):
+        # Serializes segment and index writes across threads and worker
+        # processes; the lock file sits beside the directory
+        with self.lock, interprocess_lock(self.base_dir + '.lock'):
+            yield
+
+    def _read_index(self):
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _write_atomic(self, path, data):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(DATA_SERIALIZER.dumps(data))
+        os.replace(tmp_path, path)
+
+    def write(self, kind, records, date_field):
+        by_month = {}
+        for record in records:
+            by_month.setdefault(record[date_field][:7], []).append(record)
+        with self.exclusive():
+            os.makedirs(self.base_dir, exist_ok=True)
+            index = self._read_index()
+            months = index.setdefault(kind, {})
+            for month, items in by_month.items():
+                entry = months.setdefault(month, {'parts': [], 'count': 0})
+                name = f'{kind}-{month}-{len(entry["parts"]) + 1}.json'
+                self._write_atomic(os.path.join(self.base_dir, name), items)
+                entry['parts'].append(name)
+                entry['count'] += len(items)
+            self._write_atomic(self.index_path, index)
+
+    def months(self, kind):
+        with self.lock:
+            months = self._read_index().get(kind, {})
+        return sorted(((month, entry['count']) for month, entry in months.items()), reverse=True)
+
+    def parts(self, kind):
+        with self.lock:
+            months = self._read_index().get(kind, {})
+        return [name for entry in months.values() for name in entry['parts']]
+
+    def read_part(self, name):
+        return _read_segment(os.path.join(self.base_dir, name))
+
+    def load(self, kind, month):
+        with self.lock:
+            entry = self._read_index().get(kind, {}).get(month)
+        if entry is None:
+            return None
+        records = []
+        for name in entry['parts']:
+            records.extend(_read_segment(os.path.join(self.base_dir, name)))
+        return records
+
+
+# Segments are never rewritten, so their parsed contents can be cached by path
+@lru_cache(maxsize=32)
+def _read_segment(path):
+    with open(path, 'rb') as f:
+        return tuple(DATA_SERIALIZER.loads(f.read()))
@@ -0,0 +1,145 @@
+"""Asyncio deployment mode: ``uvicorn asgi:application``.
+
+One event loop owns every connection, so idle keep-alive clients, slow
+uploads and slow readers cost a socket rather than an OS thread.  Flask
+views, and with them every storage read and write, run on a small
+executor; the loop only hands finished requests over and ships the
+response back, one chunk at a time for streamed bodies.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, init_data
+
+IO_WORKERS = int(os.environ.get('ASGI_IO_WORKERS', 8))
+MAX_BODY = 1024 * 1024  # bytes
+
+
+class WSGIBridge:
+    """Serves a WSGI app over ASGI, running it on ``executor``."""
+
+    def __init__(self, wsgi_app, executor):
+        self.wsgi_app = wsgi_app
+        self.executor = executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await loop.run_in_executor(self.executor, init_data)
+                except ValueError as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if size > MAX_BODY:
+                return False
+            chunks.append(chunk)
+            if not message.get('more_body'):
+                return b''.join(chunks)
+
+    def _environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': io.BytesIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope['headers']:
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[name] = value
+                continue
+            key = 'HTTP_' + name
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        if body is False:
+            await send({'type': 'http.response.start', 'status': 413, 'headers': [(b'content-length', b'0')]})
+            await send({'type': 'http.response.body', 'body': b''})
+            return
+
+        response = {}
+        # Every call into the app runs in this one context, though not on
+        # one thread: a streamed body keeps the request context pushed
+        # between chunks and pops it on close, which only works in the
+        # context that pushed it
+        context = contextvars.copy_context()
+        pending = None
+
+        def call(fn, *args):
+            nonlocal pending
+            pending = self.executor.submit(context.run, fn, *args)
+            return asyncio.wrap_future(pending)
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+            return lambda data: None
+
+        result = await call(self.wsgi_app, self._environ(scope, body), start_response)
+        try:
+            await send({'type': 'http.response.start', 'status': response['status'], 'headers': response['headers']})
+            # One chunk per executor call, so a slow reader holds a socket
+            # and a suspended generator but no thread
+            chunks = await call(iter, result)
+            while True:
+                chunk = await call(next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            if pending is not None and not pending.done():
+                # Cancelled mid-chunk: the context can't be entered twice at once
+                await asyncio.wait([asyncio.wrap_future(pending)])
+            if hasattr(result, 'close'):
+                await call(result.close)
+
+
+application = WSGIBridge(app, ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='storage'))
@@ -0,0 +1,156 @@
+import bisect
+import json
+import os
+import threading
+from datetime import datetime
+from functools import lru_cache
+
+from storage import interprocess_lock
+
+SEGMENT_SIZE = 1 << 20  # bytes before a segment is sealed and a new one started
+TIME_STRIDE = 64  # entries between points of a segment's time index
+
+
+class AuditLog:
+    """Append-only record of admin actions, in size-rotated segments.
+
+    Each action is one compact JSON line, ``[time, actor, action, target,
+    details]``, appended to the newest segment; nothing written is ever
+    rewritten.  Once a segment passes ``segment_size`` it is sealed with a
+    small index beside it: its time range, the line offsets of every
+    actor's and target's entries and the time of every TIME_STRIDE-th
+    line.  Queries skip segments outside their time range and seek straight
+    to the lines they return.  The open segment's index is kept in memory
+    and extended as the segment grows.
+    """
+
+    FIELDS = ('time', 'actor', 'action', 'target', 'details')
+
+    def __init__(self, base_dir, segment_size=SEGMENT_SIZE):
+        self.base_dir = base_dir
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+        self._open = None  # (segment name, bytes indexed, index)
+
+    def _segments(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted(name for name in os.listdir(self.base_dir) if name.endswith('.log'))
+
+    def record(self, actor, action, target, **details):
+        os.makedirs(self.base_dir, exist_ok=True)
+        with self.lock, interprocess_lock(os.path.join(self.base_dir, 'audit.lock')):
+            # Stamped under the lock, so lines are in time order across
+            # processes, which query() relies on
+            entry = [datetime.now().isoformat(), actor, action, target, details]
+            line = json.dumps(entry, separators=(',', ':')) + '\n'
+            segments = self._segments()
+            name = segments[-1] if segments else 'audit-000001.log'
+            path = os.path.join(self.base_dir, name)
+            if os.path.exists(path) and os.path.getsize(path) >= self.segment_size:
+                self._seal(name)
+                name = f'audit-{int(name[6:12]) + 1:06d}.log'
+            with open(os.path.join(self.base_dir, name), 'a') as f:
+                f.write(line)
+
+    def _seal(self, name):
+        index, _ = _build_index(os.path.join(self.base_dir, name))
+        index_path = os.path.join(self.base_dir, name[:-4] + '.idx')
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(index_path + '.tmp', index_path)
+
+    def _index(self, name):
+        index_path = os.path.join(self.base_dir, name[:-4] + '.idx')
+        if os.path.exists(index_path):
+            return _read_index(index_path)
+        with self.lock:
+            if self._open is None or self._open[0] != name:
+                self._open = (name, 0, None)
+            _, indexed, index = self._open
+            index, indexed = _build_index(os.path.join(self.base_dir, name), indexed, index)
+            self._open = (name, indexed, index)
+            return index
+
+    def query(self, actor=None, target=None, since=None, until=None, limit=100):
+        """Newest-first entries matching every filter given.
+
+        ``since`` and ``until`` are ISO timestamps, both inclusive.
+        Returns dicts keyed by FIELDS.
+        """
+        results = []
+        for name in reversed(self._segments()):
+            index = self._index(name)
+            if not index['count']:
+                continue
+            if since is not None and index['last'] < since:
+                break  # every older segment is older still
+            if until is not None and index['first'] > until:
+                continue
+            path = os.path.join(self.base_dir, name)
+            offsets = None
+            for field, value in [('actor', actor), ('target', target)]:
+                if value is not None:
+                    found = set(index[field].get(value, ()))
+                    offsets = found if offsets is None else offsets & found
+            if offsets is None:
+                # No key to look up: scan from the time index point before ``since``
+                times = index['times']
+                start = times[max(bisect.bisect_left(times, [since]) - 1, 0)][1] if since else 0
+                entries = reversed(_read_from(path, start))
+            else:
+                entries = _read_at(path, sorted(offsets, reverse=True))
+            for entry in entries:
+                if since is not None and entry[0] < since:
+                    break
+                if until is not None and entry[0] > until:
+                    continue
+                results.append(dict(zip(self.FIELDS, entry)))
+                if len(results) >= limit:
+                    return results
+        return results
+
+
+def _build_index(path, start=0, index=None):
+    # Indexes the lines from byte ``start`` on; returns the index and the
+    # offset it reached, so the open segment's index grows incrementally
+    if index is None:
+        index = {'first': None, 'last': None, 'count': 0, 'actor': {}, 'target': {}, 'times': []}
+    if not os.path.exists(path):
+        return index, start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        offset = start
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # a write still in progress
+            time, actor, _, target, _ = json.loads(line)
+            if index['count'] % TIME_STRIDE == 0:
+                index['times'].append([time, offset])
+            index['first'] = index['first'] or time
+            index['last'] = time
+            index['count'] += 1
+            index['actor'].setdefault(actor, []).append(offset)
+            index['target'].setdefault(str(target), []).append(offset)
+            offset += len(line)
+    return index, offset
+
+
+def _read_from(path, start):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return [json.loads(line) for line in f if line.endswith(b'\n')]
+
+
+def _read_at(path, offsets):
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            yield json.loads(f.readline())
+
+
+# Sealed segments never change, so their indexes can be cached by path
+@lru_cache(maxsize=64)
+def _read_index(path):
+    with open(path, 'r') as f:
+        return json.load(f)
@@ -0,0 +1,222 @@
+"""Online backups of a community's data.
+
+``python backup.py snapshot [--incremental]`` writes a snapshot of the
+default community (or ``--community NAME``) while the site keeps running;
+``python backup.py restore FULL [INCREMENTAL ...] --to DIR`` rebuilds the
+data files from a full snapshot and the incrementals taken after it.
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+from datetime import datetime
+
+from records import encode, record_digest
+from serializers import DATA_SERIALIZER, SNAPSHOT_SERIALIZER
+from storage import link_or_copy, write_barrier
+
+MANIFEST = 'manifest.json'
+
+
+def read_records(path, tombstones_path=None):
+    with open(path, 'rb') as f:
+        records = DATA_SERIALIZER.loads(f.read())
+    if tombstones_path and os.path.exists(tombstones_path):
+        with open(tombstones_path, 'r') as f:
+            deleted = {int(line) for line in f if line.strip()}
+        records = [r for r in records if r.get('id') not in deleted]
+    return records
+
+
+class Backups:
+    """Consistent point-in-time snapshots of one community, as ``.tar.gz``.
+
+    Writes are held off only while the current files are hard-linked into
+    a staging directory (see ``Dataset.snapshot``); reading, diffing and
+    compressing them happen afterwards with no lock held.  An incremental
+    snapshot holds just the records added, changed or deleted since the
+    previous snapshot, found by comparing the per-record digests kept in
+    that snapshot's manifest.
+    """
+
+    def __init__(self, base_dir, stores, sequences, archive):
+        self.base_dir = base_dir
+        self.stores = stores
+        self.sequences = sequences
+        self.archive = archive
+        self.lock = threading.Lock()
+        self.manifest_path = os.path.join(base_dir, MANIFEST)
+
+    def names(self):
+        if not os.path.isdir(self.base_dir):
+            return []
+        return sorted((n for n in os.listdir(self.base_dir) if n.endswith('.tar.gz')), reverse=True)
+
+    def path(self, name):
+        if name not in self.names():
+            return None
+        return os.path.join(self.base_dir, name)
+
+    def last_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path, 'r') as f:
+            return json.load(f)
+
+    def _capture(self, staging):
+        with write_barrier(self.stores.values()), self.archive.exclusive():
+            files = {kind: store.snapshot(staging) for kind, store in self.stores.items()}
+            if os.path.exists(self.sequences.path):
+                link_or_copy(self.sequences.path, os.path.join(staging, os.path.basename(self.sequences.path)))
+            segments = []
+            if os.path.isdir(self.archive.base_dir):
+                os.makedirs(os.path.join(staging, 'archive'))
+                for name in os.listdir(self.archive.base_dir):
+                    if name.endswith('.json'):
+                        link_or_copy(os.path.join(self.archive.base_dir, name), os.path.join(staging, 'archive', name))
+                        segments.append(name)
+        return files, segments
+
+    def snapshot(self, incremental=False):
+        """Writes a snapshot and returns its file name.
+
+        Falls back to a full snapshot when there is no previous one to
+        build an incremental on.
+        """
+        with self.lock:
+            os.makedirs(self.base_dir, exist_ok=True)
+            previous = self.last_manifest() if incremental else None
+            snapshot_id = datetime.now().strftime('%Y%m%dT%H%M%S%f')
+            name = f'{snapshot_id}-{"incremental" if previous else "full"}.tar.gz'
+            staging = os.path.join(self.base_dir, f'.staging-{snapshot_id}')
+            os.makedirs(staging)
+            try:
+                files, segments = self._capture(staging)
+                manifest = {'id': snapshot_id, 'base': previous and previous['id'],
+                            'created_at': datetime.now().isoformat(), 'records': {}, 'segments': sorted(segments)}
+                tmp_path = os.path.join(self.base_dir, name + '.tmp')
+                with tarfile.open(tmp_path, 'w:gz') as tar:
+                    for kind, store in self.stores.items():
+                        data_name = os.path.basename(store.path)
+                        if data_name not in files[kind]:
+                            continue
+                        records = read_records(os.path.join(staging, data_name),
+                                               os.path.join(staging, data_name + '.tombstones'))
+                        digests = {str(r['id']): record_digest(r) for r in records}
+                        manifest['records'][kind] = digests
+                        if previous is None:
+                            for file_name in files[kind]:
+                                tar.add(os.path.join(staging, file_name), arcname=file_name)
+                            continue
+                        before = previous['records'].get(kind, {})
+                        delta = {
+                            'changed': [r for r in records if before.get(str(r['id'])) != digests[str(r['id'])]],
+                            'deleted': sorted(int(i) for i in before if i not in digests),
+                        }
+                        _add_file(tar, f'{kind}.delta{SNAPSHOT_SERIALIZER.suffix}', SNAPSHOT_SERIALIZER.dumps(delta))
+                    sequences_name = os.path.basename(self.sequences.path)
+                    if os.path.exists(os.path.join(staging, sequences_name)):
+                        tar.add(os.path.join(staging, sequences_name), arcname=sequences_name)
+                    # Archive segments are never rewritten; only the index changes
+                    old_segments = set(previous['segments']) if previous else set()
+                    for segment in segments:
+                        if segment not in old_segments or segment == 'index.json':
+                            tar.add(os.path.join(staging, 'archive', segment), arcname=f'archive/{segment}')
+                    _add_file(tar, MANIFEST, json.dumps(manifest, indent=2, default=encode).encode())
+                os.replace(tmp_path, os.path.join(self.base_dir, name))
+                tmp_path = self.manifest_path + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump(manifest, f)
+                os.replace(tmp_path, self.manifest_path)
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+            return name
+
+
+def _add_file(tar, name, raw):
+    info = tarfile.TarInfo(name)
+    info.size = len(raw)
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, io.BytesIO(raw))
+
+
+def restore(archives, target_dir):
+    """Rebuilds the data files in ``target_dir`` from a full snapshot
+    followed by the incrementals taken after it, in order.
+
+    Raises ValueError if the chain is broken.
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    last_id = None
+    for path in archives:
+        with tarfile.open(path, 'r:gz') as tar:
+            manifest = json.load(tar.extractfile(MANIFEST))
+            if manifest['base'] != last_id:
+                raise ValueError(f'{path} follows snapshot {manifest["base"]}, not {last_id}')
+            for member in tar.getmembers():
+                if member.name == MANIFEST:
+                    continue
+                raw = tar.extractfile(member).read()
+                kind, dot, suffix = member.name.partition('.delta')
+                if dot:
+                    # Deltas are binary snapshots; older backups wrote JSON
+                    serializer = SNAPSHOT_SERIALIZER if suffix == SNAPSHOT_SERIALIZER.suffix else DATA_SERIALIZER
+                    _apply_delta(os.path.join(target_dir, f'{kind}.json'), serializer.loads(raw))
+                    continue
+                if member.name.endswith('.tombstones'):
+                    continue
+                dest = os.path.join(target_dir, member.name)
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with open(dest, 'wb') as f:
+                    f.write(raw)
+                tombstones = member.name + '.tombstones'
+                if tombstones in tar.getnames():
+                    deleted = {int(line) for line in tar.extractfile(tombstones).read().decode().split()}
+                    records = [r for r in read_records(dest) if r.get('id') not in deleted]
+                    with open(dest, 'wb') as f:
+                        f.write(DATA_SERIALIZER.dumps(records))
+        last_id = manifest['id']
+    return last_id
+
+
+def _apply_delta(path, delta):
+    records = {r['id']: r for r in read_records(path)}
+    for record_id in delta['deleted']:
+        records.pop(record_id, None)
+    for record in delta['changed']:
+        records[record['id']] = record
+    with open(path, 'wb') as f:
+        f.write(DATA_SERIALIZER.dumps([records[i] for i in sorted(records)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    snapshot = sub.add_parser('snapshot', help='write a snapshot under <community>/backups')
+    snapshot.add_argument('--incremental', action='store_true', help='only changes since the last snapshot')
+    snapshot.add_argument('--community', default=None)
+    restore_cmd = sub.add_parser('restore', help='rebuild data files from snapshots')
+    restore_cmd.add_argument('archives', nargs='+', help='a full snapshot, then incrementals in order')
+    restore_cmd.add_argument('--to', required=True, help='directory to write the data files to')
+    args = parser.parse_args()
+
+    if args.command == 'restore':
+        print(f'restored snapshot {restore(args.archives, args.to)} into {args.to}')
+        return
+    import app
+    community = app.communities.acquire(args.community or app.communities.DEFAULT)
+    if community is None:
+        parser.error(f'no community named {args.community}')
+    try:
+        name = community.backups.snapshot(incremental=args.incremental)
+    finally:
+        app.communities.release(community)
+        community.close()
+    print(os.path.join(community.backups.base_dir, name))
+
+
+if __name__ == '__main__':
+    main()
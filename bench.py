@@ -0,0 +1,368 @@
+"""Micro-benchmarks for the storage and tally code paths.
+
+Run with ``python bench.py <name> [options]``; each benchmark builds its own
+synthetic data and never touches the ``data/`` directory.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import socket
+import tempfile
+import time
+import tracemalloc
+
+
+def synthetic_polls(n_polls, n_votes, n_users, seed=0):
+    rng = random.Random(seed)
+    vote_power = {f'user{i}': rng.randint(1, 6) for i in range(n_users)}
+    usernames = list(vote_power)
+    per_poll = max(n_votes // n_polls, 1)
+    polls = []
+    for poll_id in range(1, n_polls + 1):
+        n_options = rng.randint(2, 5)
+        votes = {u: rng.randrange(n_options) for u in rng.sample(usernames, min(per_poll, n_users))}
+        results = [0] * n_options
+        for u, choice in votes.items():
+            results[choice] += vote_power[u]
+        polls.append({
+            'id': poll_id,
+            'question': f'Question {poll_id}',
+            'options': [f'Option {i}' for i in range(n_options)],
+            'results': results,
+            'expires_at': '2030-01-01T00:00',
+            'votes': votes,
+        })
+    return polls, vote_power
+
+
+def bench_recount(args):
+    import records
+    import tally
+    polls, vote_power = synthetic_polls(args.polls, args.votes, args.users)
+    # Stored polls keep their votes in a VoteColumn
+    polls = [records.Poll(p) for p in polls]
+    total = sum(len(p['votes']) for p in polls)
+    print(f'{len(polls)} polls, {total} votes, {len(vote_power)} users')
+    numpy = tally.np
+    backends = [('numpy', numpy), ('python', None)] if numpy is not None else [('python', None)]
+    for name, module in backends:
+        tally.np = module
+        started = time.perf_counter()
+        report = tally.audit(polls, vote_power)
+        elapsed = time.perf_counter() - started
+        print(f'{name:>8}: {elapsed * 1000:8.1f} ms  ({len(report)} discrepancies)')
+    tally.np = numpy
+
+
+STARTUP_PROBE = """
+import json, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.init_data()
+loaded = time.perf_counter()
+app.app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps([imported - started, loaded - imported, served - loaded]))
+"""
+
+
+STREAM_PROBE = """
+import json, sys, time, tracemalloc
+import app
+mode, paths = sys.argv[1], sys.argv[2:]
+if mode == 'buffered':
+    # The pages as they were before streaming: the whole body built first
+    def buffered_page(page, *sections):
+        for fragments in sections:
+            page = page.replace(app.RECORDS_SLOT, ''.join(fragments), 1)
+        return page
+    app.stream_page = buffered_page
+app.init_data()
+client = app.app.test_client()
+client.post('/login', data={'username': 'user0', 'password': 'secret'})
+
+def fetch(path):
+    started = time.perf_counter()
+    response = client.get(path, buffered=False)
+    assert response.status_code == 200, (path, response.status_code)
+    chunks = iter(response.response)
+    size = len(next(chunks, b''))
+    first = time.perf_counter()
+    for chunk in chunks:
+        size += len(chunk)
+    response.close()
+    return first - started, time.perf_counter() - started, size
+
+results = {}
+for path in paths:
+    fetch(path)
+    ttfb, total, size = min(fetch(path) for _ in range(3))
+    tracemalloc.start()
+    fetch(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    results[path] = [ttfb, total, size, peak]
+print(json.dumps(results))
+"""
+
+
+def write_synthetic_data(data_dir, n_users, n_announcements, n_polls, n_words, seed=0):
+    rng = random.Random(seed)
+    polls, vote_power = synthetic_polls(n_polls, n_polls * 20, n_users, seed)
+    users = [{'id': i + 1, 'username': u, 'password': 'secret', 'role': 'Member', 'votePower': p, 'muted': False}
+             for i, (u, p) in enumerate(vote_power.items())]
+    announcements = [{'id': i, 'title': f'Announcement {i}', 'content': ' '.join(rng.choices(['club', 'meeting', 'vote', 'news', 'event'], k=30)),
+                      'author': 'user0', 'timestamp': '2099-01-01T00:00:00'} for i in range(1, n_announcements + 1)]
+    words = [{'id': i, 'word': f'word{i}', 'definition': f'definition of word {i}', 'author': 'user0',
+              'timestamp': '2099-01-01T00:00:00'} for i in range(1, n_words + 1)]
+    os.makedirs(data_dir, exist_ok=True)
+    for name, records in [('users', users), ('announcements', announcements), ('polls', polls), ('dictionary', words)]:
+        with open(os.path.join(data_dir, f'{name}.json'), 'w') as f:
+            json.dump(records, f)
+
+
+def bench_startup(args):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_data(os.path.join(tmp, 'data'), args.users, args.announcements, args.polls, args.words)
+        env = dict(os.environ, PYTHONPATH=repo)
+        print(f'{args.users} users, {args.announcements} announcements, {args.polls} polls, {args.words} words')
+        runs = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, '-c', STARTUP_PROBE], cwd=tmp, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+        for i, label in enumerate(['import', 'preload', 'first request']):
+            best = min(run[i] for run in runs)
+            print(f'{label:>14}: {best * 1000:8.1f} ms')
+
+
+async def _get(port, path, timeout):
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n'.encode())
+        await writer.drain()
+        data = await asyncio.wait_for(reader.read(), timeout)
+        return data.startswith(b'HTTP/1.1 200') or data.startswith(b'HTTP/1.0 200')
+    finally:
+        writer.close()
+
+
+async def _load(port, idle, requests, concurrency, timeout):
+    # Idle clients connect and never send anything, like slow or parked
+    # keep-alive connections; the active ones fetch a page each
+    idle_conns = []
+    for _ in range(idle):
+        try:
+            idle_conns.append(await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout))
+        except (OSError, asyncio.TimeoutError):
+            break
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with gate:
+            try:
+                return await _get(port, '/login', timeout)
+            except (OSError, asyncio.TimeoutError):
+                return False
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    for _, writer in idle_conns:
+        writer.close()
+    return len(idle_conns), sum(results), elapsed
+
+
+def _wait_for_port(port, proc, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def bench_concurrency(args):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    servers = [
+        ('threaded', ['--server', 'prefork', '--workers', '1', '--threads', str(args.threads)]),
+        ('asyncio', ['--server', 'asgi', '--workers', '1']),
+    ]
+    print(f'{args.idle} idle connections, {args.requests} requests, {args.concurrency} at a time')
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_data(os.path.join(tmp, 'data'), 1000, 1000, 100, 1000)
+        env = dict(os.environ, PYTHONPATH=repo)
+        for name, server_args in servers:
+            with socket.socket() as s:
+                s.bind(('127.0.0.1', 0))
+                port = s.getsockname()[1]
+            proc = subprocess.Popen([sys.executable, os.path.join(repo, 'serve.py'), '--host', '127.0.0.1',
+                                     '--port', str(port)] + server_args,
+                                    cwd=tmp, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                _wait_for_port(port, proc)
+                idle, ok, elapsed = asyncio.run(_load(port, args.idle, args.requests, args.concurrency, args.timeout))
+            finally:
+                proc.terminate()
+                proc.wait()
+            print(f'{name:>9}: {ok}/{args.requests} ok in {elapsed:6.2f}s  ({ok / elapsed:7.1f} req/s, {idle} idle held)')
+
+
+def _retained(build):
+    # Bytes still allocated once ``build`` returns, with its result alive
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return retained, result
+
+
+def bench_memory(args):
+    import records
+    rng = random.Random(0)
+    polls, vote_power = synthetic_polls(args.polls, args.votes, args.users)
+    for poll in polls:
+        poll['created_at'] = '2030-01-01T00:00:00'
+        poll['vote_times'] = {u: f'2030-01-0{rng.randint(1, 9)}T{rng.randint(10, 23)}:00:00.{rng.randint(0, 999999):06d}'
+                              for u in poll['votes']}
+    users = [{'id': i + 1, 'username': u, 'password': 'scrypt$16384$8$1$' + 'x' * 68, 'role': 'Member', 'votePower': p,
+              'muted': False} for i, (u, p) in enumerate(vote_power.items())]
+    n_votes = sum(len(p['votes']) for p in polls)
+    users_json, polls_json = json.dumps(users), json.dumps(polls)
+    del users, polls
+    print(f'{len(vote_power)} users, {args.polls} polls, {n_votes} votes')
+
+    for name, convert_user, convert_poll in [('dict', None, None), ('compact', records.User, records.Poll)]:
+        def load_users():
+            parsed = json.loads(users_json)
+            return [convert_user(u) for u in parsed] if convert_user else parsed
+
+        def load_polls():
+            parsed = json.loads(polls_json)
+            return [convert_poll(p) for p in parsed] if convert_poll else parsed
+
+        user_bytes, loaded_users = _retained(load_users)
+        poll_bytes, loaded_polls = _retained(load_polls)
+        print(f'{name:>8}: {user_bytes / len(loaded_users):7.1f} bytes/user  '
+              f'{poll_bytes / n_votes:7.1f} bytes/vote  ({(user_bytes + poll_bytes) / 2 ** 20:.0f} MiB)')
+        del loaded_users, loaded_polls
+
+
+def bench_stream(args):
+    repo = os.path.dirname(os.path.abspath(__file__))
+    paths = ['/announcements', '/dictionary', '/polls']
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic_data(os.path.join(tmp, 'data'), 1000, args.announcements, args.polls, args.words)
+        env = dict(os.environ, PYTHONPATH=repo)
+        print(f'{args.announcements} announcements, {args.polls} polls, {args.words} words')
+        for mode in ['buffered', 'streamed']:
+            out = subprocess.run([sys.executable, '-c', STREAM_PROBE, mode] + paths, cwd=tmp, env=env,
+                                 capture_output=True, text=True, check=True).stdout
+            results = json.loads(out.strip().splitlines()[-1])
+            for path in paths:
+                ttfb, total, size, peak = results[path]
+                print(f'{mode:>9} {path:<15}: first byte {ttfb * 1000:8.1f} ms  whole page {total * 1000:8.1f} ms  '
+                      f'{size / 2 ** 20:5.1f} MiB sent  peak {peak / 2 ** 20:6.1f} MiB')
+
+
+def bench_serialize(args):
+    import serializers
+    names = ['json-pretty', 'json'] + (['orjson'] if serializers.orjson is not None else [])
+    codecs = [serializers.get_serializer(name) for name in names] + [serializers.SNAPSHOT_SERIALIZER]
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for scale in args.scales:
+            polls, _ = synthetic_polls(max(scale // 100, 1), scale * 2, scale)
+            announcements = [{'id': i, 'title': f'Announcement {i}', 'author': f'user{rng.randrange(scale)}',
+                              'content': ' '.join(rng.choices(['club', 'meeting', 'vote', 'news', 'event'], k=30)),
+                              'timestamp': '2099-01-01T00:00:00'} for i in range(1, scale + 1)]
+            print(f'{scale} announcements, {len(polls)} polls with {scale * 2} votes')
+            for codec in codecs:
+                sizes, saves, loads = 0, 0.0, 0.0
+                for name, data in [('announcements', announcements), ('polls', polls)]:
+                    path = os.path.join(tmp, name + codec.suffix)
+                    save = min(_timed(lambda: _write(path, codec.dumps(data))) for _ in range(args.repeat))
+                    load = min(_timed(lambda: codec.loads(_read(path))) for _ in range(args.repeat))
+                    sizes += os.path.getsize(path)
+                    saves += save
+                    loads += load
+                print(f'  {codec.name:>12}: save {saves * 1000:8.1f} ms  load {loads * 1000:8.1f} ms  '
+                      f'{sizes / 2 ** 20:7.2f} MiB')
+
+
+def _timed(run):
+    started = time.perf_counter()
+    run()
+    return time.perf_counter() - started
+
+
+def _write(path, raw):
+    with open(path, 'wb') as f:
+        f.write(raw)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='bench', required=True)
+
+    recount = sub.add_parser('recount', help='weighted recount of all polls')
+    recount.add_argument('--polls', type=int, default=1000)
+    recount.add_argument('--votes', type=int, default=1_000_000)
+    recount.add_argument('--users', type=int, default=100_000)
+    recount.set_defaults(func=bench_recount)
+
+    memory = sub.add_parser('memory', help='bytes per user and per vote, dict records vs compact records')
+    memory.add_argument('--users', type=int, default=100_000)
+    memory.add_argument('--votes', type=int, default=1_000_000)
+    memory.add_argument('--polls', type=int, default=1000)
+    memory.set_defaults(func=bench_memory)
+
+    startup = sub.add_parser('startup', help='import, data preload and first request in a fresh process')
+    startup.add_argument('--users', type=int, default=10_000)
+    startup.add_argument('--announcements', type=int, default=10_000)
+    startup.add_argument('--polls', type=int, default=1000)
+    startup.add_argument('--words', type=int, default=10_000)
+    startup.add_argument('--repeat', type=int, default=3)
+    startup.set_defaults(func=bench_startup)
+
+    concurrency = sub.add_parser('concurrency', help='threaded server vs asyncio mode with many idle connections')
+    concurrency.add_argument('--idle', type=int, default=1000)
+    concurrency.add_argument('--requests', type=int, default=500)
+    concurrency.add_argument('--concurrency', type=int, default=50)
+    concurrency.add_argument('--threads', type=int, default=8)
+    concurrency.add_argument('--timeout', type=float, default=5)
+    concurrency.set_defaults(func=bench_concurrency)
+
+    stream = sub.add_parser('stream', help='time to first byte and peak memory of the long list pages, buffered vs streamed')
+    stream.add_argument('--announcements', type=int, default=20_000)
+    stream.add_argument('--polls', type=int, default=2000)
+    stream.add_argument('--words', type=int, default=20_000)
+    stream.set_defaults(func=bench_stream)
+
+    serialize = sub.add_parser('serialize', help='data file save and load time and size for each serializer')
+    serialize.add_argument('--scales', type=int, nargs='+', default=[1000, 10_000, 100_000])
+    serialize.add_argument('--repeat', type=int, default=3)
+    serialize.set_defaults(func=bench_serialize)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
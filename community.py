@@ -0,0 +1,270 @@
+import os
+import threading
+import time
+
+from analytics import PollAnalytics
+from archive import Archive
+from audit import AuditLog
+from backup import Backups
+from indexes import SortedIndex, UserIndex, VoteIndex
+from passwords import HashPool
+from ratelimit import WriteLimiter
+from search import ArchiveSearch, SearchIndex, WordIndex
+from sessions import LastSeen, SessionStore, UserCache
+from records import Announcement, DictionaryEntry, Poll, User
+from storage import Dataset, Sequences
+
+# Fields every record must have; checked when a community is opened
+REQUIRED_FIELDS = {
+    'users': ('username', 'password', 'role', 'votePower', 'muted'),
+    'announcements': ('title', 'content', 'author', 'timestamp'),
+    'polls': ('question', 'options', 'results', 'expires_at'),
+    'dictionary': ('word', 'definition'),
+}
+
+
+class Community:
+    """All data of one community: its data sets, indexes and caches.
+
+    Everything lives under ``data_dir`` and has its own locks, write limit
+    and password hashing pool, so requests for different communities never
+    wait on each other and a busy community can't shed another's writes.  A ``replica``
+    community keeps its data sets and sessions in memory only, fed by a
+    replication follower.
+    """
+
+    def __init__(self, name, data_dir, default_users=None, journal=None, replica=False):
+        self.name = name
+        self.data_dir = data_dir
+        self.journal = journal
+        self.replica = replica
+        self.in_flight = 0
+        self.last_used = time.monotonic()
+
+        self.sequences = Sequences(os.path.join(data_dir, 'sequences.json'))
+        self.users_store = Dataset(os.path.join(data_dir, 'users.json'), default=default_users,
+                                   id_field='id', sequences=self.sequences, record_type=User, replica=replica)
+        self.announcements_store = Dataset(os.path.join(data_dir, 'announcements.json'), id_field='id',
+                                           sequences=self.sequences, record_type=Announcement, replica=replica)
+        self.polls_store = Dataset(os.path.join(data_dir, 'polls.json'), id_field='id',
+                                   sequences=self.sequences, record_type=Poll, replica=replica)
+        self.dictionary_store = Dataset(os.path.join(data_dir, 'dictionary.json'), id_field='id',
+                                        sequences=self.sequences, record_type=DictionaryEntry, replica=replica)
+        self.stores = {
+            'users': self.users_store,
+            'announcements': self.announcements_store,
+            'polls': self.polls_store,
+            'dictionary': self.dictionary_store,
+        }
+
+        # Search indexes, rebuilt whenever a data file is reloaded from disk
+        self.announcement_index = SearchIndex({'title': 2, 'content': 1}, key=lambda a: a['id'])
+        self.dictionary_index = SearchIndex({'word': 3, 'definition': 1}, key=lambda d: d['id'])
+        self.word_index = WordIndex()
+        self.announcements_store.attach(self.announcement_index)
+        self.dictionary_store.attach(self.word_index)
+        self.dictionary_store.attach(self.dictionary_index)
+
+        # Username, role, mute and vote power indexes for lookups and the admin table
+        self.user_index = UserIndex()
+        self.users_store.attach(self.user_index)
+
+        # Sessions map a cookie token to a user id; the user behind it is
+        # resolved through a cache that admin mutations invalidate per user
+        self.sessions = SessionStore(os.path.join(data_dir, 'sessions.json'), replica=replica)
+        self.user_cache = UserCache(self.users_store.get)
+        self.users_store.attach(self.user_cache)
+        # What each member has seen, for the dashboard's "new" counts
+        self.last_seen = LastSeen(os.path.join(data_dir, 'last_seen.json'))
+
+        # Orderings used by the content admin page
+        self.announcements_by_time = SortedIndex(key=lambda a: a['timestamp'])
+        self.polls_by_expiry = SortedIndex(key=lambda p: p['expires_at'])
+        self.announcements_store.attach(self.announcements_by_time)
+        self.polls_store.attach(self.polls_by_expiry)
+
+        # Newest-first streams merged into the dashboard activity feed
+        self.polls_by_created = SortedIndex(key=lambda p: p.get('created_at', ''))
+        self.dictionary_by_time = SortedIndex(key=lambda d: d.get('timestamp', ''))
+        self.polls_store.attach(self.polls_by_created)
+        self.dictionary_store.attach(self.dictionary_by_time)
+
+        # Which polls each member has voted in
+        self.vote_index = VoteIndex()
+        self.polls_store.attach(self.vote_index)
+
+        self.analytics = PollAnalytics()
+        self.archive = Archive(os.path.join(data_dir, 'archive'))
+        self.archived_announcement_index = ArchiveSearch(self.archive, 'announcements', {'title': 2, 'content': 1},
+                                                         key=lambda a: a['id'])
+        self.last_archive_run = None
+        self.archive_running = threading.Lock()
+        self.audit_log = AuditLog(os.path.join(data_dir, 'audit'))
+        self.backups = Backups(os.path.join(data_dir, 'backups'), self.stores, self.sequences, self.archive)
+
+        # Load shedding and password hashing; the pool starts its threads on
+        # first use, so a community nobody logs in to costs nothing
+        self.write_limiter = WriteLimiter()
+        self.password_pool = HashPool()
+
+        if journal is not None:
+            for kind, source in list(self.stores.items()) + [('sessions', self.sessions)]:
+                source.journal = journal
+                source.community = name
+                journal.register((name, kind), source)
+
+    def open(self):
+        """Creates missing data files, loads every data set and checks it.
+
+        Raises ValueError listing every problem found.  A replica has
+        nothing to open: its data arrives from the primary.
+        """
+        if self.replica:
+            return
+        os.makedirs(self.data_dir, exist_ok=True)
+        problems = []
+        for kind, store in self.stores.items():
+            store.init()
+            try:
+                records = store.load()
+            except ValueError as e:
+                problems.append(f'{store.path}: not valid JSON ({e})')
+                continue
+            if not isinstance(records, list):
+                problems.append(f'{store.path}: expected a list of records')
+                continue
+            for i, record in enumerate(records):
+                missing = [field for field in REQUIRED_FIELDS[kind] if field not in record]
+                if missing:
+                    problems.append(f'{store.path}: record {i} is missing {", ".join(missing)}')
+            if kind == 'polls':
+                for poll in records:
+                    if len(poll.get('results', [])) != len(poll.get('options', [])):
+                        problems.append(f'{store.path}: poll {poll.get("id")} has mismatched options and results')
+        if problems:
+            raise ValueError('\n'.join(problems))
+
+    def busy(self):
+        return self.in_flight > 0 or self.archive_running.locked()
+
+    def close(self):
+        # Runs any pending compaction now rather than from a timer that
+        # would outlive this object
+        for store in self.stores.values():
+            store.close()
+        self.last_seen.flush()
+        self.password_pool.close()
+        if self.journal is not None:
+            for kind in list(self.stores) + ['sessions']:
+                self.journal.unregister((self.name, kind))
+
+
+class CommunityRegistry:
+    """Open communities by name, opened on first use and closed when idle.
+
+    The default community lives in ``root`` itself; every other one in
+    ``root/communities/<name>`` and must already exist there.  With
+    ``served`` given, names outside it are refused, so communities can be
+    split across workers or nodes by the routing in front of them.
+
+    A ``replica`` registry opens nothing from disk: a replication follower
+    ``adopt()``s each community as the primary streams it, and replicas
+    are never closed for being idle.
+    """
+
+    DEFAULT = 'default'
+
+    def __init__(self, root, default_users=None, idle_timeout=600, sweep_interval=60, served=None,
+                 journal=None, replica=False):
+        self.root = root
+        self.default_users = default_users
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.served = served
+        self.journal = journal
+        self.replica = replica
+        self.lock = threading.Lock()
+        self._open = {}
+        self._opening = {}
+        self._last_sweep = time.monotonic()
+
+    def path(self, name):
+        if name == self.DEFAULT:
+            return self.root
+        return os.path.join(self.root, 'communities', name)
+
+    def exists(self, name):
+        if self.replica:
+            with self.lock:
+                return name in self._open
+        return name == self.DEFAULT or os.path.isdir(self.path(name))
+
+    def create(self, name):
+        os.makedirs(self.path(name), exist_ok=True)
+        community = self.acquire(name)
+        if community is not None:
+            self.release(community)
+        return community
+
+    def names(self):
+        with self.lock:
+            return sorted(self._open)
+
+    def acquire(self, name):
+        """Returns the open community, counted as in use until ``release()``.
+
+        Returns None for a community that does not exist or isn't served.
+        """
+        if self.served is not None and name not in self.served:
+            return None
+        self._sweep()
+        with self.lock:
+            community = self._open.get(name)
+            if community is not None:
+                return self._use(community)
+            opening = self._opening.setdefault(name, threading.Lock())
+        # Opened outside the registry lock, so a large community loading
+        # from disk doesn't hold up requests for the others
+        with opening:
+            with self.lock:
+                community = self._open.get(name)
+                if community is not None:
+                    return self._use(community)
+            if not self.exists(name):
+                return None
+            community = Community(name, self.path(name), self.default_users, journal=self.journal)
+            community.open()
+            with self.lock:
+                self._open[name] = community
+                self._opening.pop(name, None)
+                return self._use(community)
+
+    def adopt(self, name):
+        with self.lock:
+            community = self._open.get(name)
+            if community is None:
+                community = self._open[name] = Community(name, self.path(name), replica=True)
+            return community
+
+    def _use(self, community):
+        community.in_flight += 1
+        community.last_used = time.monotonic()
+        return community
+
+    def release(self, community):
+        with self.lock:
+            community.in_flight -= 1
+            community.last_used = time.monotonic()
+
+    def _sweep(self):
+        now = time.monotonic()
+        if self.replica or now - self._last_sweep < self.sweep_interval:
+            return
+        with self.lock:
+            self._last_sweep = now
+            idle = [c for c in self._open.values()
+                    if c.name != self.DEFAULT and not c.busy() and now - c.last_used >= self.idle_timeout]
+            for community in idle:
+                del self._open[community.name]
+        for community in idle:
+            community.close()
@@ -0,0 +1,244 @@
+import bisect
+import threading
+
+
+class UserIndex:
+    """Secondary indexes over the user list for the admin table.
+
+    Usernames are kept sorted for prefix ranges and name ordering; role,
+    mute state and vote power each map to the set of usernames holding that
+    value.  Mutations go through ``update()`` so every index moves with the
+    record.
+    """
+
+    SORT_KEYS = {
+        'username': lambda u: u['username'],
+        'role': lambda u: (u['role'], u['username']),
+        'votePower': lambda u: (u['votePower'], u['username']),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._by_name = {}
+        self._names = []
+        self._by_role = {}
+        self._by_power = {}
+        self._muted = set()
+
+    def rebuild(self, records):
+        with self.lock:
+            self._by_name = {}
+            self._names = []
+            self._by_role = {}
+            self._by_power = {}
+            self._muted = set()
+            for record in records:
+                self._add(record)
+
+    def get(self, username):
+        return self._by_name.get(username)
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def __contains__(self, username):
+        return username in self._by_name
+
+    def __getitem__(self, username):
+        return self._by_name[username]
+
+    def add(self, record):
+        with self.lock:
+            self._add(record)
+
+    def remove(self, record):
+        with self.lock:
+            self._remove(record)
+
+    def update(self, record, **changes):
+        with self.lock:
+            self._remove(record)
+            record.update(changes)
+            self._add(record)
+
+    def _add(self, record):
+        name = record['username']
+        self._by_name[name] = record
+        bisect.insort(self._names, name)
+        self._by_role.setdefault(record['role'], set()).add(name)
+        self._by_power.setdefault(record['votePower'], set()).add(name)
+        if record['muted']:
+            self._muted.add(name)
+
+    def _remove(self, record):
+        name = record['username']
+        if self._by_name.pop(name, None) is None:
+            return
+        i = bisect.bisect_left(self._names, name)
+        if i < len(self._names) and self._names[i] == name:
+            del self._names[i]
+        self._by_role.get(record['role'], set()).discard(name)
+        self._by_power.get(record['votePower'], set()).discard(name)
+        self._muted.discard(name)
+
+    def _prefix_range(self, prefix):
+        i = bisect.bisect_left(self._names, prefix)
+        j = bisect.bisect_left(self._names, prefix + '\U0010ffff')
+        return i, j
+
+    def query(self, role=None, muted=None, power=None, prefix='', sort='username', descending=False, offset=0, limit=50):
+        """Returns ``(total, page)`` for the given filters.
+
+        Set filters are intersected smallest-first; with none given, a page
+        sorted by username is sliced straight out of the sorted name list.
+        """
+        with self.lock:
+            candidates = []
+            if role is not None:
+                candidates.append(self._by_role.get(role, set()))
+            if power is not None:
+                candidates.append(self._by_power.get(power, set()))
+            if muted is True:
+                candidates.append(self._muted)
+            i, j = self._prefix_range(prefix)
+
+            if not candidates and muted is None and sort == 'username':
+                total = j - i
+                if descending:
+                    names = self._names[max(j - offset - limit, i):j - offset][::-1] if offset < total else []
+                else:
+                    names = self._names[i + offset:min(i + offset + limit, j)]
+                return total, [self._by_name[n] for n in names]
+
+            if candidates:
+                candidates.sort(key=len)
+                matches = set(candidates[0]).intersection(*candidates[1:])
+                if prefix:
+                    matches = {n for n in matches if n.startswith(prefix)}
+            else:
+                matches = set(self._names[i:j])
+            if muted is False:
+                matches -= self._muted
+            records = [self._by_name[n] for n in matches]
+        records.sort(key=self.SORT_KEYS.get(sort, self.SORT_KEYS['username']), reverse=descending)
+        return len(records), records[offset:offset + limit]
+
+
+class SortedIndex:
+    """Records kept ordered by ``key``, ties broken by id.
+
+    Used where a page lists a whole data set in a fixed order, so the order
+    is maintained on each mutation instead of sorting on every request.
+    """
+
+    def __init__(self, key, id_field='id'):
+        self.key = key
+        self.id_field = id_field
+        self.lock = threading.Lock()
+        self._keys = []
+        self._records = {}
+
+    def rebuild(self, records):
+        with self.lock:
+            self._records = {r[self.id_field]: r for r in records}
+            self._keys = sorted((self.key(r), r[self.id_field]) for r in records)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, record):
+        with self.lock:
+            self._add(record)
+
+    def remove(self, record):
+        with self.lock:
+            self._remove(record)
+
+    def update(self, record, **changes):
+        with self.lock:
+            self._remove(record)
+            record.update(changes)
+            self._add(record)
+
+    def _add(self, record):
+        self._records[record[self.id_field]] = record
+        bisect.insort(self._keys, (self.key(record), record[self.id_field]))
+
+    def _remove(self, record):
+        entry = (self.key(record), record[self.id_field])
+        i = bisect.bisect_left(self._keys, entry)
+        if i < len(self._keys) and self._keys[i] == entry:
+            del self._keys[i]
+        self._records.pop(record[self.id_field], None)
+
+    def count_after(self, key):
+        with self.lock:
+            return len(self._keys) - bisect.bisect_right(self._keys, (key, float('inf')))
+
+    def items_after(self, key):
+        # Records whose key sorts after ``key``, in ascending order
+        with self.lock:
+            i = bisect.bisect_right(self._keys, (key, float('inf')))
+            return [self._records[record_id] for _, record_id in self._keys[i:]]
+
+    def iter_descending(self, before=None, chunk=32):
+        """Yields ``(key, id, record)`` from the largest key down.
+
+        Starts below the ``(key, id)`` pair ``before`` when given.  Entries
+        are copied out ``chunk`` at a time and each chunk re-seeks by key,
+        so a caller that stops early never touches the rest of the index
+        and concurrent inserts and deletes can't shift its position.
+        """
+        while True:
+            with self.lock:
+                end = len(self._keys) if before is None else bisect.bisect_left(self._keys, before)
+                keys = self._keys[max(end - chunk, 0):end]
+                batch = [(key, record_id, self._records[record_id]) for key, record_id in reversed(keys)]
+            yield from batch
+            if len(keys) < chunk:
+                return
+            before = keys[0]
+
+    def items(self, descending=False, offset=0, limit=None):
+        with self.lock:
+            n = len(self._keys)
+            if offset >= n:
+                return []
+            end = n if limit is None else min(offset + limit, n)
+            if descending:
+                keys = self._keys[n - end:n - offset][::-1]
+            else:
+                keys = self._keys[offset:end]
+            return [self._records[record_id] for _, record_id in keys]
+
+
+class VoteIndex:
+    """username -> set of ids of the polls that user voted in.
+
+    Mirrors the per-poll ``votes`` dicts the other way round, so a member's
+    vote state never needs a pass over every poll.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._voted = {}
+
+    def rebuild(self, polls):
+        with self.lock:
+            self._voted = {}
+            for poll in polls:
+                for username in poll.get('votes', {}):
+                    self._voted.setdefault(username, set()).add(poll['id'])
+
+    def add(self, username, poll_id):
+        with self.lock:
+            self._voted.setdefault(username, set()).add(poll_id)
+
+    def remove_poll(self, poll):
+        with self.lock:
+            for username in poll.get('votes', {}):
+                self._voted.get(username, set()).discard(poll['id'])
+
+    def voted(self, username):
+        with self.lock:
+            return frozenset(self._voted.get(username, ()))
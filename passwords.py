@@ -0,0 +1,97 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# scrypt cost: N is the CPU/memory factor (memory use is 128 * N * r bytes)
+SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+SCRYPT_R = 8
+SCRYPT_P = 1
+HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 16))
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode('ascii')
+
+
+def hash_password(password, n=None):
+    n = n or SCRYPT_N
+    salt = os.urandom(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P,
+                            maxmem=256 * n * SCRYPT_R, dklen=32)
+    return f'scrypt${n}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(digest)}'
+
+
+def is_hashed(stored):
+    return stored.startswith('scrypt$')
+
+
+def verify_password(stored, password):
+    if not is_hashed(stored):
+        # Entries written before hashing; migrated on the next login
+        return hmac.compare_digest(stored.encode(), password.encode())
+    _, n, r, p, salt, digest = stored.split('$')
+    n, r, p = int(n), int(r), int(p)
+    candidate = hashlib.scrypt(password.encode(), salt=base64.b64decode(salt), n=n, r=r, p=p,
+                               maxmem=256 * n * r, dklen=32)
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+
+def needs_rehash(stored):
+    if not is_hashed(stored):
+        return True
+    _, n, r, p, _, _ = stored.split('$')
+    return (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+
+
+_dummy_hash = None
+
+
+def dummy_hash():
+    """A hash to check logins for unknown users against, so they cost the
+    same as a wrong password for a real one."""
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(os.urandom(16).hex())
+    return _dummy_hash
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class HashPool:
+    """Runs password hashing on a few worker threads.
+
+    hashlib releases the GIL while hashing, so request threads waiting on
+    a result don't hold up the rest of the site.  At most ``workers``
+    hashes run at once and ``queue_limit`` more may wait; beyond that
+    ``run()`` raises ``PoolBusy`` straight away instead of queueing.
+    """
+
+    def __init__(self, workers=HASH_WORKERS, queue_limit=HASH_QUEUE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(workers + queue_limit)
+
+    def run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def verify(self, stored, password):
+        return self.run(verify_password, stored, password)
+
+    def hash(self, password):
+        return self.run(hash_password, password)
+
+    def close(self):
+        self._executor.shutdown()
@@ -0,0 +1,84 @@
+import math
+import os
+import threading
+import time
+
+MAX_INFLIGHT_WRITES = int(os.environ.get('MAX_INFLIGHT_WRITES', 16))  # per community
+
+
+class RateLimiter:
+    """Token buckets keyed by (rule, who).
+
+    ``rules`` maps a rule name to ``(capacity, refill per second)``.  A
+    bucket is just ``(tokens, updated_at)`` in one dict and only exists
+    while it is below capacity: once a sweep finds it would have refilled,
+    it is dropped, since a fresh bucket behaves the same.
+    """
+
+    def __init__(self, rules, sweep_interval=60, clock=time.monotonic):
+        self.rules = rules
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self._buckets = {}
+        self._last_sweep = clock()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def hit(self, rule, *who):
+        """Takes one token from the bucket of every identity in ``who``.
+
+        Returns 0 when the request may proceed, otherwise the number of
+        seconds until it would; nothing is taken unless every bucket has a
+        token.
+        """
+        capacity, rate = self.rules[rule]
+        now = self.clock()
+        with self.lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            levels = []
+            for ident in who:
+                tokens, updated = self._buckets.get((rule, ident), (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+            lowest = min(levels, default=capacity)
+            if lowest < 1:
+                return math.ceil((1 - lowest) / rate)
+            for ident, tokens in zip(who, levels):
+                self._buckets[(rule, ident)] = (tokens - 1, now)
+            return 0
+
+    def _sweep(self, now):
+        full = []
+        for key, (tokens, updated) in self._buckets.items():
+            capacity, rate = self.rules[key[0]]
+            if tokens + (now - updated) * rate >= capacity:
+                full.append(key)
+        for key in full:
+            del self._buckets[key]
+        self._last_sweep = now
+
+
+class WriteLimiter:
+    """Caps the number of write requests in flight.
+
+    ``enter()`` returns False instead of waiting once ``limit`` writes are
+    running, so callers can shed load rather than queue on the data locks.
+    """
+
+    def __init__(self, limit=MAX_INFLIGHT_WRITES):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.in_flight = 0
+
+    def enter(self):
+        with self.lock:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
@@ -0,0 +1,248 @@
+"""Compact in-memory record types for the JSON data sets.
+
+Records parsed from the data files become ``__slots__`` objects instead of
+dicts, with names and roles interned, numeric columns in ``array``s and
+each poll's votes held as sorted columns rather than a dict per poll.  All
+of them keep the dict interface the rest of the code uses (``r['field']``,
+``get``, ``in``, ``update``, ...) and turn back into plain JSON through
+``encode``.
+"""
+import hashlib
+import json
+import sys
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+class Record:
+    """Dict-like record whose known fields live in slots.
+
+    Fields not listed in ``FIELDS`` (older or newer data) go to an extra
+    dict so nothing in the file is lost on save.
+    """
+
+    __slots__ = ('_extra',)
+    FIELDS = ()
+    CONVERT = {}
+
+    def __init__(self, data=()):
+        self._extra = None
+        for key, value in dict(data).items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key in self.FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            convert = self.CONVERT.get(key)
+            setattr(self, key, convert(value) if convert else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key):
+        if key in self.FIELDS:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def keys(self):
+        present = [field for field in type(self).__slots__ if hasattr(self, field)]
+        return present + list(self._extra or ())
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def update(self, changes=(), **more):
+        for key, value in dict(changes, **more).items():
+            self[key] = value
+
+    def to_dict(self):
+        return {key: encode(value) for key, value in self.items()}
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f'{type(self).__name__}({dict(self.items())!r})'
+
+
+class Column:
+    """A username -> value mapping stored as sorted parallel columns.
+
+    Names are interned and kept sorted for bisect lookups; values sit in a
+    typed ``array``.  Costs about a pointer plus the value's width per
+    entry, against a full hash table slot for a dict.  Iterates in name
+    order.
+    """
+
+    __slots__ = ('_names', '_values')
+    TYPECODE = 'l'
+
+    def __init__(self, data=()):
+        items = sorted((sys.intern(name), value) for name, value in dict(data).items())
+        self._names = [name for name, _ in items]
+        self._values = array(self.TYPECODE, (self._store(value) for _, value in items))
+
+    def _store(self, value):
+        return value
+
+    def _load(self, value):
+        return value
+
+    def _find(self, name):
+        i = bisect_left(self._names, name)
+        if i < len(self._names) and self._names[i] == name:
+            return i
+        return -1
+
+    def __contains__(self, name):
+        return self._find(name) >= 0
+
+    def __getitem__(self, name):
+        i = self._find(name)
+        if i < 0:
+            raise KeyError(name)
+        return self._load(self._values[i])
+
+    def get(self, name, default=None):
+        i = self._find(name)
+        return default if i < 0 else self._load(self._values[i])
+
+    def __setitem__(self, name, value):
+        i = self._find(name)
+        if i >= 0:
+            self._values[i] = self._store(value)
+            return
+        name = sys.intern(name)
+        i = bisect_left(self._names, name)
+        self._names.insert(i, name)
+        self._values.insert(i, self._store(value))
+
+    def __delitem__(self, name):
+        i = self._find(name)
+        if i < 0:
+            raise KeyError(name)
+        del self._names[i]
+        del self._values[i]
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def keys(self):
+        return list(self._names)
+
+    def values(self):
+        return [self._load(v) for v in self._values]
+
+    def items(self):
+        return zip(self._names, self.values())
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Column, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+
+class VoteColumn(Column):
+    """username -> chosen option index."""
+
+    __slots__ = ()
+    TYPECODE = 'h'
+
+
+class TimeColumn(Column):
+    """username -> ISO timestamp, kept as float seconds."""
+
+    __slots__ = ()
+    TYPECODE = 'd'
+
+    def _store(self, value):
+        return datetime.fromisoformat(value).timestamp()
+
+    def _load(self, value):
+        return datetime.fromtimestamp(value).isoformat()
+
+
+def interned(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def int_array(values):
+    return array('q', values)
+
+
+class User(Record):
+    __slots__ = ('id', 'username', 'password', 'role', 'votePower', 'muted')
+    FIELDS = frozenset(__slots__)
+    CONVERT = {'username': interned, 'role': interned}
+
+
+class Announcement(Record):
+    __slots__ = ('id', 'title', 'content', 'author', 'timestamp')
+    FIELDS = frozenset(__slots__)
+    CONVERT = {'author': interned}
+
+
+class Poll(Record):
+    __slots__ = ('id', 'question', 'options', 'results', 'expires_at', 'created_at', 'votes', 'vote_times')
+    FIELDS = frozenset(__slots__)
+    CONVERT = {'results': int_array, 'votes': VoteColumn, 'vote_times': TimeColumn}
+
+
+class DictionaryEntry(Record):
+    __slots__ = ('id', 'word', 'definition', 'author', 'timestamp')
+    FIELDS = frozenset(__slots__)
+    CONVERT = {'author': interned}
+
+
+def encode(value):
+    # ``default`` hook for json.dump
+    if isinstance(value, (Record, Column)):
+        return value.to_dict()
+    if isinstance(value, array):
+        return value.tolist()
+    return value
+
+
+def record_digest(record):
+    # Stable short hash of a record's JSON form, for change detection
+    data = json.dumps(record, sort_keys=True, default=encode).encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
@@ -0,0 +1,310 @@
+"""Primary -> follower replication of the data sets.
+
+A primary started with ``REPLICATION_LISTEN=host:port`` journals every
+change its data sets make and streams the journal to followers over a
+local TCP socket, one JSON message per line.  A follower started with
+``REPLICA_OF=host:port`` applies the stream to in-memory copies and serves
+the read-only pages from them; everything else goes to ``PRIMARY_URL``
+through ``forward()``.
+
+Messages, each with the primary's ``seq`` at the time it was written:
+
+``hello``      epoch and current seq, first thing on every connection
+``reset``      every live record of one data set
+``change``     records added or changed and ids deleted in one data set
+``sessions``   the whole session table of one community
+``heartbeat``  sent when nothing else was for ``HEARTBEAT_INTERVAL``
+
+Changes carry whole records, so applying one twice is harmless; a
+follower that reconnects gets what it missed from the journal, or resets
+when the journal no longer reaches back that far.
+"""
+import http.client
+import json
+import queue
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from serializers import DATA_SERIALIZER
+
+JOURNAL_SIZE = 10000  # messages kept for reconnecting followers
+HEARTBEAT_INTERVAL = 1.0  # seconds
+POLL_INTERVAL = 0.25  # seconds between checks for writes by other worker processes
+RECONNECT_DELAY = 1.0  # seconds
+
+# Hop-by-hop headers are never passed through a forwarded request
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'te', 'trailer', 'upgrade',
+               'proxy-authorization', 'proxy-authenticate', 'content-length', 'host'}
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class Journal:
+    """The primary's ordered change stream, kept in memory.
+
+    Data sets and session stores of every open community register here
+    and call ``publish()`` as they change; nothing is recorded until a
+    publisher has bound its socket and set ``active``.
+    """
+
+    def __init__(self, size=JOURNAL_SIZE):
+        self.epoch = secrets.token_hex(8)
+        self.active = False
+        self.seq = 0
+        self.cond = threading.Condition()
+        self._lines = deque(maxlen=size)
+        self._sources = {}
+
+    def register(self, key, source):
+        with self.cond:
+            self._sources[key] = source
+
+    def unregister(self, key):
+        with self.cond:
+            self._sources.pop(key, None)
+
+    def publish(self, message):
+        with self.cond:
+            self.seq += 1
+            message = dict(message, seq=self.seq, time=time.time())
+            self._lines.append((self.seq, DATA_SERIALIZER.dumps(message) + b'\n'))
+            self.cond.notify_all()
+
+    def since(self, seq):
+        # Lines after ``seq``, or None when the journal no longer reaches back that far
+        with self.cond:
+            if seq < self.seq and (not self._lines or self._lines[0][0] > seq + 1):
+                return None
+            return [line for n, line in self._lines if n > seq]
+
+    def wait(self, seq, timeout):
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > seq, timeout)
+            return self.seq
+
+    def reset(self):
+        # Every registered source republishes its full state
+        with self.cond:
+            sources = list(self._sources.values())
+        for source in sources:
+            source.publish_reset()
+
+    def poll(self):
+        # Sources reload (and so publish) whatever other processes wrote
+        with self.cond:
+            sources = list(self._sources.values())
+        for source in sources:
+            source.poll()
+
+
+class Publisher:
+    """Accepts followers on ``address`` and streams the journal to each.
+
+    With several worker processes, the one that binds the socket publishes
+    for all of them: it polls the data files and picks up the others'
+    writes the same way any worker notices them, by the file changing.
+    """
+
+    def __init__(self, journal, address):
+        self.journal = journal
+        self.address = address
+        self.followers = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Binds the socket and starts serving; returns False if another
+        process already publishes on this address.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind(self.address)
+        except OSError:
+            sock.close()
+            return False
+        sock.listen(16)
+        self.journal.active = True
+        threading.Thread(target=self._accept, args=(sock,), daemon=True).start()
+        threading.Thread(target=self._watch, daemon=True).start()
+        return True
+
+    def _watch(self):
+        while True:
+            time.sleep(POLL_INTERVAL)
+            self.journal.poll()
+
+    def _accept(self, sock):
+        while True:
+            conn, _ = sock.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with self._lock:
+            self.followers += 1
+        try:
+            with conn, conn.makefile('rb') as reader:
+                hello = json.loads(reader.readline() or b'{}')
+                journal = self.journal
+                seq = hello.get('seq', 0) if hello.get('epoch') == journal.epoch else -1
+                conn.sendall(json.dumps({'type': 'hello', 'epoch': journal.epoch, 'seq': journal.seq}).encode() + b'\n')
+                while True:
+                    lines = journal.since(seq) if seq >= 0 else None
+                    if lines is None:
+                        # New, restarted or too far behind: start from full state
+                        seq = journal.seq
+                        journal.reset()
+                        lines = journal.since(seq)
+                    if lines:
+                        conn.sendall(b''.join(lines))
+                        seq += len(lines)
+                    elif journal.wait(seq, HEARTBEAT_INTERVAL) == seq:
+                        conn.sendall(json.dumps({'type': 'heartbeat', 'seq': seq, 'time': time.time()}).encode() + b'\n')
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self.followers -= 1
+
+    def status(self):
+        return {'role': 'primary', 'publishing': self.journal.active, 'seq': self.journal.seq, 'followers': self.followers}
+
+
+class Follower:
+    """Keeps a replica registry's communities in step with the primary.
+
+    One thread reads the stream into a queue; another applies whatever
+    has queued up in one batch per data set, so a burst of changes costs
+    one index rebuild rather than one each.
+    """
+
+    def __init__(self, address, registry):
+        self.address = address
+        self.registry = registry
+        self.epoch = None
+        self.connected = False
+        self.primary_seq = 0
+        self.applied_seq = 0
+        self.applied_time = None
+        self.last_heard = None
+        self._synced = set()
+        self._seqs = {}
+        self._applied_epoch = None
+        self._queue = queue.Queue()
+
+    def start(self):
+        threading.Thread(target=self._read, daemon=True).start()
+        threading.Thread(target=self._apply, daemon=True).start()
+
+    def synced(self, community):
+        return community in self._synced
+
+    def _read(self):
+        while True:
+            try:
+                with socket.create_connection(self.address) as conn, conn.makefile('rb') as reader:
+                    conn.sendall(json.dumps({'epoch': self.epoch, 'seq': self.applied_seq}).encode() + b'\n')
+                    self.connected = True
+                    for line in reader:
+                        message = DATA_SERIALIZER.loads(line)
+                        self.last_heard = time.time()
+                        if message['type'] == 'hello' and message['epoch'] != self.epoch:
+                            # The primary restarted: its sequence numbers start over
+                            self.epoch = message['epoch']
+                            self.primary_seq = message['seq']
+                        self.primary_seq = max(self.primary_seq, message['seq'])
+                        self._queue.put(message)
+            except (OSError, ValueError):
+                pass
+            self.connected = False
+            time.sleep(RECONNECT_DELAY)
+
+    def _apply(self):
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            pending = {}
+            sessions = {}
+            for message in batch:
+                if message['type'] == 'hello' and message['epoch'] != self._applied_epoch:
+                    self._applied_epoch = message['epoch']
+                    self._seqs = {}
+                    self.applied_seq = 0
+                elif message['type'] in ('reset', 'change'):
+                    key = (message['community'], message['kind'])
+                    # Skip changes already covered by a later reset of the same data set
+                    if message['seq'] <= self._seqs.get(key, 0):
+                        continue
+                    self._seqs[key] = message['seq']
+                    entry = pending.get(key)
+                    if message['type'] == 'reset' or entry is None:
+                        entry = pending[key] = {'reset': message['type'] == 'reset', 'changed': {}, 'deleted': set()}
+                    if message['type'] == 'reset':
+                        entry['changed'] = {r['id']: r for r in message['records']}
+                    else:
+                        for record_id in message['deleted']:
+                            entry['changed'].pop(record_id, None)
+                            entry['deleted'].add(record_id)
+                        for record in message['changed']:
+                            entry['changed'][record['id']] = record
+                            entry['deleted'].discard(record['id'])
+                elif message['type'] == 'sessions':
+                    sessions[message['community']] = message['sessions']
+            for (name, kind), entry in pending.items():
+                community = self.registry.adopt(name)
+                community.stores[kind].apply(entry['changed'].values(), entry['deleted'], reset=entry['reset'])
+                if entry['reset'] and all((name, k) in self._seqs for k in community.stores):
+                    self._synced.add(name)
+            for name, table in sessions.items():
+                self.registry.adopt(name).sessions.replace(table)
+            last = batch[-1]
+            self.applied_seq = max(self.applied_seq, last['seq'])
+            self.applied_time = last.get('time', self.applied_time)
+
+    def status(self):
+        behind = max(self.primary_seq - self.applied_seq, 0)
+        lag = 0.0
+        if behind and self.applied_time is not None:
+            lag = max(time.time() - self.applied_time, 0.0)
+        return {
+            'role': 'follower',
+            'connected': self.connected,
+            'primary_seq': self.primary_seq,
+            'applied_seq': self.applied_seq,
+            'lag_messages': behind,
+            'lag_seconds': round(lag, 3),
+            'last_heard_seconds': None if self.last_heard is None else round(time.time() - self.last_heard, 3),
+            'communities': sorted(self._synced),
+        }
+
+
+def forward(primary_url, request, timeout=30):
+    """Sends ``request`` on to the primary and returns its answer as
+    ``(body, status, headers)``.
+    """
+    url = urlsplit(primary_url)
+    connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    headers = {name: value for name, value in request.headers.items() if name.lower() not in HOP_HEADERS}
+    # Keep the Host header so the primary routes to the same community
+    headers['Host'] = request.host
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    headers['X-Forwarded-For'] = f'{forwarded_for}, {request.remote_addr}' if forwarded_for else (request.remote_addr or '')
+    path = request.full_path if request.query_string else request.path
+    try:
+        connection.request(request.method, path, body=request.get_data(), headers=headers)
+        response = connection.getresponse()
+        body = response.read()
+        headers = [(name, value) for name, value in response.getheaders() if name.lower() not in HOP_HEADERS]
+        return body, response.status, headers
+    finally:
+        connection.close()
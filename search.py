@@ -0,0 +1,235 @@
+import bisect
+import re
+import threading
+from collections import Counter
+from datetime import datetime
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_PREFIX_TERMS = 50
+PREFIX_WEIGHT = 0.5
+RECENCY_HALF_LIFE_DAYS = 30.0
+
+def tokenize(text):
+    return TOKEN_RE.findall(str(text).lower())
+
+def _parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SearchIndex:
+    """Incrementally maintained inverted index over a list of records.
+
+    ``fields`` maps record keys to a weight, ``key`` returns the document
+    key for a record.  Terms are also kept in a sorted list so a query token
+    matches every term it prefixes without scanning the vocabulary.
+    """
+
+    def __init__(self, fields, key, time_field='timestamp'):
+        self.fields = fields
+        self.key = key
+        self.time_field = time_field
+        self.lock = threading.Lock()
+        self._postings = {}
+        self._terms = []
+        self._docs = {}
+
+    def rebuild(self, records):
+        with self.lock:
+            self._postings = {}
+            self._terms = []
+            self._docs = {}
+            for record in records:
+                self._add(record)
+
+    def add(self, record):
+        with self.lock:
+            self._add(record)
+
+    def remove(self, key):
+        with self.lock:
+            self._remove(key)
+
+    def _add(self, record):
+        key = self.key(record)
+        if key in self._docs:
+            self._remove(key)
+        counts = Counter()
+        for field, weight in self.fields.items():
+            for term in tokenize(record.get(field, '')):
+                counts[term] += weight
+        for term, tf in counts.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                bisect.insort(self._terms, term)
+            postings[key] = tf
+        self._docs[key] = (record, _parse_time(record.get(self.time_field)), tuple(counts))
+
+    def _remove(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for term in doc[2]:
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                i = bisect.bisect_left(self._terms, term)
+                del self._terms[i]
+
+    def _expand(self, token):
+        i = bisect.bisect_left(self._terms, token)
+        matches = []
+        while i < len(self._terms) and len(matches) < MAX_PREFIX_TERMS:
+            term = self._terms[i]
+            if not term.startswith(token):
+                break
+            matches.append((term, 1.0 if term == token else PREFIX_WEIGHT))
+            i += 1
+        return matches
+
+    def search(self, query, limit=20, now=None):
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        now = now or datetime.now()
+        with self.lock:
+            scores = None
+            for token in tokens:
+                token_scores = {}
+                for term, weight in self._expand(token):
+                    for key, tf in self._postings[term].items():
+                        token_scores[key] = token_scores.get(key, 0.0) + tf * weight
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {k: s + token_scores[k] for k, s in scores.items() if k in token_scores}
+                if not scores:
+                    return []
+            ranked = []
+            for key, score in scores.items():
+                record, when, _ = self._docs[key]
+                if when is not None:
+                    age_days = max((now - when).total_seconds(), 0) / 86400
+                    score *= 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS) + 0.5
+                ranked.append((score, when or datetime.min, record))
+        ranked.sort(key=lambda r: (r[0], r[1]), reverse=True)
+        return [(score, record) for score, _, record in ranked[:limit]]
+
+
+class ArchiveSearch:
+    """Search over one kind of archived record.
+
+    Archive segments are never rewritten, so each part is indexed once, the
+    first time a search finds it in the archive index; nothing is read until
+    the first search.
+    """
+
+    def __init__(self, archive, kind, fields, key, time_field='timestamp'):
+        self.archive = archive
+        self.kind = kind
+        self.index = SearchIndex(fields, key, time_field)
+        self.lock = threading.Lock()
+        self._indexed = set()
+
+    def search(self, query, limit=20, now=None):
+        with self.lock:
+            for name in self.archive.parts(self.kind):
+                if name not in self._indexed:
+                    for record in self.archive.read_part(name):
+                        self.index.add(record)
+                    self._indexed.add(name)
+        return self.index.search(query, limit, now)
+
+
+def _trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class WordIndex:
+    """Sorted, case-folded index over the dictionary entries.
+
+    Entries are held in folded-word order next to a parallel array of the
+    folded words, so duplicate checks and prefix ranges are bisections and
+    listing needs no sort.  A trigram map backs the fuzzy "did you mean"
+    suggestions.
+    """
+
+    def __init__(self, field='word'):
+        self.field = field
+        self.lock = threading.Lock()
+        self._records = []
+        self._folded = []
+        self._trigrams = {}
+
+    def fold(self, word):
+        return word.strip().casefold()
+
+    def rebuild(self, records):
+        with self.lock:
+            pairs = sorted(((self.fold(r[self.field]), r) for r in records), key=lambda p: p[0])
+            self._folded = [word for word, _ in pairs]
+            self._records = [r for _, r in pairs]
+            self._trigrams = {}
+            for word in self._folded:
+                self._add_trigrams(word)
+
+    def _add_trigrams(self, word):
+        for gram in _trigrams(word):
+            self._trigrams.setdefault(gram, set()).add(word)
+
+    def find(self, word):
+        word = self.fold(word)
+        with self.lock:
+            i = bisect.bisect_left(self._folded, word)
+            if i < len(self._folded) and self._folded[i] == word:
+                return i
+        return None
+
+    def insert(self, record):
+        word = self.fold(record[self.field])
+        with self.lock:
+            i = bisect.bisect_left(self._folded, word)
+            self._folded.insert(i, word)
+            self._records.insert(i, record)
+            self._add_trigrams(word)
+            return i
+
+    def complete(self, prefix, limit=None):
+        prefix = self.fold(prefix)
+        with self.lock:
+            i = bisect.bisect_left(self._folded, prefix)
+            j = bisect.bisect_left(self._folded, prefix + '\U0010ffff')
+            if limit is not None:
+                j = min(j, i + limit)
+            return self._records[i:j]
+
+    def entries(self):
+        with self.lock:
+            return list(self._records)
+
+    def suggest(self, word, limit=5, min_similarity=0.3):
+        word = self.fold(word)
+        grams = _trigrams(word)
+        with self.lock:
+            shared = Counter()
+            for gram in grams:
+                for candidate in self._trigrams.get(gram, ()):
+                    shared[candidate] += 1
+            scored = []
+            for candidate, common in shared.items():
+                if candidate == word:
+                    continue
+                similarity = common / (len(grams) + len(_trigrams(candidate)) - common)
+                if similarity >= min_similarity:
+                    scored.append((similarity, candidate))
+            scored.sort(key=lambda s: (-s[0], s[1]))
+            records = []
+            for _, candidate in scored[:limit]:
+                i = bisect.bisect_left(self._folded, candidate)
+                records.append(self._records[i])
+            return records
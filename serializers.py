@@ -0,0 +1,240 @@
+"""Serializers for the data files, archive segments and backups.
+
+Data files are JSON written compactly; ``orjson`` is used when installed,
+as it reads and writes several times faster than the stdlib.  Every JSON
+serializer reads what any other wrote, including the older pretty-printed
+files, so switching needs no migration.  Snapshot deltas use a small
+versioned binary format, ``SnapshotSerializer``.
+
+``DATA_SERIALIZER`` picks the data file format: ``auto`` (the default,
+orjson if installed), ``orjson``, ``json`` or ``json-pretty``.
+"""
+import json
+import os
+import struct
+
+from records import encode
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional: the snapshot format has a pure-Python codec
+    msgpack = None
+
+
+class JSONSerializer:
+    """Stdlib JSON, compact unless ``indent`` is given."""
+
+    suffix = '.json'
+
+    def __init__(self, indent=None):
+        self.name = 'json-pretty' if indent else 'json'
+        self.indent = indent
+        self.separators = None if indent else (',', ':')
+
+    def dumps(self, data):
+        return json.dumps(data, indent=self.indent, separators=self.separators, default=encode).encode()
+
+    def loads(self, raw):
+        return json.loads(raw)
+
+
+class OrjsonSerializer:
+    """JSON through orjson; output is compact and UTF-8."""
+
+    name = 'orjson'
+    suffix = '.json'
+
+    def dumps(self, data):
+        return orjson.dumps(data, default=encode)
+
+    def loads(self, raw):
+        return orjson.loads(raw)
+
+
+class SnapshotSerializer:
+    """Binary snapshot format: ``MAGIC``, a version byte, then the data.
+
+    Version 1 is the MessagePack encoding of the same values JSON holds
+    (nil, booleans, integers, doubles, strings, arrays and maps), a
+    published format that stays readable whatever Python or library
+    version reads it.  Written and read by ``msgpack`` when installed,
+    otherwise by the pure-Python ``pack``/``unpack`` below; either reads
+    what the other wrote.
+    """
+
+    name = 'snapshot'
+    suffix = '.snap'
+    MAGIC = b'CSNAP'
+    VERSION = 1
+
+    def dumps(self, data):
+        header = self.MAGIC + bytes((self.VERSION,))
+        if msgpack is not None:
+            return header + msgpack.packb(data, default=encode, use_bin_type=True)
+        return header + pack(data)
+
+    def loads(self, raw):
+        raw = bytes(raw)
+        if not raw.startswith(self.MAGIC) or len(raw) <= len(self.MAGIC):
+            raise ValueError('not a snapshot file')
+        version = raw[len(self.MAGIC)]
+        if version != self.VERSION:
+            raise ValueError(f'unsupported snapshot version {version}')
+        body = raw[len(self.MAGIC) + 1:]
+        if msgpack is not None:
+            return msgpack.unpackb(body, raw=False, strict_map_key=False)
+        value, end = unpack(body, 0)
+        if end != len(body):
+            raise ValueError('trailing data after snapshot')
+        return value
+
+
+def pack(value):
+    out = bytearray()
+    _pack(value, out)
+    return bytes(out)
+
+
+def _pack_length(out, n, fix_base, fix_limit, codes):
+    # ``codes`` are the 8/16/32-bit length markers; None where the type has no 8-bit form
+    if n < fix_limit:
+        out.append(fix_base | n)
+    elif n < 0x100 and codes[0] is not None:
+        out.append(codes[0])
+        out.append(n)
+    elif n < 0x10000:
+        out.append(codes[1])
+        out += struct.pack('>H', n)
+    else:
+        out.append(codes[2])
+        out += struct.pack('>I', n)
+
+
+def _pack(value, out):
+    if value is None:
+        out.append(0xc0)
+    elif value is True:
+        out.append(0xc3)
+    elif value is False:
+        out.append(0xc2)
+    elif isinstance(value, int):
+        if 0 <= value < 0x80 or -32 <= value < 0:
+            out += struct.pack('b' if value < 0 else 'B', value)
+        elif 0 <= value < 2 ** 64:
+            out.append(0xcf)
+            out += struct.pack('>Q', value)
+        elif -2 ** 63 <= value < 0:
+            out.append(0xd3)
+            out += struct.pack('>q', value)
+        else:
+            raise ValueError(f'integer {value} does not fit in 64 bits')
+    elif isinstance(value, float):
+        out.append(0xcb)
+        out += struct.pack('>d', value)
+    elif isinstance(value, str):
+        raw = value.encode()
+        _pack_length(out, len(raw), 0xa0, 32, (0xd9, 0xda, 0xdb))
+        out += raw
+    elif isinstance(value, (list, tuple)):
+        _pack_length(out, len(value), 0x90, 16, (None, 0xdc, 0xdd))
+        for item in value:
+            _pack(item, out)
+    elif isinstance(value, dict):
+        _pack_length(out, len(value), 0x80, 16, (None, 0xde, 0xdf))
+        for key, item in value.items():
+            _pack(key, out)
+            _pack(item, out)
+    else:
+        plain = encode(value)
+        if plain is value:
+            raise TypeError(f'cannot pack {type(value).__name__}')
+        _pack(plain, out)
+
+
+# Fixed-width values: marker -> struct format
+_FIXED = {0xca: '>f', 0xcb: '>d', 0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+          0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q'}
+# Length-prefixed strings, arrays and maps: marker -> (kind, length format)
+_SIZED = {0xd9: ('str', '>B'), 0xda: ('str', '>H'), 0xdb: ('str', '>I'),
+          0xdc: ('array', '>H'), 0xdd: ('array', '>I'), 0xde: ('map', '>H'), 0xdf: ('map', '>I')}
+
+
+def unpack(raw, pos):
+    """Decodes the value at ``raw[pos:]``; returns it and the end offset."""
+    try:
+        marker = raw[pos]
+    except IndexError:
+        raise ValueError('truncated snapshot') from None
+    pos += 1
+    if marker < 0x80:
+        return marker, pos
+    if marker >= 0xe0:
+        return marker - 0x100, pos
+    if marker == 0xc0:
+        return None, pos
+    if marker in (0xc2, 0xc3):
+        return marker == 0xc3, pos
+    if marker in _FIXED:
+        fmt = _FIXED[marker]
+        end = pos + struct.calcsize(fmt)
+        if end > len(raw):
+            raise ValueError('truncated snapshot')
+        return struct.unpack(fmt, raw[pos:end])[0], end
+    if 0xa0 <= marker < 0xc0:
+        kind, n = 'str', marker & 0x1f
+    elif 0x90 <= marker < 0xa0:
+        kind, n = 'array', marker & 0x0f
+    elif 0x80 <= marker < 0x90:
+        kind, n = 'map', marker & 0x0f
+    elif marker in _SIZED:
+        kind, fmt = _SIZED[marker]
+        end = pos + struct.calcsize(fmt)
+        if end > len(raw):
+            raise ValueError('truncated snapshot')
+        n = struct.unpack(fmt, raw[pos:end])[0]
+        pos = end
+    else:
+        raise ValueError(f'unsupported snapshot type 0x{marker:02x}')
+    if kind == 'str':
+        if pos + n > len(raw):
+            raise ValueError('truncated snapshot')
+        return raw[pos:pos + n].decode(), pos + n
+    if kind == 'array':
+        items = []
+        for _ in range(n):
+            item, pos = unpack(raw, pos)
+            items.append(item)
+        return items, pos
+    result = {}
+    for _ in range(n):
+        key, pos = unpack(raw, pos)
+        result[key], pos = unpack(raw, pos)
+    return result, pos
+
+
+def get_serializer(name):
+    """Returns the data file serializer called ``name``.
+
+    Raises ValueError for an unknown name, or for ``orjson`` when it isn't
+    installed.
+    """
+    if name == 'auto':
+        name = 'orjson' if orjson is not None else 'json'
+    if name == 'orjson':
+        if orjson is None:
+            raise ValueError('orjson is not installed')
+        return OrjsonSerializer()
+    if name == 'json':
+        return JSONSerializer()
+    if name == 'json-pretty':
+        return JSONSerializer(indent=2)
+    raise ValueError(f'unknown serializer {name!r}')
+
+
+DATA_SERIALIZER = get_serializer(os.environ.get('DATA_SERIALIZER', 'auto'))
+SNAPSHOT_SERIALIZER = SnapshotSerializer()
@@ -0,0 +1,163 @@
+"""Production entry point for CapicheSocial.
+
+Run with ``python serve.py [--workers N] [--threads T]``.  The data files
+are loaded and validated once in the parent process, then the workers fork
+with warm caches.  Uses gunicorn when it is installed, otherwise a
+pre-forking pool of werkzeug servers with a fixed thread pool each.
+``--server asgi`` runs the asyncio mode from ``asgi.py`` under uvicorn.
+``--replicate-on`` and ``--follow`` run a replication primary and a
+read-only follower (see ``replication.py``).
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # optional: fall back to the werkzeug pre-fork server
+    BaseApplication = None
+
+try:
+    import uvicorn
+except ImportError:  # optional: only needed for --server asgi
+    uvicorn = None
+
+from werkzeug.serving import BaseWSGIServer
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """werkzeug server handing each connection to a fixed-size thread pool."""
+
+    def __init__(self, host, port, app, threads, fd=None):
+        super().__init__(host, port, app, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_gunicorn(app, args):
+    class Server(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{args.host}:{args.port}')
+            self.cfg.set('workers', args.workers)
+            self.cfg.set('threads', args.threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('preload_app', True)
+            self.cfg.set('timeout', args.timeout)
+
+        def load(self):
+            return app
+
+    Server().run()
+
+
+def run_asgi(args):
+    if args.workers > 1:
+        # Workers are spawned, not forked, so each one loads the data itself
+        uvicorn.run('asgi:application', host=args.host, port=args.port, workers=args.workers, access_log=False)
+    else:
+        from asgi import application
+        uvicorn.run(application, host=args.host, port=args.port, access_log=False)
+
+
+def run_prefork(app, args):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    if args.workers == 1 or not hasattr(os, 'fork'):
+        PooledWSGIServer(args.host, args.port, app, args.threads, fd=sock.fileno()).serve_forever()
+        return
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            PooledWSGIServer(args.host, args.port, app, args.threads, fd=sock.fileno()).serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        os.waitpid(pid, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('WEB_THREADS', 8)))
+    parser.add_argument('--timeout', type=int, default=30, help='gunicorn worker timeout in seconds')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'prefork', 'asgi'], default='auto')
+    parser.add_argument('--check', action='store_true', help='load and validate the data, then exit')
+    parser.add_argument('--create-community', metavar='NAME', help='create an empty community, then exit')
+    parser.add_argument('--replicate-on', metavar='HOST:PORT', help='publish changes to followers on this address')
+    parser.add_argument('--follow', metavar='HOST:PORT', help='run as a read-only follower of this primary')
+    parser.add_argument('--primary', metavar='URL', help='where a follower forwards writes')
+    args = parser.parse_args()
+    # Read by app.py at import
+    for flag, name in [(args.replicate_on, 'REPLICATION_LISTEN'), (args.follow, 'REPLICA_OF'), (args.primary, 'PRIMARY_URL')]:
+        if flag:
+            os.environ[name] = flag
+
+    if args.create_community:
+        from app import COMMUNITY_NAME, communities
+        if not COMMUNITY_NAME.fullmatch(args.create_community):
+            parser.error('community names use a-z, 0-9 and dashes')
+        community = communities.create(args.create_community)
+        print(f'Created community {args.create_community} in {community.data_dir}')
+        return
+
+    started = time.perf_counter()
+    from app import app, init_data
+    try:
+        init_data()
+    except ValueError as e:
+        print(f'Data check failed:\n{e}', file=sys.stderr)
+        sys.exit(1)
+    print(f'Data loaded in {time.perf_counter() - started:.2f}s')
+    if args.check:
+        return
+
+    server = args.server
+    if server == 'auto':
+        server = 'gunicorn' if BaseApplication is not None else 'prefork'
+    if server == 'gunicorn':
+        if BaseApplication is None:
+            parser.error('gunicorn is not installed')
+        run_gunicorn(app, args)
+    elif server == 'asgi':
+        if uvicorn is None:
+            parser.error('uvicorn is not installed')
+        run_asgi(args)
+    else:
+        print(f'Serving on {args.host}:{args.port} with {args.workers} workers x {args.threads} threads')
+        run_prefork(app, args)
+
+
+if __name__ == '__main__':
+    main()
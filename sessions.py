@@ -0,0 +1,211 @@
+import json
+import os
+import secrets
+import threading
+import time
+
+from storage import file_signature, interprocess_lock
+
+SESSION_MAX_AGE = 30 * 24 * 3600  # seconds
+
+
+class SessionStore:
+    """Server-side sessions: random token -> user id.
+
+    Kept in one small JSON file shared by every worker process and re-read
+    only when its signature changes, so the cookie carries nothing but the
+    token.  Writes happen on login and logout only, under an exclusive
+    flock.  Like a ``Dataset``, it can publish to a replication journal or
+    be a replica that only ``replace()`` fills.
+    """
+
+    def __init__(self, path, max_age=SESSION_MAX_AGE, replica=False):
+        self.path = path
+        self.max_age = max_age
+        self.replica = replica
+        self.journal = None
+        self.community = None
+        self.lock = threading.Lock()
+        self._sessions = {}
+        self._signature = None
+
+    def _refresh(self):
+        if self.replica:
+            return
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        self._sessions = {}
+        if signature is not None:
+            with open(self.path, 'r') as f:
+                self._sessions = json.load(f)
+        self._signature = signature
+        self._publish()
+
+    def _publish(self):
+        if self.journal is not None and self.journal.active:
+            self.journal.publish({'type': 'sessions', 'community': self.community, 'sessions': self._sessions})
+
+    def poll(self):
+        with self.lock:
+            self._refresh()
+
+    def publish_reset(self):
+        with self.lock:
+            self._refresh()
+            self._publish()
+
+    def replace(self, sessions):
+        with self.lock:
+            self._sessions = sessions
+
+    def _write(self):
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._sessions, f, indent=2)
+        os.replace(tmp_path, self.path)
+        self._signature = file_signature(self.path)
+        self._publish()
+
+    def user_id(self, token):
+        if not token:
+            return None
+        with self.lock:
+            self._refresh()
+            entry = self._sessions.get(token)
+        if entry is None or time.time() - entry['created_at'] > self.max_age:
+            return None
+        return entry['user_id']
+
+    def create(self, user_id):
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with self.lock, interprocess_lock(self.path + '.lock'):
+            self._refresh()
+            # Expired sessions are dropped whenever a new one is written
+            self._sessions = {t: e for t, e in self._sessions.items() if now - e['created_at'] <= self.max_age}
+            self._sessions[token] = {'user_id': user_id, 'created_at': now}
+            self._write()
+        return token
+
+    def revoke(self, token):
+        with self.lock, interprocess_lock(self.path + '.lock'):
+            self._refresh()
+            if self._sessions.pop(token, None) is not None:
+                self._write()
+
+    def revoke_user(self, user_id):
+        with self.lock, interprocess_lock(self.path + '.lock'):
+            self._refresh()
+            kept = {t: e for t, e in self._sessions.items() if e['user_id'] != user_id}
+            if len(kept) != len(self._sessions):
+                self._sessions = kept
+                self._write()
+
+
+class UserCache:
+    """The current-user view of each user record, keyed by user id.
+
+    Every user id has a version that ``invalidate()`` bumps whenever a
+    mutation touches that user; a cached entry is served only while its
+    version is current.  Attached to the users data set, so a reload from
+    disk (another worker changed the file) drops every entry.
+    """
+
+    FIELDS = ('id', 'username', 'role', 'votePower', 'muted')
+
+    def __init__(self, loader):
+        self.loader = loader
+        self.lock = threading.Lock()
+        self._entries = {}
+        self._versions = {}
+
+    def rebuild(self, records):
+        with self.lock:
+            self._entries = {}
+
+    def get(self, user_id):
+        with self.lock:
+            version = self._versions.get(user_id, 0)
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+        record = self.loader(user_id)
+        user = None if record is None else {field: record[field] for field in self.FIELDS}
+        with self.lock:
+            # Skip the fill if an invalidation raced with the load
+            if self._versions.get(user_id, 0) == version:
+                self._entries[user_id] = (version, user)
+        return user
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+
+class LastSeen:
+    """Per-user high-water marks of the record ids a member has seen.
+
+    ``mark()`` only updates memory; pending marks are written out together
+    at most every ``flush_interval`` seconds, merged under a flock with
+    whatever other workers wrote.  Marks only ever move forward, so the
+    merge is a per-key max.
+    """
+
+    def __init__(self, path, flush_interval=30, clock=time.monotonic):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.clock = clock
+        self.lock = threading.Lock()
+        self._marks = {}
+        self._pending = {}
+        self._signature = None
+        self._last_flush = clock()
+
+    def _merge(self, target, marks):
+        for user_id, kinds in marks.items():
+            current = target.setdefault(user_id, {})
+            for kind, value in kinds.items():
+                if value > current.get(kind, -1):
+                    current[kind] = value
+
+    def _refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return
+        if signature is not None:
+            with open(self.path, 'r') as f:
+                self._merge(self._marks, json.load(f))
+        self._signature = signature
+
+    def get(self, user_id):
+        with self.lock:
+            self._refresh()
+            return dict(self._marks.get(str(user_id), {}))
+
+    def mark(self, user_id, **values):
+        with self.lock:
+            current = self._marks.setdefault(str(user_id), {})
+            changed = {kind: value for kind, value in values.items() if value > current.get(kind, -1)}
+            if changed:
+                current.update(changed)
+                self._pending.setdefault(str(user_id), {}).update(changed)
+            due = self._pending and self.clock() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock, interprocess_lock(self.path + '.lock'):
+            self._last_flush = self.clock()
+            if not self._pending:
+                return
+            self._signature = None
+            self._refresh()
+            self._merge(self._marks, self._pending)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._marks, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._signature = file_signature(self.path)
+            self._pending = {}
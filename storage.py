@@ -0,0 +1,435 @@
+import bisect
+import json
+import os
+import shutil
+import threading
+from contextlib import ExitStack, contextmanager
+
+from records import record_digest
+from serializers import DATA_SERIALIZER
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+
+def file_signature(file_path):
+    try:
+        st = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+@contextmanager
+def interprocess_lock(lock_path):
+    with open(lock_path, 'a') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@contextmanager
+def write_barrier(datasets):
+    # Holds off saves and deletes on every data set, here and in other
+    # processes; always taken in path order
+    with ExitStack() as stack:
+        for dataset in sorted(datasets, key=lambda d: d.path):
+            stack.enter_context(dataset.lock)
+            stack.enter_context(dataset._exclusive())
+        yield
+
+
+def init_file(file_path, default_data, serializer=DATA_SERIALIZER):
+    # Other workers may be starting up too: only one creates the file, and
+    # readers never see it empty
+    with interprocess_lock(file_path + '.lock'):
+        if not os.path.exists(file_path):
+            tmp_path = file_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(serializer.dumps(default_data))
+            os.replace(tmp_path, file_path)
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:  # no hard links across devices or on this filesystem
+        shutil.copy2(src, dst)
+
+
+class Sequences:
+    """Persistent named id counters shared by every worker process.
+
+    An allocation reads, bumps and rewrites one small counters file while
+    holding an exclusive flock, so it costs the same however large the data
+    sets grow and ids are never handed out twice, even after the record
+    holding the highest id is deleted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def next(self, name, floor=0):
+        with self.lock, interprocess_lock(self.path + '.lock'):
+            counters = {}
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    counters = json.load(f)
+            value = max(counters.get(name, 0), floor) + 1
+            counters[name] = value
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(counters, f, indent=2)
+            os.replace(tmp_path, self.path)
+            return value
+
+
+COMPACT_DELAY = 30  # seconds between the first pending delete and compaction
+
+
+class TombstoneLog:
+    """Append-only file of deleted record ids, one per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = set()
+        self._signature = None
+
+    def refresh(self):
+        signature = file_signature(self.path)
+        if signature == self._signature:
+            return False
+        self.ids = set()
+        if signature is not None:
+            with open(self.path, 'r') as f:
+                self.ids = {int(line) for line in f if line.strip()}
+        self._signature = signature
+        return True
+
+    def append(self, record_id):
+        with open(self.path, 'a') as f:
+            f.write(f'{record_id}\n')
+        self.ids.add(record_id)
+        self._signature = file_signature(self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.ids = set()
+        self._signature = None
+
+
+class Dataset:
+    """A JSON list file cached in memory.
+
+    The cached list is shared between requests and worker processes, so
+    callers mutate it only inside ``writing()`` and call ``save()`` before
+    leaving it.  The file is re-read only when its signature changes, i.e.
+    when another process rewrote it; attached indexes are rebuilt at that
+    point and otherwise kept up to date incrementally by the caller.
+
+    With ``record_type`` set, parsed records are converted to it (see
+    ``records.py``) and written back through ``records.encode``.  The file
+    is read and written by ``serializer`` (see ``serializers.py``).
+
+    With ``id_field`` set, records get stable ids and an id -> position
+    index.  Ids come from ``sequences`` (under the file's base name) when
+    given.  Deletes only append the id to a tombstone log; deleted records
+    are skipped by ``live()`` and dropped from the file by a deferred
+    compaction.
+
+    With ``journal`` set (see ``replication.py``), every save, delete and
+    reload publishes the records that changed since the last one.  A
+    ``replica`` never touches its file: its records arrive through
+    ``apply()``.
+    """
+
+    def __init__(self, path, default=None, id_field=None, sequences=None, record_type=None, replica=False,
+                 serializer=DATA_SERIALIZER):
+        self.path = path
+        self.serializer = serializer
+        self.default = default if default is not None else []
+        self.id_field = id_field
+        self.sequences = sequences
+        self.record_type = record_type
+        self.name = os.path.splitext(os.path.basename(path))[0]
+        self.lock = threading.RLock()
+        self.version = 0
+        self._data = None
+        self._signature = None
+        self._indexes = []
+        self._positions = {}
+        self._last_id = 0
+        self._tombstones = TombstoneLog(path + '.tombstones') if id_field else None
+        self._compaction = None
+        self._flocked = False
+        self.replica = replica
+        self.journal = None
+        self.community = None
+        self._digests = None
+
+    def init(self):
+        if not self.replica:
+            init_file(self.path, self.default, self.serializer)
+
+    @contextmanager
+    def _exclusive(self):
+        # The file's flock, taken once however deeply nested; ``lock`` must
+        # be held, and a second flock from this process would deadlock
+        if self._flocked:
+            yield
+            return
+        with interprocess_lock(self.path + '.lock'):
+            self._flocked = True
+            try:
+                yield
+            finally:
+                self._flocked = False
+
+    @contextmanager
+    def writing(self):
+        """Holds the data set for a read-modify-write, here and in every
+        other worker process.
+
+        The records are reloaded once the lock is held, so the caller
+        changes the latest version of them and its ``save()`` can't drop
+        what another process wrote in between.
+        """
+        with self.lock, self._exclusive():
+            self.load()
+            yield
+
+    def attach(self, index):
+        self._indexes.append(index)
+        with self.lock:
+            if self._data is not None:
+                index.rebuild(self.live())
+
+    def load(self):
+        with self.lock:
+            if self.replica:
+                if self._data is None:
+                    self._data = []
+                return self._data
+            signature = file_signature(self.path)
+            reloaded = self._data is None or signature != self._signature
+            if reloaded:
+                with open(self.path, 'rb') as f:
+                    self._data = self.serializer.loads(f.read())
+                if self.record_type is not None and isinstance(self._data, list):
+                    self._data = [self.record_type(r) for r in self._data]
+                self._signature = signature
+                if self.id_field:
+                    self._index_ids()
+            if self._tombstones is not None and self._tombstones.refresh():
+                reloaded = True
+            if reloaded:
+                self.version += 1
+                for index in self._indexes:
+                    index.rebuild(self.live())
+                self._publish_changes()
+            return self._data
+
+    def _index_ids(self):
+        self._last_id = max((r[self.id_field] for r in self._data if self.id_field in r), default=0)
+        missing = False
+        for r in self._data:
+            if self.id_field not in r:
+                # Records written before ids existed get one in file order
+                r[self.id_field] = self._next_id()
+                missing = True
+        self._positions = {r[self.id_field]: i for i, r in enumerate(self._data)}
+        if missing:
+            self.save()
+
+    def _next_id(self):
+        if self.sequences is not None:
+            self._last_id = self.sequences.next(self.name, floor=self._last_id)
+        else:
+            self._last_id += 1
+        return self._last_id
+
+    def live(self):
+        data = self._data if self._data is not None else []
+        if not self._tombstones or not self._tombstones.ids:
+            return data
+        deleted = self._tombstones.ids
+        return [r for r in data if r[self.id_field] not in deleted]
+
+    def get(self, record_id):
+        with self.lock:
+            self.load()
+            position = self._positions.get(record_id)
+            if position is None or record_id in self._tombstones.ids:
+                return None
+            return self._data[position]
+
+    # Ids are handed out in increasing order and records are only ever
+    # appended, so the list stays sorted by id and can be bisected
+    def _position_after(self, record_id):
+        return bisect.bisect_right(self._data, record_id, key=lambda r: r[self.id_field])
+
+    def last_id(self):
+        with self.lock:
+            data = self.load()
+            return data[-1][self.id_field] if data else 0
+
+    def count_after(self, record_id):
+        with self.lock:
+            data = self.load()
+            deleted = sum(1 for i in self._tombstones.ids if i > record_id)
+            return len(data) - self._position_after(record_id) - deleted
+
+    def after(self, record_id):
+        with self.lock:
+            data = self.load()
+            deleted = self._tombstones.ids
+            return [r for r in data[self._position_after(record_id):] if r[self.id_field] not in deleted]
+
+    def append(self, record):
+        with self.lock:
+            data = self.load()
+            if self.record_type is not None:
+                record = self.record_type(record)
+            if self.id_field:
+                record[self.id_field] = self._next_id()
+                self._positions[record[self.id_field]] = len(data)
+            data.append(record)
+            return record
+
+    def delete(self, record_id):
+        with self.writing():
+            record = self.get(record_id)
+            if record is None:
+                return None
+            self._tombstones.append(record_id)
+            self.version += 1
+            self._schedule_compaction()
+            self._publish_changes()
+            return record
+
+    def _schedule_compaction(self):
+        if self._compaction is None:
+            self._compaction = threading.Timer(COMPACT_DELAY, self.compact)
+            self._compaction.daemon = True
+            self._compaction.start()
+
+    def compact(self):
+        # Holding the flock throughout means no other process can append a
+        # tombstone between the reload and clearing the log
+        with self.writing():
+            self._compaction = None
+            if not self._tombstones.ids:
+                return
+            self._data[:] = self.live()
+            self._positions = {r[self.id_field]: i for i, r in enumerate(self._data)}
+            self.save()
+            self._tombstones.clear()
+
+    def close(self):
+        with self.lock:
+            if self._compaction is not None:
+                self._compaction.cancel()
+                self.compact()
+
+    def snapshot(self, dest_dir):
+        """Places the current file and tombstone log in ``dest_dir``.
+
+        Meant to run inside ``write_barrier()``.  Saves always replace the
+        data file, so a hard link keeps this version of it for free; the
+        tombstone log is appended to in place and gets copied.  Returns the
+        file names placed.
+        """
+        names = []
+        for path, link in [(self.path, True), (self._tombstones and self._tombstones.path, False)]:
+            if path and os.path.exists(path):
+                name = os.path.basename(path)
+                (link_or_copy if link else shutil.copy2)(path, os.path.join(dest_dir, name))
+                names.append(name)
+        return names
+
+    def extract(self, predicate, sink):
+        # Moves matching records out: ``sink`` persists them before the hot
+        # file is rewritten, so a crash in between duplicates rather than loses
+        with self.writing():
+            live = self.live()
+            moved = [r for r in live if predicate(r)]
+            if not moved:
+                return []
+            sink(moved)
+            moved_ids = {id(r) for r in moved}
+            self._data[:] = [r for r in live if id(r) not in moved_ids]
+            if self.id_field:
+                self._positions = {r[self.id_field]: i for i, r in enumerate(self._data)}
+            self.save()
+            if self._tombstones is not None:
+                self._tombstones.clear()
+            for index in self._indexes:
+                index.rebuild(self._data)
+            return moved
+
+    def save(self):
+        if self.replica:
+            raise RuntimeError(f'{self.name} is a read-only replica')
+        with self.lock, self._exclusive():
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(self.serializer.dumps(self._data))
+            os.replace(tmp_path, self.path)
+            self._signature = file_signature(self.path)
+            self.version += 1
+            self._publish_changes()
+
+    def _publish_changes(self):
+        # Diffs the live records against their digests at the last publish;
+        # the first publish after the journal goes active sends everything
+        if self.journal is None or not self.journal.active:
+            return
+        live = self.live()
+        digests = {r[self.id_field]: record_digest(r) for r in live}
+        message = {'community': self.community, 'kind': self.name}
+        if self._digests is None:
+            self.journal.publish(dict(message, type='reset', records=live))
+        else:
+            changed = [r for r in live if self._digests.get(r[self.id_field]) != digests[r[self.id_field]]]
+            deleted = [i for i in self._digests if i not in digests]
+            if changed or deleted:
+                self.journal.publish(dict(message, type='change', changed=changed, deleted=deleted))
+        self._digests = digests
+
+    def poll(self):
+        self.load()
+
+    def publish_reset(self):
+        with self.lock:
+            self.load()
+            self._digests = None
+            self._publish_changes()
+
+    def apply(self, changed=(), deleted=(), reset=False):
+        """Applies replicated changes to a replica's records.
+
+        The list is rebuilt in id order and every attached index rebuilt
+        once, however many records changed.
+        """
+        with self.lock:
+            records = {} if reset else {r[self.id_field]: r for r in self._data or ()}
+            for record_id in deleted:
+                records.pop(record_id, None)
+            for record in changed:
+                if self.record_type is not None:
+                    record = self.record_type(record)
+                records[record[self.id_field]] = record
+            self._data = [records[i] for i in sorted(records)]
+            self._positions = {r[self.id_field]: i for i, r in enumerate(self._data)}
+            self._last_id = self._data[-1][self.id_field] if self._data else 0
+            self.version += 1
+            for index in self._indexes:
+                index.rebuild(self._data)
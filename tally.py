@@ -0,0 +1,107 @@
+import sys
+from itertools import chain
+
+from records import VoteColumn
+
+try:
+    import numpy as np
+except ImportError:  # optional: recount falls back to plain Python
+    np = None
+
+
+def audit(polls, vote_power):
+    """Recompute every poll's weighted results from its votes.
+
+    ``vote_power`` maps username -> current weight.  Votes by users that no
+    longer exist count zero and are reported as orphaned; choices outside a
+    poll's options are ignored and reported as invalid.  Returns one entry
+    per poll whose stored results differ or that has orphaned or invalid
+    votes.
+    """
+    if np is not None:
+        expected, orphaned, invalid = _recount_numpy(polls, vote_power)
+    else:
+        expected, orphaned, invalid = _recount_python(polls, vote_power)
+    report = []
+    for i, poll in enumerate(polls):
+        mismatch = list(poll['results']) != expected[i]
+        if mismatch or orphaned[i] or invalid[i]:
+            report.append({
+                'id': poll['id'],
+                'question': poll['question'],
+                'stored': list(poll['results']),
+                'expected': expected[i],
+                'mismatch': mismatch,
+                'orphaned': orphaned[i],
+                'invalid': invalid[i],
+            })
+    return report
+
+
+def _recount_numpy(polls, vote_power):
+    # One flat array entry per vote: owning poll, chosen option and weight.
+    # Choices are read straight from each poll's VoteColumn buffer and
+    # voters become weights through a sorted lookup table, so no Python
+    # code runs per vote.  Each (poll, option) pair maps to a slot
+    # offsets[poll] + option, so the weighted tallies of all polls come out
+    # of a single bincount.
+    n = len(polls)
+    if n == 0:
+        return [], [], []
+    columns = [_vote_column(p) for p in polls]
+    n_options = np.fromiter((len(p['options']) for p in polls), dtype=np.int64, count=n)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(n_options, out=offsets[1:])
+    n_votes = np.fromiter(map(len, columns), dtype=np.int64, count=n)
+    choices = np.concatenate([np.frombuffer(c._values, dtype=c._values.typecode) for c in columns]).astype(np.int64)
+    poll_idx = np.repeat(np.arange(n, dtype=np.int64), n_votes)
+
+    # Column names are interned, so a voter is matched to a user by object
+    # identity: a searchsorted over the ids of the interned usernames, whose
+    # extra last weight (-1) stands for voters that no longer exist
+    total = int(n_votes.sum())
+    voter_ids = np.fromiter(map(id, chain.from_iterable(c._names for c in columns)), dtype=np.int64, count=total)
+    user_ids = np.fromiter(map(id, map(sys.intern, vote_power)), dtype=np.int64, count=len(vote_power))
+    order = np.argsort(user_ids)
+    user_ids = user_ids[order]
+    weight_table = np.fromiter(vote_power.values(), dtype=np.int64, count=len(vote_power))[order]
+    weight_table = np.append(weight_table, -1)
+    user_idx = np.searchsorted(user_ids, voter_ids)
+    found = user_idx < len(user_ids)
+    found[found] = user_ids[user_idx[found]] == voter_ids[found]
+    weights = weight_table[np.where(found, user_idx, len(user_ids))]
+
+    orphan = weights < 0
+    valid = (choices >= 0) & (choices < n_options[poll_idx]) & ~orphan
+    tallies = np.bincount(offsets[:-1][poll_idx[valid]] + choices[valid],
+                          weights=weights[valid], minlength=int(offsets[-1])).astype(np.int64)
+    orphaned = np.bincount(poll_idx[orphan], minlength=n)
+    invalid = np.bincount(poll_idx[~valid & ~orphan], minlength=n)
+
+    expected = [tallies[offsets[i]:offsets[i + 1]].tolist() for i in range(n)]
+    return expected, orphaned.tolist(), invalid.tolist()
+
+
+def _vote_column(poll):
+    # Stored polls already hold a VoteColumn; plain dicts are converted
+    votes = poll.get('votes', {})
+    return votes if isinstance(votes, VoteColumn) else VoteColumn(votes)
+
+
+def _recount_python(polls, vote_power):
+    expected, orphaned, invalid = [], [], []
+    for poll in polls:
+        results = [0] * len(poll['options'])
+        orphans = bad = 0
+        for username, choice in poll.get('votes', {}).items():
+            weight = vote_power.get(username)
+            if weight is None:
+                orphans += 1
+            elif 0 <= choice < len(results):
+                results[choice] += weight
+            else:
+                bad += 1
+        expected.append(results)
+        orphaned.append(orphans)
+        invalid.append(bad)
+    return expected, orphaned, invalid
@@ -0,0 +1,42 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    # DATA_DIR is relative, so the app runs from an empty scratch directory
+    # and starts with just the default users
+    workdir = tmp_path_factory.mktemp('site')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    os.environ.setdefault('ARCHIVE_POLLS_AFTER_DAYS', '100000')
+    os.environ.setdefault('ARCHIVE_ANNOUNCEMENTS_AFTER_DAYS', '100000')
+    os.environ.setdefault('COMMUNITY_DOMAIN', 'example.test')
+    import app
+    for rule in list(app.rate_limiter.rules):
+        app.rate_limiter.rules[rule] = (100000, 1)
+    app.init_data()
+    yield app
+    os.chdir(cwd)
+
+
+def login(app_module, username, password, base_url='http://localhost'):
+    client = app_module.app.test_client()
+    response = client.post('/login', data={'username': username, 'password': password}, base_url=base_url)
+    assert response.status_code == 302
+    return client
+
+
+@pytest.fixture
+def admin(app_module):
+    return login(app_module, 'adrian', 'adrian123')
+
+
+@pytest.fixture
+def member(app_module):
+    return login(app_module, 'member1', 'temp1')
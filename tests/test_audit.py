@@ -0,0 +1,53 @@
+import json
+import multiprocessing
+
+from audit import AuditLog
+
+
+def audit_entries(app_module, target):
+    community = app_module.communities.acquire('default')
+    try:
+        return community.audit_log.query(target=target)
+    finally:
+        app_module.communities.release(community)
+
+
+def test_noop_admin_changes_are_not_logged(app_module, admin):
+    before = len(audit_entries(app_module, 'member1'))
+    admin.post('/mute-user', data={'username': 'member1'})
+    admin.post('/mute-user', data={'username': 'member1'})
+    admin.post('/unmute-user', data={'username': 'member1'})
+    admin.post('/unmute-user', data={'username': 'member1'})
+    admin.post('/assign-role', data={'username': 'member1', 'role': 'Mod'})
+    admin.post('/assign-role', data={'username': 'member1', 'role': 'Mod'})
+    admin.post('/assign-role', data={'username': 'member1', 'role': 'Member'})
+    admin.post('/assign-vote', data={'username': 'member1', 'power': '3'})
+    admin.post('/assign-vote', data={'username': 'member1', 'power': '3'})
+    admin.post('/assign-vote', data={'username': 'member1', 'power': '1'})
+    entries = audit_entries(app_module, 'member1')
+    entries = entries[:len(entries) - before]
+    assert [e['action'] for e in reversed(entries)] == [
+        'mute_user', 'unmute_user', 'assign_role', 'assign_role', 'assign_vote', 'assign_vote']
+
+
+def record_entries(base_dir, worker):
+    log = AuditLog(base_dir, segment_size=4096)
+    for i in range(200):
+        log.record(f'admin{worker}', 'mute_user', f'user{i}')
+
+
+def test_concurrent_writers_append_in_time_order(tmp_path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=record_entries, args=(str(tmp_path), w)) for w in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    times = []
+    for path in sorted(tmp_path.glob('audit-*.log')):
+        times += [json.loads(line)[0] for line in path.read_text().splitlines()]
+    assert len(times) == 800
+    assert times == sorted(times)
+    since = times[400]
+    assert len(AuditLog(str(tmp_path)).query(since=since, limit=1000)) == sum(t >= since for t in times)
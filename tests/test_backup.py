@@ -0,0 +1,78 @@
+import gzip
+import io
+import json
+import tarfile
+
+import pytest
+
+from backup import read_records, restore
+from serializers import SNAPSHOT_SERIALIZER
+
+
+def live_announcements(community):
+    with community.announcements_store.lock:
+        community.announcements_store.load()
+        return [r.to_dict() for r in community.announcements_store.live()]
+
+
+def test_incremental_restore_uses_snapshot_deltas(app_module, admin, tmp_path):
+    community = app_module.communities.acquire('default')
+    try:
+        backups = community.backups
+        full = backups.path(backups.snapshot())
+        admin.post('/create-announcement', data={'title': 'After the full snapshot', 'content': 'x'})
+        incremental = backups.path(backups.snapshot(incremental=True))
+        with tarfile.open(incremental, 'r:gz') as tar:
+            raw = tar.extractfile('announcements.delta.snap').read()
+        assert raw.startswith(SNAPSHOT_SERIALIZER.MAGIC)
+        delta = SNAPSHOT_SERIALIZER.loads(raw)
+        assert [r['title'] for r in delta['changed']] == ['After the full snapshot']
+
+        restore([full, incremental], str(tmp_path))
+        assert read_records(str(tmp_path / 'announcements.json')) == live_announcements(community)
+    finally:
+        app_module.communities.release(community)
+
+
+def test_restore_still_reads_json_deltas(app_module, admin, tmp_path):
+    community = app_module.communities.acquire('default')
+    try:
+        backups = community.backups
+        full = backups.path(backups.snapshot())
+        admin.post('/create-announcement', data={'title': 'Before snapshot deltas', 'content': 'x'})
+        incremental = backups.path(backups.snapshot(incremental=True))
+        # Rewrite the incremental the way older backups stored their deltas
+        legacy = str(tmp_path / 'legacy.tar.gz')
+        with tarfile.open(incremental, 'r:gz') as src, tarfile.open(legacy, 'w:gz') as dst:
+            for member in src.getmembers():
+                raw = src.extractfile(member).read()
+                if member.name.endswith('.delta.snap'):
+                    raw = json.dumps(SNAPSHOT_SERIALIZER.loads(raw)).encode()
+                    member.name = member.name[:-len('.snap')] + '.json'
+                    member.size = len(raw)
+                dst.addfile(member, io.BytesIO(raw))
+
+        restore([full, legacy], str(tmp_path / 'restored'))
+        assert read_records(str(tmp_path / 'restored' / 'announcements.json')) == live_announcements(community)
+    finally:
+        app_module.communities.release(community)
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, -1, 127, 128, -33, 2 ** 40, -2 ** 40, 1.5, '', 'é' * 40, 'x' * 70000,
+    [], list(range(20)), {'a': [1, {'b': None}], '': 'x'}, {str(i): i for i in range(20)},
+])
+def test_snapshot_codec_round_trips(value):
+    assert SNAPSHOT_SERIALIZER.loads(SNAPSHOT_SERIALIZER.dumps(value)) == value
+
+
+def test_snapshot_codec_rejects_foreign_data():
+    raw = SNAPSHOT_SERIALIZER.dumps({'changed': [], 'deleted': [1, 2]})
+    with pytest.raises(ValueError, match='not a snapshot'):
+        SNAPSHOT_SERIALIZER.loads(gzip.compress(raw))
+    with pytest.raises(ValueError, match='version'):
+        SNAPSHOT_SERIALIZER.loads(SNAPSHOT_SERIALIZER.MAGIC + b'\x02' + raw[len(SNAPSHOT_SERIALIZER.MAGIC) + 1:])
+    with pytest.raises(ValueError, match='truncated'):
+        SNAPSHOT_SERIALIZER.loads(raw[:-1])
+    with pytest.raises(ValueError, match='trailing'):
+        SNAPSHOT_SERIALIZER.loads(raw + b'\xc0')
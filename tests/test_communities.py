@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+
+import pytest
+
+from conftest import login
+
+CLUB = 'http://club.example.test'
+
+
+@pytest.fixture(scope='module')
+def club(app_module):
+    app_module.communities.create('club')
+    return login(app_module, 'adrian', 'adrian123', base_url=CLUB)
+
+
+@contextmanager
+def default_community(app_module):
+    community = app_module.communities.acquire('default')
+    try:
+        yield community
+    finally:
+        app_module.communities.release(community)
+
+
+def test_write_load_is_shed_per_community(app_module, admin, club):
+    with default_community(app_module) as community:
+        limiter = community.write_limiter
+        limiter.in_flight = limiter.limit
+        try:
+            assert admin.post('/create-announcement', data={'title': 'Shed', 'content': 'x'}).status_code == 503
+            response = club.post('/create-announcement', data={'title': 'Kept', 'content': 'x'}, base_url=CLUB)
+            assert response.status_code == 302
+        finally:
+            limiter.in_flight = 0
+
+
+def test_password_pool_is_per_community(app_module, club):
+    with default_community(app_module) as community:
+        slots = community.password_pool._slots
+        taken = 0
+        while slots.acquire(blocking=False):
+            taken += 1
+        try:
+            client = app_module.app.test_client()
+            assert client.post('/login', data={'username': 'ish', 'password': 'ishpass'}).status_code == 503
+            login(app_module, 'ish', 'ishpass', base_url=CLUB)
+        finally:
+            for _ in range(taken):
+                slots.release()
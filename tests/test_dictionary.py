@@ -0,0 +1,13 @@
+def test_added_and_similar_words_are_escaped(admin):
+    admin.post('/dictionary', data={'word': '<b>bold</b>', 'definition': 'stored as typed'})
+    body = admin.post('/dictionary', data={'word': '<b>bolt</b>', 'definition': 'close to the first'}).get_data(as_text=True)
+    assert 'Word "&lt;b&gt;bolt&lt;/b&gt;" added successfully.' in body
+    assert 'Similar words already in the dictionary: &lt;b&gt;bold&lt;/b&gt;.' in body
+    assert '<b>bold</b>' not in body and '<b>bolt</b>' not in body
+
+
+def test_did_you_mean_links_encode_the_word(admin):
+    admin.post('/dictionary', data={'word': 'fish & chips #1', 'definition': 'a meal'})
+    body = admin.get('/dictionary', query_string={'q': 'fish & chips #2'}).get_data(as_text=True)
+    assert 'Did you mean' in body
+    assert 'href="/dictionary?q=fish+%26+chips+%231"' in body
@@ -0,0 +1,59 @@
+from ratelimit import RateLimiter
+
+
+def test_every_post_endpoint_is_rate_limited(app_module):
+    missing = [rule.endpoint for rule in app_module.app.url_map.iter_rules()
+               if 'POST' in rule.methods and rule.endpoint not in app_module.RATE_LIMITED_ENDPOINTS]
+    assert missing == []
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_buckets_refill_at_their_rate():
+    clock = Clock()
+    limiter = RateLimiter({'vote': (3, 0.5)}, clock=clock)
+    assert [limiter.hit('vote', 'ip:1') for _ in range(3)] == [0, 0, 0]
+    assert limiter.hit('vote', 'ip:1') == 2
+    assert limiter.hit('vote', 'ip:2') == 0
+    clock.now += 1
+    assert limiter.hit('vote', 'ip:1') == 1
+    clock.now += 1
+    assert limiter.hit('vote', 'ip:1') == 0
+    assert limiter.hit('vote', 'ip:1') == 2
+    # Never refills past capacity, however long the bucket sits
+    clock.now += 3600
+    assert [limiter.hit('vote', 'ip:1') for _ in range(4)] == [0, 0, 0, 2]
+
+
+def test_every_identity_must_have_a_token():
+    clock = Clock()
+    limiter = RateLimiter({'login': (1, 1)}, clock=clock)
+    assert limiter.hit('login', 'ip:1', 'name:adrian') == 0
+    # The IP is out, so the fresh name bucket is left untouched
+    assert limiter.hit('login', 'ip:1', 'name:ish') == 1
+    assert limiter.hit('login', 'ip:2', 'name:ish') == 0
+
+
+def test_sweep_drops_only_refilled_buckets():
+    clock = Clock()
+    limiter = RateLimiter({'fast': (2, 1), 'slow': (2, 0.01)}, sweep_interval=60, clock=clock)
+    limiter.hit('fast', 'a')
+    limiter.hit('slow', 'b')
+    assert len(limiter) == 2
+    clock.now += 59
+    limiter.hit('fast', 'c')
+    assert len(limiter) == 3
+    clock.now += 1
+    # The sweep runs before this hit: 'a' has refilled, 'b' has not, and
+    # 'c' (one token down a second ago) has too
+    limiter.hit('slow', 'd')
+    assert len(limiter) == 2
+    clock.now += 60
+    assert limiter.hit('slow', 'b') == 0
+    assert len(limiter) == 2
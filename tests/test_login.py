@@ -0,0 +1,49 @@
+import pytest
+
+from conftest import login
+
+SITE = 'http://logins.example.test'
+
+
+@pytest.fixture(scope='module')
+def site(app_module):
+    # A community of its own, so its default users still hold plaintext passwords
+    app_module.communities.create('logins')
+    community = app_module.communities.acquire('logins')
+    yield community
+    app_module.communities.release(community)
+
+
+def stored_password(community, username):
+    with community.users_store.lock:
+        community.users_store.load()
+        return community.user_index.get(username)['password']
+
+
+def test_plaintext_password_is_rehashed_on_login(app_module, site):
+    assert stored_password(site, 'ish') == 'ishpass'
+    login(app_module, 'ish', 'ishpass', base_url=SITE)
+    hashed = stored_password(site, 'ish')
+    assert hashed.startswith('scrypt$')
+    login(app_module, 'ish', 'ishpass', base_url=SITE)
+    assert stored_password(site, 'ish') == hashed
+
+
+def test_busy_password_pool_returns_503_for_known_and_unknown_users(app_module, site):
+    slots = site.password_pool._slots
+    taken = 0
+    while slots.acquire(blocking=False):
+        taken += 1
+    try:
+        client = app_module.app.test_client()
+        for username in ('member1', 'nobody'):
+            response = client.post('/login', data={'username': username, 'password': 'wrong'}, base_url=SITE)
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '2'
+    finally:
+        for _ in range(taken):
+            slots.release()
+    response = app_module.app.test_client().post('/login', data={'username': 'nobody', 'password': 'wrong'},
+                                                 base_url=SITE)
+    assert response.status_code == 200
+    assert 'Invalid credentials' in response.get_data(as_text=True)
@@ -0,0 +1,181 @@
+import http.cookiejar
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import pytest
+
+from conftest import ROOT
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(check, timeout=15):
+    deadline = time.monotonic() + timeout
+    while True:
+        result = check()
+        if result or time.monotonic() > deadline:
+            return result
+        time.sleep(0.1)
+
+
+class Proxy:
+    """Relays the replication stream, so the test can drop the connection
+    without restarting the primary.
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.open = threading.Event()
+        self.open.set()
+        self.conns = []
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(4)
+        self.port = self.sock.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            try:
+                if not self.open.is_set():
+                    raise OSError('proxy closed')
+                upstream = socket.create_connection(self.target)
+            except OSError:
+                # The follower retries, like after any dropped connection
+                client.close()
+                continue
+            self.conns += [client, upstream]
+            for a, b in [(client, upstream), (upstream, client)]:
+                threading.Thread(target=self._pipe, args=(a, b), daemon=True).start()
+
+    def _pipe(self, src, dst):
+        try:
+            while data := src.recv(65536):
+                dst.sendall(data)
+        except OSError:
+            pass
+        for sock in (src, dst):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def cut(self):
+        self.open.clear()
+        for sock in self.conns:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.conns = []
+
+    def close(self):
+        self.sock.close()
+        self.cut()
+
+
+class Site:
+    def __init__(self, port):
+        self.port = port
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}),
+                                                  urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with self.opener.open(f'http://127.0.0.1:{self.port}{path}', body, timeout=10) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode()
+
+    def status(self):
+        return json.loads(self.request('/replication')[1])
+
+    def up(self):
+        try:
+            return self.request('/replication')[0] == 200
+        except urllib.error.URLError:
+            return False
+
+
+def start(tmp_path, name, *args):
+    workdir = tmp_path / name
+    workdir.mkdir()
+    env = dict(os.environ, PYTHONPATH=ROOT, TRUSTED_FORWARDERS='127.0.0.1',
+               ARCHIVE_POLLS_AFTER_DAYS='100000', ARCHIVE_ANNOUNCEMENTS_AFTER_DAYS='100000')
+    return subprocess.Popen([sys.executable, os.path.join(ROOT, 'serve.py'), '--server', 'prefork',
+                             '--host', '127.0.0.1', *args],
+                            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    primary_port, stream_port, follower_port = free_port(), free_port(), free_port()
+    proxy = Proxy(('127.0.0.1', stream_port))
+    processes = []
+    try:
+        processes.append(start(tmp_path, 'primary', '--workers', '2', '--port', str(primary_port),
+                               '--replicate-on', f'127.0.0.1:{stream_port}'))
+        processes.append(start(tmp_path, 'follower', '--workers', '1', '--port', str(follower_port),
+                               '--follow', f'127.0.0.1:{proxy.port}', '--primary', f'http://127.0.0.1:{primary_port}'))
+        primary, follower = Site(primary_port), Site(follower_port)
+        assert wait_for(primary.up) and wait_for(follower.up)
+        yield primary, follower, proxy, processes
+    finally:
+        proxy.close()
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+
+def has_title(site, title):
+    status, body = site.request('/announcements')
+    return status == 200 and title in body
+
+
+def test_follower_streams_forwards_and_catches_up(cluster):
+    primary, follower, proxy, processes = cluster
+    assert wait_for(lambda: 'default' in follower.status()['communities'])
+
+    # Writes sent to the follower are forwarded to the primary and come back
+    # over the stream; the session made by logging in there does too
+    assert follower.request('/login', {'username': 'adrian', 'password': 'adrian123'})[0] == 200
+    assert follower.request('/create-announcement', {'title': 'Forwarded', 'content': 'x'})[0] == 200
+    assert wait_for(lambda: has_title(follower, 'Forwarded'))
+
+    # Drop the stream; what the primary writes meanwhile arrives on reconnect
+    proxy.cut()
+    assert wait_for(lambda: not follower.status()['connected'])
+    assert primary.request('/login', {'username': 'adrian', 'password': 'adrian123'})[0] == 200
+    assert primary.request('/create-announcement', {'title': 'While away', 'content': 'x'})[0] == 200
+    assert not has_title(follower, 'While away')
+    proxy.open.set()
+    assert wait_for(lambda: has_title(follower, 'While away'))
+
+    primary_seq = primary.status()['seq']
+    status = wait_for(lambda: (lambda s: s if s['applied_seq'] >= primary_seq else None)(follower.status()))
+    assert status['role'] == 'follower' and status['connected']
+    assert status['lag_messages'] == 0 and status['lag_seconds'] == 0.0
+    assert status['primary_seq'] == status['applied_seq']
+
+    # Reads keep working from the replica once the primary is gone
+    processes[0].terminate()
+    processes[0].wait()
+    assert has_title(follower, 'Forwarded') and has_title(follower, 'While away')
+    assert follower.request('/dashboard')[0] == 502
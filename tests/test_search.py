@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from conftest import login
+
+SITE = 'http://archived.example.test'
+
+
+def test_archived_announcements_stay_searchable(app_module):
+    app_module.communities.create('archived')
+    client = login(app_module, 'adrian', 'adrian123', base_url=SITE)
+    for title in ['Zeppelin maintenance', 'Zeppelin launch']:
+        client.post('/create-announcement', data={'title': title, 'content': 'x'}, base_url=SITE)
+    community = app_module.communities.acquire('archived')
+    try:
+        first = client.get('/search', query_string={'q': 'zeppelin'}, base_url=SITE).get_data(as_text=True)
+        assert 'Archived announcement' not in first
+        assert app_module.archive_old_content(community, now=datetime(2999, 1, 1)) == (2, 0)
+        assert community.announcements_store.live() == []
+    finally:
+        app_module.communities.release(community)
+
+    body = client.get('/search', query_string={'q': 'zeppelin maint'}, base_url=SITE).get_data(as_text=True)
+    assert body.count('Archived announcement') == 1
+    assert 'Zeppelin maintenance' in body
+    body = client.get('/search', query_string={'q': 'zeppelin', 'type': 'dictionary'}, base_url=SITE).get_data(as_text=True)
+    assert 'Zeppelin' not in body
@@ -0,0 +1,68 @@
+import re
+
+from conftest import login
+
+
+def register(app_module, admin, username, password='pw'):
+    response = admin.post('/register', data={'username': username, 'password': password, 'role': 'Member'})
+    assert 'User registered successfully' in response.get_data(as_text=True)
+    return login(app_module, username, password)
+
+
+def current_user(app_module, client):
+    # The user the next request from this client acts as
+    cookie = client.get_cookie(app_module.app.config['SESSION_COOKIE_NAME'])
+    with app_module.app.test_request_context('/dashboard', headers={'Cookie': f'{cookie.key}={cookie.value}'}):
+        app_module.app.preprocess_request()
+        return app_module.current_user()
+
+
+def vote_weight(client):
+    body = client.get('/dashboard').get_data(as_text=True)
+    return int(re.search(r'Your vote carries weight: (\d+)', body).group(1))
+
+
+def test_assign_vote_applies_to_the_next_request(app_module, admin):
+    client = register(app_module, admin, 'weighted')
+    assert vote_weight(client) == 1
+    admin.post('/assign-vote', data={'username': 'weighted', 'power': '5'})
+    assert vote_weight(client) == 5
+
+    admin.post('/create-poll', data={'question': 'Weighted?', 'option0': 'yes', 'option1': 'no',
+                                     'expires_at': '2099-01-01T00:00'})
+    community = app_module.communities.acquire('default')
+    try:
+        poll = next(p for p in community.polls_store.live() if p['question'] == 'Weighted?')
+    finally:
+        app_module.communities.release(community)
+    assert client.post('/polls', data={'poll_id': poll['id'], 'choice': '0'}).status_code == 302
+    assert list(poll['results']) == [5, 0]
+
+
+def test_assign_role_applies_to_the_next_request(app_module, admin):
+    client = register(app_module, admin, 'promoted')
+    assert client.get('/create-announcement').status_code == 403
+    admin.post('/assign-role', data={'username': 'promoted', 'role': 'Mod'})
+    assert client.get('/create-announcement').status_code == 200
+    admin.post('/assign-role', data={'username': 'promoted', 'role': 'Member'})
+    assert client.get('/create-announcement').status_code == 403
+
+
+def test_mute_applies_to_the_next_request(app_module, admin):
+    client = register(app_module, admin, 'quiet')
+    assert current_user(app_module, client)['muted'] is False
+    admin.post('/mute-user', data={'username': 'quiet'})
+    assert current_user(app_module, client)['muted'] is True
+    admin.post('/unmute-user', data={'username': 'quiet'})
+    assert current_user(app_module, client)['muted'] is False
+
+
+def test_delete_user_ends_their_sessions(app_module, admin):
+    client = register(app_module, admin, 'leaving')
+    other = login(app_module, 'leaving', 'pw')
+    assert client.get('/dashboard').status_code == 200
+    admin.post('/delete-user', data={'username': 'leaving'})
+    for c in (client, other):
+        response = c.get('/dashboard')
+        assert response.status_code == 302 and response.headers['Location'] == '/login'
+    assert admin.get('/dashboard').status_code == 200
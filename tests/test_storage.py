@@ -0,0 +1,172 @@
+import json
+import multiprocessing
+import os
+
+from archive import Archive
+from conftest import login
+from indexes import UserIndex
+from records import Announcement
+from storage import Dataset, Sequences
+
+WORKERS = 4
+PER_WORKER = 100
+
+
+def open_dataset(path):
+    dataset = Dataset(str(path / 'announcements.json'), id_field='id', record_type=Announcement,
+                      sequences=Sequences(str(path / 'sequences.json')))
+    dataset.init()
+    return dataset
+
+
+def live_records(path):
+    dataset = open_dataset(path)
+    with dataset.lock:
+        dataset.load()
+        return dataset.live()
+
+
+def append_records(path, worker):
+    dataset = open_dataset(path)
+    for i in range(PER_WORKER):
+        with dataset.writing():
+            dataset.append({'title': f'{worker}-{i}', 'content': '', 'author': 'a',
+                            'timestamp': '2020-01-01T00:00:00'})
+            dataset.save()
+
+
+def delete_and_compact(path, worker):
+    dataset = open_dataset(path)
+    for record_id in range(worker + 1, WORKERS * PER_WORKER + 1, WORKERS):
+        dataset.delete(record_id)
+        if record_id % 7 == 0:
+            dataset.compact()
+    dataset.compact()
+
+
+def archive_all(path, worker):
+    dataset = open_dataset(path)
+    archive = Archive(str(path / 'archive'))
+    dataset.extract(lambda r: True, lambda items: archive.write('announcements', items, 'timestamp'))
+
+
+def run_workers(target, path):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=target, args=(path, w)) for w in range(WORKERS)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+
+def test_concurrent_appends_keep_every_record(tmp_path):
+    run_workers(append_records, tmp_path)
+    records = live_records(tmp_path)
+    assert len(records) == WORKERS * PER_WORKER
+    assert sorted(r['id'] for r in records) == list(range(1, WORKERS * PER_WORKER + 1))
+
+
+def test_deletes_survive_concurrent_compaction(tmp_path):
+    run_workers(append_records, tmp_path)
+    run_workers(delete_and_compact, tmp_path)
+    assert live_records(tmp_path) == []
+    assert not os.path.exists(str(tmp_path / 'announcements.json.tombstones'))
+
+
+def test_concurrent_archival_moves_each_record_once(tmp_path):
+    run_workers(append_records, tmp_path)
+    run_workers(archive_all, tmp_path)
+    assert live_records(tmp_path) == []
+    archive = Archive(str(tmp_path / 'archive'))
+    assert archive.months('announcements') == [('2020-01', WORKERS * PER_WORKER)]
+    titles = [r['title'] for r in archive.load('announcements', '2020-01')]
+    assert len(titles) == len(set(titles)) == WORKERS * PER_WORKER
+
+
+def test_feed_pages_through_tied_timestamps(app_module):
+    # Every item shares one timestamp, so page boundaries fall on ties
+    # both within a kind and across kinds
+    stamp = '2099-01-01T00:00:00'
+    data_dir = app_module.communities.path('feed')
+    os.makedirs(data_dir)
+    data = {
+        'announcements': [{'id': i, 'title': f'a{i}', 'content': '', 'author': 'adrian', 'timestamp': stamp}
+                          for i in range(1, 24)],
+        'dictionary': [{'id': i, 'word': f'd{i}', 'definition': '', 'author': 'adrian', 'timestamp': stamp}
+                       for i in range(1, 18)],
+        'polls': [{'id': i, 'question': f'p{i}', 'options': ['x'], 'results': [0], 'expires_at': '2099-12-31T00:00',
+                   'created_at': stamp, 'votes': {}} for i in range(1, 12)],
+    }
+    for name, records in data.items():
+        with open(os.path.join(data_dir, f'{name}.json'), 'w') as f:
+            json.dump(records, f)
+    app_module.communities.create('feed')
+    client = login(app_module, 'adrian', 'adrian123', base_url='http://feed.example.test')
+
+    titles, cursor = [], None
+    for pages in range(1, 5):
+        query = {'cursor': cursor} if cursor else {}
+        page = client.get('/feed', query_string=query, base_url='http://feed.example.test').get_json()
+        assert len(page['items']) <= app_module.FEED_PAGE_SIZE
+        titles += [item['title'] for item in page['items']]
+        cursor = page['next']
+        if not cursor:
+            break
+    assert pages == 3 and cursor is None
+    # Newest first: ties go by kind, then id, both descending
+    expected = ([f'p{i}' for i in range(11, 0, -1)] + [f'd{i}' for i in range(17, 0, -1)]
+                + [f'a{i}' for i in range(23, 0, -1)])
+    assert titles == expected
+
+
+def test_count_after_skips_tombstoned_records(tmp_path):
+    dataset = open_dataset(tmp_path)
+    for i in range(10):
+        with dataset.writing():
+            dataset.append({'title': str(i), 'content': '', 'author': 'a', 'timestamp': '2020-01-01T00:00:00'})
+            dataset.save()
+    for record_id in (2, 6, 9):
+        dataset.delete(record_id)
+    dataset.delete(6)
+    # Another worker's deletes arrive through the tombstone file
+    other = open_dataset(tmp_path)
+    other.delete(10)
+    other.close()
+
+    def counts():
+        return [dataset.count_after(n) for n in (0, 5, 6, 9, 10)]
+
+    assert counts() == [6, 2, 2, 0, 0]
+    assert counts() == [len(dataset.after(n)) for n in (0, 5, 6, 9, 10)]
+    dataset.compact()
+    assert not os.path.exists(str(tmp_path / 'announcements.json.tombstones'))
+    assert counts() == [6, 2, 2, 0, 0]
+    dataset.close()
+
+
+def test_user_index_pages_match_a_full_scan():
+    roles = ['Leader', 'Mod', 'Member']
+    users = [{'id': i, 'username': f'{"ab"[i % 2]}user{i:02d}', 'role': roles[i % 3], 'votePower': i % 4 + 1,
+              'muted': i % 5 == 0} for i in range(1, 61)]
+    index = UserIndex()
+    index.rebuild(users)
+    index.update(users[0], role='Mod', muted=False)
+
+    def scan(role, muted, power, prefix, sort, descending):
+        matches = [u for u in users if (role is None or u['role'] == role) and (muted is None or u['muted'] == muted)
+                   and (power is None or u['votePower'] == power) and u['username'].startswith(prefix)]
+        return sorted(matches, key=UserIndex.SORT_KEYS[sort], reverse=descending)
+
+    for role in (None, 'Mod'):
+        for muted in (None, True, False):
+            for power in (None, 2):
+                for prefix in ('', 'b', 'auser1'):
+                    for sort in ('username', 'role', 'votePower'):
+                        for descending in (False, True):
+                            expected = scan(role, muted, power, prefix, sort, descending)
+                            for offset in (0, 7, max(len(expected) - 1, 0), len(expected), 100):
+                                total, page = index.query(role=role, muted=muted, power=power, prefix=prefix,
+                                                          sort=sort, descending=descending, offset=offset, limit=7)
+                                assert total == len(expected)
+                                assert page == expected[offset:offset + 7]
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import os
+import re
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import login
+
+RECORDS = 350
+LARGE = 20000
+LARGE_SITE = 'http://large.example.test'
+
+
+@pytest.fixture(scope='module')
+def reader(app_module):
+    client = login(app_module, 'adrian', 'adrian123')
+    for i in range(RECORDS):
+        assert client.post('/create-announcement', data={'title': f'Streamed {i}', 'content': 'x'}).status_code == 302
+    return client
+
+
+def asgi_get(app_module, client, path, send_fails_after=None):
+    from asgi import WSGIBridge
+
+    bridge = WSGIBridge(app_module.app, ThreadPoolExecutor(max_workers=4))
+    cookie = client.get_cookie(app_module.app.config['SESSION_COOKIE_NAME'])
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'http_version': '1.1',
+             'headers': [(b'host', b'localhost'), (b'cookie', f'{cookie.key}={cookie.value}'.encode())]}
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        if send_fails_after is not None and len(sent) >= send_fails_after:
+            raise OSError('client went away')
+        sent.append(message)
+
+    try:
+        asyncio.run(bridge(scope, receive, send))
+    finally:
+        bridge.executor.shutdown(wait=True)
+    return sent
+
+
+@pytest.mark.parametrize('path', ['/announcements', '/polls', '/dictionary', '/admin', '/admin/content'])
+def test_streamed_pages_match_over_wsgi_and_asgi(app_module, reader, path):
+    response = reader.get(path)
+    assert response.status_code == 200
+    assert response.is_streamed
+    body = response.get_data(as_text=True)
+    assert body.rstrip().endswith('</html>')
+    assert app_module.RECORDS_SLOT not in body
+
+    sent = asgi_get(app_module, reader, path)
+    assert sent[0]['type'] == 'http.response.start' and sent[0]['status'] == 200
+    assert sent[-1] == {'type': 'http.response.body', 'body': b''}
+    assert b''.join(m['body'] for m in sent[1:]).decode() == body
+
+
+def test_announcements_stream_in_chunks_in_order(app_module, reader):
+    sent = asgi_get(app_module, reader, '/announcements')
+    assert len(sent) > RECORDS // app_module.STREAM_CHUNK + 2
+    body = b''.join(m['body'] for m in sent[1:]).decode()
+    titles = [int(n) for n in re.findall(r'Streamed (\d+)', body)]
+    assert titles == list(range(RECORDS))
+
+
+def test_asgi_disconnect_mid_stream_closes_the_body(app_module, reader):
+    with pytest.raises(OSError):
+        asgi_get(app_module, reader, '/announcements', send_fails_after=2)
+    # The request context was popped: the next request works as usual
+    assert len(asgi_get(app_module, reader, '/announcements')) > 2
+
+
+def test_slow_readers_do_not_hold_executor_threads(app_module, reader):
+    from asgi import WSGIBridge
+
+    bridge = WSGIBridge(app_module.app, ThreadPoolExecutor(max_workers=2))
+    cookie = reader.get_cookie(app_module.app.config['SESSION_COOKIE_NAME'])
+
+    def scope(path):
+        return {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'', 'http_version': '1.1',
+                'headers': [(b'host', b'localhost'), (b'cookie', f'{cookie.key}={cookie.value}'.encode())]}
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def run():
+        release = asyncio.Event()
+        started = []
+
+        async def stalled_send(message):
+            # A client that takes the first chunk and then stops reading
+            if message.get('body'):
+                started.append(True)
+                await release.wait()
+
+        async def all_started():
+            while len(started) < 3:
+                await asyncio.sleep(0.01)
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        slow = [asyncio.create_task(bridge(scope('/announcements'), receive, stalled_send)) for _ in range(3)]
+        try:
+            await asyncio.wait_for(all_started(), 5)
+            await asyncio.wait_for(bridge(scope('/login'), receive, send), 5)
+        finally:
+            release.set()
+            await asyncio.wait_for(asyncio.gather(*slow), 10)
+        assert sent[0]['status'] in (200, 302)
+
+    try:
+        asyncio.run(run())
+    finally:
+        bridge.executor.shutdown(wait=True)
+
+
+@pytest.fixture(scope='module')
+def large_reader(app_module):
+    # Written straight to the data files: far quicker than posting each one
+    data_dir = app_module.communities.path('large')
+    os.makedirs(data_dir)
+    words = ['club', 'meeting', 'vote', 'news', 'event']
+    announcements = [{'id': i, 'title': f'Announcement {i}', 'content': ' '.join(words[j % 5] for j in range(i, i + 30)),
+                      'author': 'adrian', 'timestamp': '2099-01-01T00:00:00'} for i in range(1, LARGE + 1)]
+    entries = [{'id': i, 'word': f'word{i}', 'definition': f'definition of word {i}', 'author': 'adrian',
+                'timestamp': '2099-01-01T00:00:00'} for i in range(1, LARGE + 1)]
+    for name, records in [('announcements', announcements), ('dictionary', entries)]:
+        with open(os.path.join(data_dir, f'{name}.json'), 'w') as f:
+            json.dump(records, f)
+    app_module.communities.create('large')
+    return login(app_module, 'adrian', 'adrian123', base_url=LARGE_SITE)
+
+
+@pytest.mark.parametrize('path', ['/announcements', '/dictionary'])
+def test_large_pages_stream_in_bounded_time_and_memory(large_reader, path):
+    def fetch():
+        started = time.perf_counter()
+        response = large_reader.get(path, base_url=LARGE_SITE, buffered=False)
+        assert response.status_code == 200
+        chunks = iter(response.response)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - started
+        for chunk in chunks:
+            size += len(chunk)
+        response.close()
+        return first_byte, time.perf_counter() - started, size
+
+    fetch()
+    tracemalloc.start()
+    try:
+        first_byte, total, size = fetch()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert size > 2 ** 20 * 3
+    # The head of the page goes out before the records are rendered, and
+    # only a chunk of them is held at a time
+    assert first_byte < 0.5 and first_byte < total / 10
+    assert peak < size / 8